@@ -0,0 +1,153 @@
+import bisect
+import math
+import threading
+from collections import namedtuple
+
+# kind -> (indicator field, direction); breakout alerts have no threshold
+ALERT_KINDS = {
+    'price_above': ('price', 'above'),
+    'price_below': ('price', 'below'),
+    'rsi_above': ('RSI', 'above'),
+    'rsi_below': ('RSI', 'below'),
+    'bollinger_breakout': (None, None),
+}
+
+# Fields whose alerts fire on a crossing rather than whenever the value is past the level. Price
+# alerts take their direction from the price when they are created, so "past the level" already
+# means crossed; an RSI alert can be created on either side of its level.
+CROSSING_FIELDS = {'RSI'}
+
+Alert = namedtuple('Alert', ['id', 'user_id', 'symbol', 'kind', 'level'])
+
+
+class ThresholdIndex:
+    # Thresholds for one (symbol, field), sorted so the alerts a value triggers are always a
+    # contiguous run: "above" alerts fire when value >= level, "below" alerts when value <= level.
+    # With crossing=True only levels between the previous value and this one fire, and a new
+    # alert joins after the next tick, so that tick's value is the side it starts from.
+    # A tick costs O(log n) plus the alerts that actually fire.
+
+    def __init__(self, alive, crossing=False):
+        self.alive = alive
+        self.crossing = crossing
+        self.above = []
+        self.below = []
+        self.arming = []
+        self.last = None
+        self.dirty = False
+        self.stale = 0
+
+    def __len__(self):
+        return len(self.above) + len(self.below) + len(self.arming) - self.stale
+
+    def add(self, alert_id, level, direction):
+        if self.crossing:
+            self.arming.append((alert_id, level, direction))
+            return
+        self.insert(alert_id, level, direction)
+
+    def insert(self, alert_id, level, direction):
+        if direction == 'above':
+            self.above.append((level, alert_id))
+        else:
+            self.below.append((-level, alert_id))
+        self.dirty = True
+
+    def discard(self):
+        # Removal is lazy; compact once half the entries belong to removed alerts
+        self.stale += 1
+        if self.stale * 2 > len(self.above) + len(self.below) + len(self.arming):
+            self.above = [entry for entry in self.above if entry[1] in self.alive]
+            self.below = [entry for entry in self.below if entry[1] in self.alive]
+            self.arming = [entry for entry in self.arming if entry[0] in self.alive]
+            self.stale = 0
+
+    def pop_range(self, entries, previous_key, key):
+        # Entries with previous_key < entry key <= key; every entry up to key when previous_key is None
+        first = 0 if previous_key is None else bisect.bisect_right(entries, (previous_key, math.inf))
+        last = bisect.bisect_right(entries, (key, math.inf))
+        if last <= first:
+            return []
+        fired = [alert_id for _, alert_id in entries[first:last]]
+        del entries[first:last]
+        return fired
+
+    def fire(self, value):
+        if value is None or value != value:
+            return []
+        if self.dirty:
+            self.above.sort()
+            self.below.sort()
+            self.dirty = False
+        if not self.crossing:
+            fired = self.pop_range(self.above, None, value) + self.pop_range(self.below, None, -value)
+        elif self.last is None:
+            fired = []
+        else:
+            fired = self.pop_range(self.above, self.last, value) + self.pop_range(self.below, -self.last, -value)
+        if self.arming:
+            for alert_id, level, direction in self.arming:
+                self.insert(alert_id, level, direction)
+            self.arming = []
+        self.last = value
+        alive = [alert_id for alert_id in fired if alert_id in self.alive]
+        self.stale = max(0, self.stale - (len(fired) - len(alive)))
+        return alive
+
+
+class AlertEngine:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.alerts = {}
+        self.indexes = {}
+        self.breakouts = {}
+
+    def add(self, alert):
+        with self.lock:
+            self.alerts[alert.id] = alert
+            field, direction = ALERT_KINDS[alert.kind]
+            if field is None:
+                self.breakouts.setdefault(alert.symbol, set()).add(alert.id)
+            else:
+                index = self.indexes.get((alert.symbol, field))
+                if index is None:
+                    index = self.indexes[(alert.symbol, field)] = ThresholdIndex(self.alerts, field in CROSSING_FIELDS)
+                index.add(alert.id, alert.level, direction)
+
+    def remove(self, alert_id):
+        with self.lock:
+            alert = self.alerts.pop(alert_id, None)
+            if alert is None:
+                return None
+            field, _ = ALERT_KINDS[alert.kind]
+            if field is None:
+                self.breakouts.get(alert.symbol, set()).discard(alert_id)
+            else:
+                self.indexes[(alert.symbol, field)].discard()
+            return alert
+
+    def symbols(self):
+        with self.lock:
+            return sorted({alert.symbol for alert in self.alerts.values()})
+
+    def indicator_alerts(self, symbol):
+        # Alerts on the symbol that need RSI or Bollinger values rather than the price alone
+        with self.lock:
+            return [alert for alert in self.alerts.values()
+                    if alert.symbol == symbol and ALERT_KINDS[alert.kind][0] != 'price']
+
+    def on_tick(self, symbol, price, indicators=None):
+        # Returns (alert, triggering value) for every alert this tick fires; fired alerts are removed
+        indicators = indicators or {}
+        with self.lock:
+            fired = []
+            for field, value in (('price', price), ('RSI', indicators.get('RSI'))):
+                index = self.indexes.get((symbol, field))
+                if index is not None:
+                    fired.extend((alert_id, value) for alert_id in index.fire(value))
+            high, low = indicators.get('BB_high'), indicators.get('BB_low')
+            if self.breakouts.get(symbol) and high == high and low == low and high is not None and low is not None:
+                if price > high or price < low:
+                    fired.extend((alert_id, price) for alert_id in self.breakouts.pop(symbol))
+            return [(self.alerts.pop(alert_id), value) for alert_id, value in fired if alert_id in self.alerts]
@@ -0,0 +1,337 @@
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from bootstrap import load_app
+from candles import TIMEFRAMES
+from chart_data import downsample_frame
+
+# Headless JSON API over the journal, for the TypeScript server and scripts.
+#
+#   python api_server.py --port 8502
+#
+#   GET /api/health
+#   GET /api/trades?fields=id,pair,entry_price&status=completed&limit=100&after=<id>
+#   GET /api/metrics
+#   GET /api/equity?freq=D&points=500
+#   GET /api/market/BTC-USD?interval=4h&start=2024-01-01&indicators=1
+#
+# Requests authenticate with a journal user's HTTP Basic credentials. Every response carries an
+# ETag derived from the user's trade data version (or the cached price history), so a poll with a
+# matching If-None-Match is answered 304 before anything is loaded or recomputed. Bodies are
+# gzipped when the client accepts it.
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FIELDS = ('id', 'date', 'end_date', 'pair', 'amount', 'entry_price', 'exit_price', 'strategy', 'notes',
+                  'status', 'trade_type')
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+GZIP_MIN_BYTES = 1024
+AUTH_CACHE_SECONDS = 300
+# Open positions are marked to market with prices sync_price_history caches for 15 minutes
+PRICE_BUCKET_SECONDS = 900
+# Days of history yfinance serves for the intervals served as stored (None: the full range);
+# chart timeframes are resampled from their base interval and use the app's own limits
+STORED_HISTORY_DAYS = {'1m': 6, '30m': 59, '1wk': None}
+MARKET_INTERVALS = tuple(TIMEFRAMES) + tuple(STORED_HISTORY_DAYS)
+SYMBOL_PATTERN = re.compile(r'^[A-Z0-9.^=-]{1,20}$')
+
+app = None
+# The app shares one connection and cursor between callers, so requests take turns using it
+app_lock = threading.Lock()
+auth_cache = {}
+
+
+class ApiError(Exception):
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def json_default(value):
+    if isinstance(value, (bytes, memoryview)):
+        return base64.b64encode(bytes(value)).decode('ascii')
+    if isinstance(value, (datetime, date, pd.Timestamp)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def frame_payload(frame):
+    return {
+        'index': [ts.isoformat() for ts in frame.index],
+        'columns': {column: [None if pd.isna(value) else float(value) for value in frame[column]]
+                    for column in frame.columns},
+    }
+
+
+def make_etag(*parts):
+    return 'W/"' + hashlib.sha1('|'.join(map(str, parts)).encode()).hexdigest()[:24] + '"'
+
+
+def authenticate(header, client_ip):
+    # Verified credentials are remembered briefly so polling does not pay for bcrypt on every request
+    if not header or not header.startswith('Basic '):
+        return None
+    key = hashlib.sha256(header.encode()).hexdigest()
+    cached = auth_cache.get(key)
+    if cached and cached[1] > time.time():
+        # Only bcrypt is skipped: the user row is re-read (uncached, as admin changes happen in the
+        # app's process), so a deleted, expired or re-passworded user is not served from here
+        with app_lock:
+            user = app.find_user(cached[0][1])
+        if user and user[:3] == cached[0][:3] and not (app.is_user_expired(user) and not user[3]):
+            return user
+        auth_cache.pop(key, None)
+    try:
+        username, _, password = base64.b64decode(header[6:]).decode('utf-8').partition(':')
+    except ValueError:
+        return None
+    # Same per-address budget and bcrypt pool as the login page
+    wait_seconds = app.get_login_limiter().acquire(client_ip)
+    if wait_seconds:
+        raise ApiError(429, f"Too many attempts, retry in {int(wait_seconds) + 1}s")
+    with app_lock:
+        user = app.find_user(username)
+    try:
+        if not (user and app.get_password_hasher().check(password, user[2])):
+            return None
+    except (app.AuthBusy, TimeoutError):
+        raise ApiError(503, "Authentication busy, retry shortly")
+    if app.is_user_expired(user) and not user[3]:
+        return None
+    app.get_login_limiter().reset(client_ip)
+    now = time.time()
+    # Expired entries are dropped as new ones arrive, so the cache holds only recent credentials
+    for stale in [entry for entry, (_, expires) in list(auth_cache.items()) if expires <= now]:
+        auth_cache.pop(stale, None)
+    auth_cache[key] = (user, now + AUTH_CACHE_SECONDS)
+    return user
+
+
+def history_start(interval):
+    days = STORED_HISTORY_DAYS[interval]
+    return (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d') if days else "2022-01-01"
+
+
+def trade_version(user):
+    with app_lock:
+        return app.get_trade_data_version(user[0])
+
+
+def int_param(params, name, default, minimum, maximum):
+    try:
+        value = int(params.get(name, default))
+    except ValueError:
+        raise ApiError(400, f"{name} must be an integer")
+    return min(max(value, minimum), maximum)
+
+
+# Endpoints return the version their response depends on and a function building the response;
+# the builder only runs when the client's ETag does not match
+def trades_endpoint(user, params):
+    fields = tuple(params['fields'].split(',')) if params.get('fields') else DEFAULT_FIELDS
+    unknown = [field for field in fields if field not in app.TRADE_FIELDS]
+    if unknown:
+        raise ApiError(400, f"Unknown fields: {', '.join(unknown)}")
+    if 'id' not in fields:
+        fields = ('id',) + fields
+    after = int_param(params, 'after', 0, 0, 2 ** 63 - 1)
+    limit = int_param(params, 'limit', DEFAULT_PAGE_SIZE, 1, MAX_PAGE_SIZE)
+    status = params.get('status')
+
+    def build():
+        with app_lock:
+            rows = app.load_trade_page(user[0], fields, after, limit, status)
+        return {
+            'trades': [dict(zip(fields, row)) for row in rows],
+            'next_after': rows[-1][0] if len(rows) == limit else None,
+        }
+    return trade_version(user), build
+
+
+def metrics_endpoint(user, params):
+    def build():
+        with app_lock:
+            trades = app.load_user_trades(user[0])
+            # Counts, P&L, win rate and durations include archived trades; the ratios below need
+            # per-trade returns and cover the live journal only
+            stats = app.get_user_trade_stats(user[0], trades)
+            return {
+                'total_trades': stats['total_trades'],
+                'archived_trades': stats['archived_trades'],
+                'total_profit_loss': stats['total_profit_loss'],
+                'win_rate': stats['win_rate'],
+                'average_profit_loss': stats['average_profit_loss'],
+                'sharpe_ratio': app.get_sharpe_ratio(trades),
+                'max_drawdown': app.get_max_drawdown(trades),
+                'average_trade_duration_seconds': stats['average_trade_duration'],
+            }
+    return trade_version(user), build
+
+
+def equity_endpoint(user, params):
+    freq = params.get('freq', 'D')
+    if freq not in ('D', 'h'):
+        raise ApiError(400, "freq must be D or h")
+    points = int_param(params, 'points', 0, 0, 100000)
+
+    def build():
+        with app_lock:
+            curve = app.get_user_equity_curve(user[0], freq)
+        if points:
+            curve = downsample_frame(curve, points)
+        return frame_payload(curve)
+    return (trade_version(user), int(time.time() // PRICE_BUCKET_SECONDS)), build
+
+
+def market_endpoint(user, params, symbol):
+    symbol = symbol.upper()
+    interval = params.get('interval', '1d')
+    if not SYMBOL_PATTERN.match(symbol):
+        raise ApiError(400, "Invalid symbol")
+    if interval not in MARKET_INTERVALS:
+        raise ApiError(400, f"interval must be one of {', '.join(MARKET_INTERVALS)}")
+    try:
+        start = pd.Timestamp(params.get('start', '2022-01-01'))
+    except ValueError:
+        raise ApiError(400, "start must be a date")
+    indicators = params.get('indicators') in ('1', 'true')
+    base = TIMEFRAMES[interval][0] if interval in TIMEFRAMES else interval
+    with app_lock:
+        if interval in TIMEFRAMES:
+            version = app.sync_candles(symbol, interval)
+        else:
+            version = app.sync_price_history((symbol,), interval, history_start(interval))
+        latest = app.conn.execute("SELECT MAX(ts), COUNT(*) FROM price_history WHERE symbol=? AND interval=?",
+                                  (symbol, base)).fetchone()
+    if not latest[1]:
+        raise ApiError(404, f"No price history for {symbol}")
+
+    def build():
+        with app_lock:
+            if indicators:
+                data = app.perform_technical_analysis(symbol, interval, version)
+            elif interval in TIMEFRAMES:
+                data = app.get_candles(symbol, interval, version)
+            else:
+                data = app.load_price_frame(symbol, interval, version)
+        data = data[data.index >= start]
+        return {'symbol': symbol, 'interval': interval, **frame_payload(data)}
+    return tuple(latest), build
+
+
+ROUTES = {
+    '/api/trades': trades_endpoint,
+    '/api/metrics': metrics_endpoint,
+    '/api/equity': equity_endpoint,
+}
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'JournalAPI/1.0'
+
+    def do_GET(self):
+        started = time.perf_counter()
+        url = urlparse(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        status = 500
+        try:
+            status = self.handle_get(url, params)
+        except ApiError as e:
+            status = self.send_json(e.status, {'error': str(e)})
+        except Exception as e:
+            logger.exception(f"API error on {url.path}: {str(e)}")
+            status = self.send_json(500, {'error': "Internal server error"})
+        finally:
+            logger.info("API request", extra={'path': url.path, 'status': status,
+                                              'duration_ms': round((time.perf_counter() - started) * 1000, 2)})
+
+    def handle_get(self, url, params):
+        if url.path == '/api/health':
+            return self.send_json(200, {'status': 'ok'})
+        user = authenticate(self.headers.get('Authorization'), self.client_address[0])
+        if user is None:
+            return self.send_json(401, {'error': "Authentication required"},
+                                  {'WWW-Authenticate': 'Basic realm="journal"'})
+        if url.path.startswith('/api/market/'):
+            version, build = market_endpoint(user, params, url.path[len('/api/market/'):])
+        elif url.path in ROUTES:
+            version, build = ROUTES[url.path](user, params)
+        else:
+            raise ApiError(404, "Not found")
+
+        etag = make_etag(user[0], url.path, sorted(params.items()), version)
+        if etag in (tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'private, no-cache')
+            self.send_header('Vary', 'Accept-Encoding, Authorization')
+            self.end_headers()
+            return 304
+        return self.send_json(200, build(), {'ETag': etag})
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, default=json_default, separators=(',', ':')).encode('utf-8')
+        encoding = None
+        if len(body) >= GZIP_MIN_BYTES and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body, compresslevel=5)
+            encoding = 'gzip'
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'private, no-cache')
+        self.send_header('Vary', 'Accept-Encoding, Authorization')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        return status
+
+    def log_message(self, format, *args):
+        # Requests are logged through the app's structured logging in do_GET
+        pass
+
+
+def main():
+    global app
+    parser = argparse.ArgumentParser(description="Serve journal trades, metrics and market data as JSON")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8502)
+    args = parser.parse_args()
+
+    app = load_app()
+    server = ThreadingHTTPServer((args.host, args.port), ApiHandler)
+    server.daemon_threads = True
+    logger.info(f"API listening on http://{args.host}:{args.port}")
+    print(f"API listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+import base64
+import collections
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+# Login support that keeps bcrypt off the script thread and lets a session outlive its websocket.
+#
+# A successful login issues a signed token "<user id>.<generation>.<expires>.<signature>" that the
+# browser keeps in a cookie; a reconnecting session verifies the HMAC (microseconds, no bcrypt)
+# instead of asking for the password again. The generation is the user's session counter when the
+# token was issued; bumping the counter (logout) revokes every token issued before.
+#
+# Password checks run in a small shared pool so a burst of logins queues behind BCRYPT_WORKERS
+# threads rather than occupying every script thread, and each client address gets a limited
+# number of attempts per window.
+
+SESSION_SECONDS = 12 * 3600
+SECRET_ENV = 'JOURNAL_SESSION_SECRET'
+BCRYPT_WORKERS = 2
+# Checks waiting beyond this are refused outright instead of piling up behind the pool
+BCRYPT_QUEUE = 16
+BCRYPT_TIMEOUT = 10
+LOGIN_ATTEMPTS = 5
+LOGIN_WINDOW_SECONDS = 60
+
+
+class AuthBusy(Exception):
+    pass
+
+
+def load_secret(path):
+    # The environment wins; otherwise a random key is generated once and kept next to the database
+    secret = os.environ.get(SECRET_ENV)
+    if secret:
+        return secret.encode('utf-8')
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    secret = secrets.token_hex(32).encode('ascii')
+    fd = os.open(path + '.tmp', os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(secret)
+    try:
+        # Another process may have won the race; its key is the one everyone keeps
+        os.link(path + '.tmp', path)
+    except FileExistsError:
+        pass
+    finally:
+        os.remove(path + '.tmp')
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def _signature(secret, payload):
+    digest = hmac.new(secret, payload.encode('ascii'), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+
+def issue_token(secret, user_id, generation=0, lifetime=SESSION_SECONDS, now=None):
+    expires = int((time.time() if now is None else now) + lifetime)
+    payload = f"{int(user_id)}.{int(generation)}.{expires}"
+    return f"{payload}.{_signature(secret, payload)}"
+
+
+def read_token(secret, token, now=None):
+    # (user id, generation) of a validly signed, unexpired token; None for anything else. Callers
+    # compare the generation with the user's current one.
+    try:
+        user_id, generation, expires, signature = token.split('.')
+        user_id, generation, expires = int(user_id), int(generation), int(expires)
+    except (AttributeError, ValueError):
+        return None
+    if not hmac.compare_digest(signature, _signature(secret, f"{user_id}.{generation}.{expires}")):
+        return None
+    if expires < (time.time() if now is None else now):
+        return None
+    return user_id, generation
+
+
+class RateLimiter:
+    # Sliding window of attempt times per key (the client address)
+
+    def __init__(self, attempts=LOGIN_ATTEMPTS, window_seconds=LOGIN_WINDOW_SECONDS):
+        self.attempts = attempts
+        self.window = window_seconds
+        self.lock = threading.Lock()
+        self.history = {}
+
+    def acquire(self, key, now=None):
+        # Records an attempt and returns 0, or the seconds to wait when the key is over its limit
+        now = time.time() if now is None else now
+        with self.lock:
+            times = self.history.setdefault(key, collections.deque())
+            while times and times[0] <= now - self.window:
+                times.popleft()
+            if len(times) >= self.attempts:
+                return times[0] + self.window - now
+            times.append(now)
+            if len(self.history) > 10000:
+                # Forget keys whose window has passed so the table cannot grow without bound
+                self.history = {k: v for k, v in self.history.items() if v and v[-1] > now - self.window}
+            return 0
+
+    def reset(self, key):
+        with self.lock:
+            self.history.pop(key, None)
+
+
+class PasswordHasher:
+    # bcrypt releases the GIL while it works, so checks in the pool run alongside the script threads
+
+    def __init__(self, workers=BCRYPT_WORKERS, queue_size=BCRYPT_QUEUE):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def _submit(self, fn, *args):
+        if not self.slots.acquire(blocking=False):
+            raise AuthBusy("Too many logins in progress")
+        try:
+            future = self.pool.submit(fn, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def hash(self, password, timeout=BCRYPT_TIMEOUT):
+        return self._submit(bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt()).result(timeout)
+
+    def check(self, password, hashed, timeout=BCRYPT_TIMEOUT):
+        if isinstance(hashed, str):
+            hashed = hashed.encode('utf-8')
+        return self._submit(bcrypt.checkpw, password.encode('utf-8'), hashed).result(timeout)
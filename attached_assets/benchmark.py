@@ -0,0 +1,359 @@
+import argparse
+import base64
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from bootstrap import ASSETS_DIR, load_app
+
+# Synthetic-data benchmarks for the journal, analytics, admin and page-render paths.
+#
+#   python benchmark.py --users 20 --trades 250 --output results.json
+#   python benchmark.py --output new.json --compare results.json
+#
+# The app runs against a fresh database in a temporary working directory, with synthetic
+# market data so runs are deterministic and need no network.
+
+BENCH_PAIRS = ('BTC/USDT', 'ETH/USDT', 'SOL/USDT', 'XRP/USDT', 'ADA/USDT', 'DOGE/USDT', 'DOT/USDT', 'AVAX/USDT')
+BENCH_STRATEGIES = ('Breakout', 'Support', 'Resistance', 'Momentum', 'Trend Following', 'Mean Reversion',
+                    'Elliott Wave', 'Wyckoff')
+NOTE_WORDS = ('breakout', 'retest', 'failed', 'volume', 'spring', 'upthrust', 'accumulation', 'distribution',
+              'fomo', 'stop', 'hunted', 'trend', 'reversal', 'divergence', 'support', 'resistance', 'range',
+              'news', 'funding', 'squeeze', 'liquidation', 'patience', 'scaled', 'partial', 'target')
+BASE_PRICES = {'BTC': 60000.0, 'ETH': 3000.0, 'SOL': 150.0, 'XRP': 0.6, 'ADA': 0.45, 'DOGE': 0.12, 'DOT': 7.0,
+               'AVAX': 35.0}
+BENCH_PASSWORD = 'benchmark'
+
+
+# Synthetic market data
+def synthetic_bars(symbol, start=None, end=None, interval='1d', limit=5000):
+    freq = {'1m': 'min', '5m': '5min', '15m': '15min', '30m': '30min', '1h': 'h', '4h': '4h', '1d': 'D', '1wk': 'W'}.get(interval, 'D')
+    end = pd.Timestamp(end or datetime.now()).floor('D')
+    start = pd.Timestamp(start or end - pd.Timedelta(days=365))
+    index = pd.date_range(start, end, freq=freq)[-limit:]
+    rng = np.random.default_rng(zlib.crc32(f"{symbol}:{interval}".encode()))
+    base = BASE_PRICES.get(symbol.split('-')[0], 10.0)
+    close = base * np.exp(np.cumsum(rng.normal(0, 0.02, len(index))))
+    spread = np.abs(rng.normal(0, 0.01, len(index)))
+    return pd.DataFrame({
+        'Open': close * (1 + rng.normal(0, 0.005, len(index))),
+        'High': close * (1 + spread),
+        'Low': close * (1 - spread),
+        'Close': close,
+        'Adj Close': close,
+        'Volume': rng.lognormal(10, 1, len(index)),
+    }, index=index.rename('Date'))
+
+
+def install_synthetic_market_data(latency=0.0):
+    # Replaces the yfinance and news calls the app makes with deterministic local data; latency
+    # (seconds per call) stands in for the round trip to the real provider
+    import requests
+    import yfinance as yf
+
+    def download(tickers, start=None, end=None, interval='1d', group_by='column', **kwargs):
+        time.sleep(latency)
+        if isinstance(tickers, str):
+            return synthetic_bars(tickers, start, end, interval)
+        return pd.concat({symbol: synthetic_bars(symbol, start, end, interval) for symbol in tickers}, axis=1)
+
+    class Ticker:
+        def __init__(self, symbol):
+            self.symbol = symbol
+
+        def history(self, period='1d', interval='1d', **kwargs):
+            time.sleep(latency)
+            return synthetic_bars(self.symbol, interval=interval).tail(1)
+
+    class NewsResponse:
+        status_code = 200
+
+        def json(self):
+            return {'articles': [{'title': f"Synthetic headline {i}", 'description': "Benchmark news item",
+                                  'url': "https://example.com"} for i in range(5)]}
+
+    real_get = requests.get
+
+    def get(url, *args, **kwargs):
+        if 'newsapi.org' in url:
+            time.sleep(latency)
+            return NewsResponse()
+        return real_get(url, *args, **kwargs)
+
+    yf.download = download
+    yf.Ticker = Ticker
+    requests.get = get
+
+
+# Synthetic journal data
+def make_screenshot(target_kb, seed):
+    # A 1280x720 chart-sized PNG whose noise patch makes it compress to roughly target_kb
+    from PIL import Image
+    rng = np.random.default_rng(seed)
+    pixels = np.full((720, 1280, 3), 30, dtype=np.uint8)
+    side = min(int((target_kb * 1024 / 3) ** 0.5), 720)
+    pixels[:side, :side] = rng.integers(0, 256, (side, side, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='PNG')
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def generate_dataset(app, users, trades_per_user, screenshot_fraction, screenshot_kb, days, seed):
+    import bcrypt
+    rng = np.random.default_rng(seed)
+    for pair in BENCH_PAIRS:
+        app.add_trading_pair(pair)
+    for strategy in BENCH_STRATEGIES:
+        app.add_analysis_type(strategy)
+    pair_ids = [app.get_reference_id(app.conn, 'trading_pairs', pair) for pair in BENCH_PAIRS]
+    strategy_ids = [app.get_reference_id(app.conn, 'analysis_types', strategy) for strategy in BENCH_STRATEGIES]
+    base_prices = [BASE_PRICES[pair.split('/')[0]] for pair in BENCH_PAIRS]
+    screenshots = [make_screenshot(kb, seed + i) for i, kb in enumerate(rng.uniform(0.5, 1.5, 4) * screenshot_kb)]
+
+    # One cheap hash shared by every synthetic user keeps generation fast
+    password = bcrypt.hashpw(BENCH_PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds=4))
+    expiry = (datetime.now() + timedelta(days=365)).isoformat()
+    app.conn.executemany("INSERT INTO users (username, password, is_admin, expiry_date, level) VALUES (?, ?, ?, ?, ?)",
+                         [(f"bench_user_{i}", password, int(i == 0), expiry, 1) for i in range(users)])
+    user_ids = [row[0] for row in app.conn.execute("SELECT id FROM users WHERE username LIKE 'bench_user_%' ORDER BY id")]
+
+    now = datetime.now()
+    for user_id in user_ids:
+        rows = []
+        for _ in range(trades_per_user):
+            pair = int(rng.integers(len(BENCH_PAIRS)))
+            opened = now - timedelta(days=float(rng.uniform(0, days)))
+            closed = opened + timedelta(hours=float(rng.exponential(48)))
+            completed = closed < now and rng.random() < 0.85
+            entry_price = base_prices[pair] * float(np.exp(rng.normal(0, 0.3)))
+            exit_price = entry_price * float(np.exp(rng.normal(0.002, 0.04))) if completed else None
+            with_screenshots = rng.random() < screenshot_fraction
+            rows.append((
+                user_id, opened.isoformat(timespec='seconds'), closed.isoformat(timespec='seconds') if completed else None,
+                pair_ids[pair], float(rng.lognormal(0, 1)), entry_price, exit_price,
+                strategy_ids[int(rng.integers(len(BENCH_STRATEGIES)))],
+                ' '.join(rng.choice(NOTE_WORDS, int(rng.integers(3, 25)))),
+                screenshots[int(rng.integers(len(screenshots)))] if with_screenshots else None,
+                screenshots[int(rng.integers(len(screenshots)))] if with_screenshots and completed else None,
+                'completed' if completed else 'active', 'long' if rng.random() < 0.6 else 'short'))
+        app.conn.executemany('''INSERT INTO trades
+                                (user_id, date, end_date, pair_id, amount, entry_price, exit_price, strategy_id, notes,
+                                 entry_screenshot, exit_screenshot, status, trade_type)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+        app.conn.commit()
+    return user_ids
+
+
+# Timing
+def summarize(samples):
+    samples = np.asarray(samples) * 1000
+    return {
+        'repeat': len(samples),
+        'min_ms': float(samples.min()),
+        'median_ms': float(np.median(samples)),
+        'mean_ms': float(samples.mean()),
+        'p95_ms': float(np.percentile(samples, 95)),
+        'max_ms': float(samples.max()),
+    }
+
+
+def measure(results, name, func, repeat, setup=None):
+    samples = []
+    try:
+        for _ in range(repeat):
+            if setup:
+                setup()
+            started = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - started)
+    except Exception as e:
+        results[name] = {'error': f"{type(e).__name__}: {e}"}
+        print(f"{name:<48} ERROR {e}")
+        return
+    results[name] = summarize(samples)
+    print(f"{name:<48} median {results[name]['median_ms']:10.2f} ms   p95 {results[name]['p95_ms']:10.2f} ms")
+
+
+PAGE_SCRIPT = '''
+import sys
+sys.path.insert(0, {assets!r})
+import benchmark
+benchmark.install_synthetic_market_data({latency!r})
+app = benchmark.load_app()
+{call}
+'''
+
+PAGES = {
+    'Dashboard': 'app.main()',
+    'Trades': 'app.show_trades_table(st_user[0])',
+    'Analysis': 'app.show_analysis(st_user[0])',
+    'Market Data': 'app.show_market_data()',
+    'Top Traders': 'app.show_top_traders()',
+    'Admin': 'app.admin_panel()',
+}
+
+
+def render_page(call, user, timeout, latency=0.0):
+    from streamlit.testing.v1 import AppTest
+    script = PAGE_SCRIPT.format(assets=ASSETS_DIR, latency=latency, call='import streamlit as st\nst_user = st.session_state.get("user")\n' + call)
+    at = AppTest.from_string(script, default_timeout=timeout)
+    if user is not None:
+        at.session_state['user'] = user
+        at.session_state['username'] = user[1]
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return at
+
+
+COLD_START_SCRIPT = '''
+import os
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_string({script!r}, default_timeout={timeout!r})
+at.run()
+os._exit(1 if at.exception else 0)
+'''
+
+
+def cold_start(timeout):
+    # Time to the login page in a fresh interpreter: imports, one-time initialization and the first run
+    script = PAGE_SCRIPT.format(assets=ASSETS_DIR, latency=0.0, call='app.main()')
+    subprocess.run([sys.executable, '-c', COLD_START_SCRIPT.format(script=script, timeout=timeout)],
+                   check=True, timeout=timeout)
+
+
+def run_benchmarks(app, user_ids, repeat, render_repeat, render_timeout):
+    import streamlit as st
+    results = {}
+    clear = st.cache_data.clear
+    user_id = user_ids[len(user_ids) // 2]
+    user = app.conn.execute("SELECT * FROM users WHERE id=?", (user_id,)).fetchone()
+    admin = app.conn.execute("SELECT * FROM users WHERE id=?", (user_ids[0],)).fetchone()
+
+    measure(results, 'load_user_trades (cold)', lambda: app.load_user_trades(user_id), repeat, setup=clear)
+    measure(results, 'load_user_trades (cached)', lambda: app.load_user_trades(user_id), repeat)
+    measure(results, 'load_user_trades (all users, cold)', lambda: [app.load_user_trades(u) for u in user_ids],
+            max(1, repeat // 5), setup=clear)
+
+    trades = app.load_user_trades(user_id)
+    for metric in ('get_total_profit_loss', 'get_win_rate', 'get_average_profit_loss', 'get_sharpe_ratio',
+                   'get_max_drawdown', 'get_average_trade_duration'):
+        measure(results, f"metrics.{metric}", lambda metric=metric: getattr(app, metric)(trades), repeat)
+    measure(results, 'metrics.get_user_equity_curve (cold)', lambda: app.get_user_equity_curve(user_id), repeat, setup=clear)
+    measure(results, 'metrics.get_user_risk_report (cold)',
+            lambda: app.get_user_risk_report(user_id, app.get_trade_data_version(user_id)), max(1, repeat // 5), setup=clear)
+
+    measure(results, 'get_top_traders (cold)', app.get_top_traders, repeat, setup=clear)
+    start, end = (datetime.now() - timedelta(days=365)).date().isoformat(), datetime.now().date().isoformat()
+    measure(results, 'admin.get_system_trade_totals', app.get_system_trade_totals, repeat)
+    measure(results, 'admin.get_daily_trade_volume', lambda: app.get_daily_trade_volume(start, end), repeat)
+    measure(results, 'admin.get_pair_trade_counts', lambda: app.get_pair_trade_counts(start, end), repeat)
+    measure(results, 'admin.get_strategy_profits', lambda: app.get_strategy_profits(start, end), repeat)
+    measure(results, 'admin.rebuild_trade_rollup', app.rebuild_trade_rollup, max(1, repeat // 5))
+    measure(results, 'search_trades', lambda: app.search_trades(user_id, 'breakout retest*'), repeat)
+
+    def backup():
+        os.remove(app.create_backup())
+    measure(results, 'create_backup', backup, max(1, repeat // 5))
+
+    measure(results, 'startup.login page (new process)', lambda: cold_start(render_timeout), render_repeat)
+    measure(results, 'render.Login (rerun)', lambda: render_page('app.main()', None, render_timeout), render_repeat)
+    for page, call in PAGES.items():
+        page_user = admin if page in ('Admin', 'Dashboard') else user
+        measure(results, f"render.{page} (cold)", lambda call=call, page_user=page_user: render_page(call, page_user, render_timeout),
+                render_repeat, setup=clear)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ASSETS_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)['scenarios']
+    print(f"\n{'scenario':<48} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before or 'median_ms' not in before or 'median_ms' not in current:
+            continue
+        change = current['median_ms'] / before['median_ms'] - 1 if before['median_ms'] else 0.0
+        print(f"{name:<48} {before['median_ms']:10.2f}ms {current['median_ms']:10.2f}ms {change:+8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the crypto journal against synthetic data")
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--trades', type=int, default=250, help="trades per user")
+    parser.add_argument('--screenshot-fraction', type=float, default=0.1, help="share of trades with screenshots")
+    parser.add_argument('--screenshot-kb', type=float, default=150, help="average screenshot PNG size")
+    parser.add_argument('--days', type=int, default=730, help="history the trades are spread over")
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--render-repeat', type=int, default=3)
+    parser.add_argument('--render-timeout', type=float, default=120)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workdir', help="directory for the synthetic database (default: a temporary one)")
+    parser.add_argument('--keep', action='store_true', help="keep the working directory")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help="earlier results JSON to compare medians against")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    baseline = os.path.abspath(args.compare) if args.compare else None
+    workdir = args.workdir or tempfile.mkdtemp(prefix='journal_bench_')
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+
+    install_synthetic_market_data()
+    app = load_app()
+    started = time.perf_counter()
+    user_ids = generate_dataset(app, args.users, args.trades, args.screenshot_fraction, args.screenshot_kb, args.days, args.seed)
+    generate_seconds = time.perf_counter() - started
+    print(f"Generated {args.users} users x {args.trades} trades in {generate_seconds:.1f}s ({workdir})")
+
+    scenarios = run_benchmarks(app, user_ids, args.repeat, args.render_repeat, args.render_timeout)
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'parameters': vars(args),
+        },
+        'dataset': {
+            'users': len(user_ids),
+            'trades': app.conn.execute("SELECT COUNT(*) FROM trades").fetchone()[0],
+            'db_size_bytes': os.path.getsize(app.DB_PATH),
+            'generate_seconds': generate_seconds,
+        },
+        'scenarios': scenarios,
+    }
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+    if baseline:
+        compare(scenarios, baseline)
+    if not args.keep and not args.workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+    # Leave without waiting for the app's background worker threads
+    sys.stdout.flush()
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
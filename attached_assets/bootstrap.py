@@ -0,0 +1,61 @@
+import importlib
+import importlib.util
+import logging
+import os
+import sys
+import threading
+import time
+
+from profiler import PROFILER
+
+logger = logging.getLogger(__name__)
+
+# Process-level start-up support for the app script. Streamlit re-executes the script on every
+# interaction but imports this module once per process, so state kept here survives reruns.
+
+ASSETS_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_PATH = os.path.join(ASSETS_DIR, 'crypto_backtest_app (1).py')
+
+_runs = 0
+_runs_lock = threading.Lock()
+
+
+class LazyModule:
+    # Stands in for a module until one of its attributes is first used, so the import cost lands on
+    # the first page that needs the library instead of on the login page
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        module = self.__dict__['_module']
+        if module is None:
+            with PROFILER.section('import', self._name):
+                module = importlib.import_module(self._name)
+            self._module = module
+        return getattr(module, attr)
+
+
+def record_script_run(script_started):
+    # The first run in a process pays for imports and one-time initialization; later runs are the
+    # per-interaction reruns
+    global _runs
+    with _runs_lock:
+        _runs += 1
+        first = _runs == 1
+    seconds = time.perf_counter() - script_started
+    PROFILER.record('startup', 'first script run' if first else 'rerun', seconds)
+    if first:
+        logger.info("First script run finished", extra={'duration_ms': round(seconds * 1000, 2)})
+
+
+def load_app():
+    # Executes the app script as a module outside `streamlit run`, the way a Streamlit rerun does
+    # (CSS, caches; one-time init only on the first load), for the tools and the API server
+    if ASSETS_DIR not in sys.path:
+        sys.path.insert(0, ASSETS_DIR)
+    spec = importlib.util.spec_from_file_location('crypto_backtest_app', APP_PATH)
+    app = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(app)
+    return app
@@ -0,0 +1,91 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Candles for every chart timeframe, aggregated from one stored base interval per family so only
+# three intervals are ever downloaded. yfinance keeps 5m bars for 60 days and 1h bars for two
+# years, which bounds how far back the intraday timeframes reach.
+#
+# Aggregation is vectorized over the whole series: bucket starts come from integer division of
+# the timestamps, and open/high/low/close/volume are ufunc reduceat calls over the bucket
+# boundaries. A CandleSeries keeps the result and, as base bars arrive, re-aggregates only from
+# the last (possibly incomplete) bucket onwards.
+
+# timeframe: (base interval, bucket seconds)
+TIMEFRAMES = {
+    '5m': ('5m', 300),
+    '15m': ('5m', 900),
+    '1h': ('1h', 3600),
+    '4h': ('1h', 4 * 3600),
+    '1d': ('1d', 86400),
+    '1w': ('1d', 7 * 86400),
+}
+# Days of base history yfinance serves; None means the full range
+BASE_HISTORY_DAYS = {'5m': 59, '1h': 729, '1d': None}
+# Buckets are aligned to the epoch (a Thursday); weeks are shifted to start on Monday
+BUCKET_OFFSET_SECONDS = {'1w': 3 * 86400}
+OHLCV = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def empty_candles():
+    return pd.DataFrame({column: pd.Series(dtype=float) for column in OHLCV}, index=pd.DatetimeIndex([], name='ts'))
+
+
+def bucket_starts(index, timeframe):
+    # Bucket start per row as datetime64[ns] integers
+    seconds = TIMEFRAMES[timeframe][1]
+    width = seconds * 10 ** 9
+    offset = BUCKET_OFFSET_SECONDS.get(timeframe, 0) * 10 ** 9
+    values = index.asi8
+    return (values + offset) // width * width - offset
+
+
+def resample_ohlcv(frame, timeframe):
+    # frame: base bars with OHLCV columns on a sorted DatetimeIndex
+    if frame.empty:
+        return empty_candles()
+    buckets = bucket_starts(frame.index, timeframe)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+    values = {column: frame[column].to_numpy(dtype=float) for column in OHLCV}
+    # fmax/fmin skip missing highs and lows instead of letting one NaN blank the candle
+    candles = pd.DataFrame({
+        'Open': values['Open'][starts],
+        'High': np.fmax.reduceat(values['High'], starts),
+        'Low': np.fmin.reduceat(values['Low'], starts),
+        'Close': values['Close'][ends],
+        'Volume': np.add.reduceat(np.nan_to_num(values['Volume']), starts),
+    }, index=pd.DatetimeIndex(buckets[starts], name='ts'))
+    return candles
+
+
+class CandleSeries:
+    # One symbol and timeframe. Base history only changes at its tail (sync_price_history refetches
+    # the last stored bar and appends), so rows before the last bucket never need re-aggregating.
+
+    def __init__(self, timeframe):
+        self.timeframe = timeframe
+        self.lock = threading.Lock()
+        self.version = None
+        self.candles = empty_candles()
+        self.first_ts = None
+        # Base rows before the last bucket, to notice history rewritten further back
+        self.settled_rows = 0
+
+    def update(self, base, version=None):
+        with self.lock:
+            if version is not None and version == self.version:
+                return self.candles
+            if base.empty:
+                self.candles = empty_candles()
+            elif self.candles.empty or base.index[0] != self.first_ts or \
+                    base.index.searchsorted(self.candles.index[-1]) != self.settled_rows:
+                self.candles = resample_ohlcv(base, self.timeframe)
+            else:
+                tail = resample_ohlcv(base.iloc[self.settled_rows:], self.timeframe)
+                self.candles = pd.concat([self.candles.iloc[:-1], tail])
+            self.first_ts = base.index[0] if not base.empty else None
+            self.settled_rows = int(base.index.searchsorted(self.candles.index[-1])) if not self.candles.empty else 0
+            self.version = version
+            return self.candles
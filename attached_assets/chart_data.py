@@ -0,0 +1,72 @@
+import numpy as np
+
+# Charts never need more points than the plot has pixels; long series are reduced to about
+# CHART_POINTS before they are turned into Plotly traces so the payload stays flat as history grows.
+CHART_POINTS = 1200
+
+
+def lttb_indices(values, threshold):
+    # Largest-Triangle-Three-Buckets: keeps the point in each bucket that forms the largest
+    # triangle with the previously kept point and the next bucket's average. NaNs are skipped.
+    values = np.asarray(values, dtype=float)
+    valid = np.flatnonzero(np.isfinite(values))
+    n = len(valid)
+    if threshold >= n or threshold < 3:
+        return valid
+    x = valid.astype(float)
+    y = values[valid]
+    every = (n - 2) / (threshold - 2)
+    kept = np.empty(threshold, dtype=int)
+    kept[0] = 0
+    a = 0
+    for i in range(threshold - 2):
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[avg_start:avg_end].mean()
+        avg_y = y[avg_start:avg_end].mean()
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        kept[i + 1] = a
+    kept[-1] = n - 1
+    return valid[kept]
+
+
+def minmax_indices(values, buckets):
+    # Per bucket, the positions of the minimum and maximum, so every spike survives
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    if n <= 2 * buckets:
+        return np.arange(n)
+    # Buckets are contiguous and differ in size by at most one, so they fit a padded 2-D grid
+    edges = (np.arange(buckets + 1) * n) // buckets
+    width = int(np.diff(edges).max())
+    positions = edges[:-1, None] + np.arange(width)
+    inside = positions < edges[1:, None]
+    grid = values[np.minimum(positions, n - 1)]
+    lows = np.where(inside & ~np.isnan(grid), grid, np.inf).argmin(axis=1)
+    highs = np.where(inside & ~np.isnan(grid), grid, -np.inf).argmax(axis=1)
+    return np.union1d(edges[:-1] + lows, edges[:-1] + highs)
+
+
+def downsample_indices(columns, max_points=CHART_POINTS, method='minmax'):
+    # Row positions to keep for a set of series sharing one x axis; the union keeps every
+    # column's extremes at the same x values. LTTB applies to single series only.
+    columns = [np.asarray(column, dtype=float) for column in columns]
+    n = len(columns[0]) if columns else 0
+    if n <= max_points:
+        return np.arange(n)
+    if method == 'lttb' and len(columns) == 1:
+        kept = lttb_indices(columns[0], max_points)
+    else:
+        buckets = max(1, max_points // (2 * len(columns)))
+        kept = np.unique(np.concatenate([minmax_indices(column, buckets) for column in columns]))
+    return np.union1d(kept, [0, n - 1])
+
+
+def downsample_frame(frame, max_points=CHART_POINTS, columns=None, method='minmax'):
+    columns = list(columns if columns is not None else frame.select_dtypes('number').columns)
+    if len(frame) <= max_points or not columns:
+        return frame
+    return frame.iloc[downsample_indices([frame[column].to_numpy() for column in columns], max_points, method)]
@@ -1,32 +1,57 @@
+import time
+# Taken before the imports so the first run in a process includes them
+SCRIPT_STARTED = time.perf_counter()
+
 import streamlit as st
+import streamlit.components.v1 as components
 import pandas as pd
 import numpy as np
-import plotly.graph_objects as go
-import plotly.express as px
 from datetime import datetime, timedelta
 import base64
 from io import BytesIO
-from PIL import Image
-import bcrypt
 import sqlite3
-from streamlit_option_menu import option_menu
 import random
 import string
-import yfinance as yf
-from ta.trend import MACD
-from ta.momentum import RSIIndicator
-from ta.volatility import BollingerBands
+import re
 import logging
 import os
 import shutil
 import schedule
-import time
 import threading
-import requests
-
-# Set up logging
-logging.basicConfig(level=logging.DEBUG, filename='app.log', filemode='a',
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+from market_analytics import portfolio_analytics
+from equity_engine import EquityEngine, max_drawdown
+from risk_metrics import equity_returns, risk_report
+import monte_carlo
+import screener
+import trade_archive
+import wyckoff
+from paper_trading import MatchingEngine, Order, ORDER_TYPES, SimulatedPriceFeed
+from replay import ReplaySession
+from indicators import IndicatorState
+from alerts import Alert, AlertEngine, ALERT_KINDS
+from presence import PresenceTracker
+from shared_cache import SharedCache
+from auth import SESSION_SECONDS, AuthBusy, PasswordHasher, RateLimiter, issue_token, load_secret, read_token
+from profiler import PROFILER, TimedCursor
+from bootstrap import LazyModule, record_script_run
+from chart_data import CHART_POINTS, downsample_frame
+from candles import BASE_HISTORY_DAYS, TIMEFRAMES, CandleSeries, bucket_starts, resample_ohlcv
+from structured_logging import configure_logging, set_log_context
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+import copy
+
+# Heavy libraries are imported on first use, so the login page does not wait for them
+go = LazyModule('plotly.graph_objects')
+px = LazyModule('plotly.express')
+pio = LazyModule('plotly.io')
+yf = LazyModule('yfinance')
+Image = LazyModule('PIL.Image')
+requests = LazyModule('requests')
+streamlit_option_menu = LazyModule('streamlit_option_menu')
+trade_snapshot = LazyModule('trade_snapshot')
+
+# Set up logging: JSON records written to a rotating app.log by a background thread
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Page configuration
@@ -153,13 +178,117 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Database connection
+DB_PATH = 'crypto_backtest.db'
+
+# Reference tables and their name column; trades store their ids
+REFERENCE_TABLES = {'trading_pairs': 'pair', 'analysis_types': 'name'}
+
+# The 14 journal columns every trade tuple in the app is indexed by; read them from trade_details,
+# which resolves the pair_id/strategy_id stored on trades back to names
+TRADE_COLUMNS = "id, user_id, date, end_date, pair, amount, entry_price, exit_price, strategy, notes, entry_screenshot, exit_screenshot, status, trade_type"
+TRADE_FIELDS = tuple(column.strip() for column in TRADE_COLUMNS.split(','))
+
+def trades_table_sql(name):
+    return f'''CREATE TABLE IF NOT EXISTS {name}
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  user_id INTEGER,
+                  date TEXT,
+                  end_date TEXT,
+                  pair_id INTEGER,
+                  amount REAL,
+                  entry_price REAL,
+                  exit_price REAL,
+                  strategy_id INTEGER,
+                  notes TEXT,
+                  entry_screenshot TEXT,
+                  exit_screenshot TEXT,
+                  status TEXT,
+                  trade_type TEXT,
+                  source TEXT DEFAULT 'journal',
+                  FOREIGN KEY (user_id) REFERENCES users(id),
+                  FOREIGN KEY (pair_id) REFERENCES trading_pairs(id),
+                  FOREIGN KEY (strategy_id) REFERENCES analysis_types(id))'''
+
 @st.cache_resource
 def get_database_connection():
-    conn = sqlite3.connect('crypto_backtest.db', check_same_thread=False)
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
     return conn
 
 conn = get_database_connection()
-c = conn.cursor()
+# Every statement on the shared cursor is timed; slow ones land in the admin Performance tab
+c = TimedCursor(conn.cursor(), PROFILER)
+
+# Upstream results (quotes, downloads, news, leaderboard) shared by every app process on this host,
+# beneath each process's own st.cache_data
+SHARED_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), 'shared_cache.db')
+QUOTE_CACHE_SECONDS = 30
+
+@st.cache_resource
+def get_shared_cache():
+    return SharedCache(SHARED_CACHE_PATH)
+
+upstream_cache = get_shared_cache()
+
+# Direction-aware P&L of a trade row, matching get_trade_profit_loss (open or untyped trades count as 0)
+TRADE_PNL_SQL = '''COALESCE(CASE {t}.trade_type
+                        WHEN 'long' THEN ({t}.exit_price - {t}.entry_price) * {t}.amount
+                        WHEN 'short' THEN ({t}.entry_price - {t}.exit_price) * {t}.amount
+                    END, 0)'''
+
+def rollup_trigger_sql(row, sign):
+    return f'''INSERT INTO trade_daily_rollup (day, pair_id, strategy_id, trade_count, completed_count, volume, pnl)
+               VALUES (COALESCE(DATE({row}.date), ''), COALESCE({row}.pair_id, 0), COALESCE({row}.strategy_id, 0),
+                       {sign}1, {sign}({row}.exit_price IS NOT NULL), {sign}COALESCE({row}.amount, 0),
+                       {sign}{TRADE_PNL_SQL.format(t=row)})
+               ON CONFLICT(day, pair_id, strategy_id) DO UPDATE SET
+                   trade_count = trade_count + excluded.trade_count,
+                   completed_count = completed_count + excluded.completed_count,
+                   volume = volume + excluded.volume,
+                   pnl = pnl + excluded.pnl;'''
+
+def rebuild_trade_rollup():
+    c.execute("DELETE FROM trade_daily_rollup")
+    c.execute(f'''INSERT INTO trade_daily_rollup (day, pair_id, strategy_id, trade_count, completed_count, volume, pnl)
+                  SELECT COALESCE(DATE(t.date), ''), COALESCE(t.pair_id, 0), COALESCE(t.strategy_id, 0),
+                         COUNT(*), SUM(t.exit_price IS NOT NULL), SUM(COALESCE(t.amount, 0)), SUM({TRADE_PNL_SQL.format(t='t')})
+                  FROM trades t
+                  GROUP BY 1, 2, 3''')
+    conn.commit()
+
+def trade_rollup_adjustment_sql(sign):
+    # Adds (sign '+') or removes ('-') the rollup contribution of the trades listed in temp.archive_ids
+    return f'''INSERT INTO trade_daily_rollup (day, pair_id, strategy_id, trade_count, completed_count, volume, pnl)
+               SELECT COALESCE(DATE(t.date), ''), COALESCE(t.pair_id, 0), COALESCE(t.strategy_id, 0),
+                      {sign}COUNT(*), {sign}SUM(t.exit_price IS NOT NULL), {sign}SUM(COALESCE(t.amount, 0)),
+                      {sign}SUM({TRADE_PNL_SQL.format(t='t')})
+               FROM trades t JOIN temp.archive_ids a ON a.id = t.id
+               WHERE true
+               GROUP BY 1, 2, 3
+               ON CONFLICT(day, pair_id, strategy_id) DO UPDATE SET
+                   trade_count = trade_count + excluded.trade_count,
+                   completed_count = completed_count + excluded.completed_count,
+                   volume = volume + excluded.volume,
+                   pnl = pnl + excluded.pnl'''
+
+def migrate_trade_references():
+    # Older databases stored the pair and strategy name on every trade row; rebuild trades with
+    # integer references. Names no longer offered in the admin lists are kept as inactive rows.
+    c.execute("INSERT OR IGNORE INTO trading_pairs (pair, active) SELECT DISTINCT pair, 0 FROM trades WHERE pair IS NOT NULL")
+    c.execute("INSERT OR IGNORE INTO analysis_types (name, active) SELECT DISTINCT strategy, 0 FROM trades WHERE strategy IS NOT NULL")
+    c.execute(trades_table_sql('trades_migrated'))
+    c.execute('''INSERT INTO trades_migrated
+                 (id, user_id, date, end_date, pair_id, amount, entry_price, exit_price, strategy_id, notes,
+                  entry_screenshot, exit_screenshot, status, trade_type, source)
+                 SELECT t.id, t.user_id, t.date, t.end_date, p.id, t.amount, t.entry_price, t.exit_price, s.id, t.notes,
+                        t.entry_screenshot, t.exit_screenshot, t.status, t.trade_type, t.source
+                 FROM trades t
+                 LEFT JOIN trading_pairs p ON p.pair = t.pair
+                 LEFT JOIN analysis_types s ON s.name = t.strategy''')
+    # Dropping trades also drops its indexes and triggers; setup_database recreates them
+    c.execute("DROP TABLE trades")
+    c.execute("ALTER TABLE trades_migrated RENAME TO trades")
+    conn.commit()
+    logger.info("Migrated trades to pair/strategy references")
 
 # Create tables and add new columns if not exists
 def setup_database():
@@ -172,24 +301,10 @@ def setup_database():
                   level INTEGER DEFAULT 1,
                   profile_picture BLOB,
                   bio TEXT,
-                  risk_tolerance TEXT)''')
+                  risk_tolerance TEXT,
+                  session_generation INTEGER NOT NULL DEFAULT 0)''')
 
-    c.execute('''CREATE TABLE IF NOT EXISTS trades
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  user_id INTEGER,
-                  date TEXT,
-                  end_date TEXT,
-                  pair TEXT,
-                  amount REAL,
-                  entry_price REAL,
-                  exit_price REAL,
-                  strategy TEXT,
-                  notes TEXT,
-                  entry_screenshot TEXT,
-                  exit_screenshot TEXT,
-                  status TEXT,
-                  trade_type TEXT,
-                  FOREIGN KEY (user_id) REFERENCES users(id))''')
+    c.execute(trades_table_sql('trades'))
 
     c.execute('''CREATE TABLE IF NOT EXISTS registration_code
                  (id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -198,11 +313,209 @@ def setup_database():
 
     c.execute('''CREATE TABLE IF NOT EXISTS analysis_types
                  (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  name TEXT UNIQUE NOT NULL)''')
+                  name TEXT UNIQUE NOT NULL,
+                  active INTEGER NOT NULL DEFAULT 1)''')
 
     c.execute('''CREATE TABLE IF NOT EXISTS trading_pairs
                  (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  pair TEXT UNIQUE NOT NULL)''')
+                  pair TEXT UNIQUE NOT NULL,
+                  active INTEGER NOT NULL DEFAULT 1)''')
+
+    for table in REFERENCE_TABLES:
+        c.execute(f"PRAGMA table_info({table})")
+        if 'active' not in [column[1] for column in c.fetchall()]:
+            c.execute(f"ALTER TABLE {table} ADD COLUMN active INTEGER NOT NULL DEFAULT 1")
+
+    c.execute("PRAGMA table_info(trades)")
+    columns = [column[1] for column in c.fetchall()]
+    if 'trade_type' not in columns:
+        c.execute("ALTER TABLE trades ADD COLUMN trade_type TEXT")
+    if 'source' not in columns:
+        c.execute("ALTER TABLE trades ADD COLUMN source TEXT DEFAULT 'journal'")
+    if 'pair' in columns:
+        migrate_trade_references()
+    c.execute("CREATE INDEX IF NOT EXISTS idx_trades_user ON trades(user_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_trades_pair ON trades(pair_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_trades_strategy ON trades(strategy_id)")
+    c.execute('''CREATE VIEW IF NOT EXISTS trade_details AS
+                 SELECT t.id, t.user_id, t.date, t.end_date, p.pair, t.amount, t.entry_price, t.exit_price,
+                        s.name AS strategy, t.notes, t.entry_screenshot, t.exit_screenshot, t.status, t.trade_type,
+                        t.source, t.pair_id, t.strategy_id
+                 FROM trades t
+                 LEFT JOIN trading_pairs p ON p.id = t.pair_id
+                 LEFT JOIN analysis_types s ON s.id = t.strategy_id''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS price_history
+                 (symbol TEXT NOT NULL,
+                  interval TEXT NOT NULL,
+                  ts TEXT NOT NULL,
+                  open REAL,
+                  high REAL,
+                  low REAL,
+                  close REAL,
+                  volume REAL,
+                  PRIMARY KEY (symbol, interval, ts)) WITHOUT ROWID''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS paper_accounts
+                 (user_id INTEGER PRIMARY KEY,
+                  balance REAL NOT NULL,
+                  starting_balance REAL NOT NULL,
+                  created_at TEXT,
+                  FOREIGN KEY (user_id) REFERENCES users(id))''')
+
+    c.execute('''CREATE TABLE IF NOT EXISTS paper_orders
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  user_id INTEGER NOT NULL,
+                  pair TEXT NOT NULL,
+                  side TEXT NOT NULL,
+                  order_type TEXT NOT NULL,
+                  quantity REAL NOT NULL,
+                  price REAL,
+                  close_trade_id INTEGER,
+                  status TEXT NOT NULL DEFAULT 'open',
+                  created_at TEXT,
+                  filled_at TEXT,
+                  fill_price REAL,
+                  trade_id INTEGER,
+                  FOREIGN KEY (user_id) REFERENCES users(id))''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_paper_orders_user_status ON paper_orders(user_id, status)")
+
+    c.execute('''CREATE TABLE IF NOT EXISTS alerts
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  user_id INTEGER NOT NULL,
+                  symbol TEXT NOT NULL,
+                  kind TEXT NOT NULL,
+                  level REAL,
+                  status TEXT NOT NULL DEFAULT 'active',
+                  created_at TEXT,
+                  fired_at TEXT,
+                  fired_value REAL,
+                  seen INTEGER NOT NULL DEFAULT 0,
+                  FOREIGN KEY (user_id) REFERENCES users(id))''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_alerts_user_status ON alerts(user_id, status, seen)")
+
+    # Per-user trade data version, bumped by triggers so caches can key on it
+    c.execute('''CREATE TABLE IF NOT EXISTS trade_versions
+                 (user_id INTEGER PRIMARY KEY,
+                  version INTEGER NOT NULL DEFAULT 0)''')
+    for event, row in (('INSERT', 'new'), ('UPDATE', 'new'), ('UPDATE', 'old'), ('DELETE', 'old')):
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS trades_version_{event.lower()}_{row}
+                      AFTER {event} ON trades
+                      BEGIN
+                          INSERT INTO trade_versions (user_id, version) VALUES ({row}.user_id, 1)
+                          ON CONFLICT(user_id) DO UPDATE SET version = version + 1;
+                      END''')
+
+    # Daily per-pair/strategy aggregates kept current by triggers so admin views never scan trades.
+    # Rollups keyed by pair/strategy name predate the id migration and are rebuilt.
+    c.execute("PRAGMA table_info(trade_daily_rollup)")
+    if 'pair' in [column[1] for column in c.fetchall()]:
+        c.execute("DROP TABLE trade_daily_rollup")
+    c.execute('''CREATE TABLE IF NOT EXISTS trade_daily_rollup
+                 (day TEXT NOT NULL,
+                  pair_id INTEGER NOT NULL,
+                  strategy_id INTEGER NOT NULL,
+                  trade_count INTEGER NOT NULL DEFAULT 0,
+                  completed_count INTEGER NOT NULL DEFAULT 0,
+                  volume REAL NOT NULL DEFAULT 0,
+                  pnl REAL NOT NULL DEFAULT 0,
+                  PRIMARY KEY (day, pair_id, strategy_id))''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_trades_date ON trades(date)")
+    rollup_missing = c.execute("SELECT 1 FROM trade_daily_rollup LIMIT 1").fetchone() is None
+    for event, rows in (('INSERT', (('new', '+'),)), ('UPDATE', (('old', '-'), ('new', '+'))), ('DELETE', (('old', '-'),))):
+        body = '\n'.join(rollup_trigger_sql(row, sign) for row, sign in rows)
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS trades_rollup_{event.lower()}
+                      AFTER {event} ON trades
+                      BEGIN
+                          {body}
+                      END''')
+
+    # Per-user summaries of archived trades (all closed) by the day they closed, so analytics can
+    # merge them with the live trades without opening the archive files
+    c.execute('''CREATE TABLE IF NOT EXISTS trade_archive_daily
+                 (user_id INTEGER NOT NULL,
+                  day TEXT NOT NULL,
+                  pair_id INTEGER NOT NULL,
+                  strategy_id INTEGER NOT NULL,
+                  trade_count INTEGER NOT NULL DEFAULT 0,
+                  wins INTEGER NOT NULL DEFAULT 0,
+                  volume REAL NOT NULL DEFAULT 0,
+                  pnl REAL NOT NULL DEFAULT 0,
+                  timed_count INTEGER NOT NULL DEFAULT 0,
+                  duration_seconds REAL NOT NULL DEFAULT 0,
+                  opened TEXT,
+                  PRIMARY KEY (user_id, day, pair_id, strategy_id))''')
+
+    # Full-text index over trade notes and strategies; rowid is the trade id
+    fts_missing = c.execute("SELECT 1 FROM sqlite_master WHERE name='trades_fts'").fetchone() is None
+    c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS trades_fts
+                 USING fts5(notes, strategy, tokenize='unicode61 remove_diacritics 2', prefix='2 3')''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS trades_fts_insert AFTER INSERT ON trades
+                 BEGIN
+                     INSERT INTO trades_fts (rowid, notes, strategy)
+                     VALUES (new.id, new.notes, (SELECT name FROM analysis_types WHERE id = new.strategy_id));
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS trades_fts_update AFTER UPDATE OF notes, strategy_id ON trades
+                 BEGIN
+                     DELETE FROM trades_fts WHERE rowid = old.id;
+                     INSERT INTO trades_fts (rowid, notes, strategy)
+                     VALUES (new.id, new.notes, (SELECT name FROM analysis_types WHERE id = new.strategy_id));
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS trades_fts_delete AFTER DELETE ON trades
+                 BEGIN
+                     DELETE FROM trades_fts WHERE rowid = old.id;
+                 END''')
+    if fts_missing:
+        c.execute("INSERT INTO trades_fts (rowid, notes, strategy) SELECT id, notes, strategy FROM trade_details")
+
+    # Presence: one row per user, upserted in batches by the presence worker
+    c.execute('''CREATE TABLE IF NOT EXISTS online_users
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  user_id INTEGER,
+                  last_activity TEXT,
+                  FOREIGN KEY (user_id) REFERENCES users(id))''')
+    if c.execute("SELECT 1 FROM sqlite_master WHERE name='idx_online_users_user'").fetchone() is None:
+        c.execute("DELETE FROM online_users WHERE id NOT IN (SELECT MAX(id) FROM online_users GROUP BY user_id)")
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_online_users_user ON online_users(user_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_online_users_activity ON online_users(last_activity)")
+
+    c.execute('''CREATE TABLE IF NOT EXISTS messages
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  sender_id INTEGER,
+                  receiver_id INTEGER,
+                  message TEXT,
+                  timestamp TEXT,
+                  FOREIGN KEY (sender_id) REFERENCES users(id),
+                  FOREIGN KEY (receiver_id) REFERENCES users(id))''')
+    c.execute("PRAGMA table_info(messages)")
+    if 'is_read' not in [column[1] for column in c.fetchall()]:
+        c.execute("ALTER TABLE messages ADD COLUMN is_read INTEGER NOT NULL DEFAULT 0")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_messages_receiver ON messages(receiver_id, timestamp)")
+
+    # Unread message counts kept current by triggers so the badge is a primary-key lookup
+    counters_missing = c.execute("SELECT 1 FROM sqlite_master WHERE name='message_counters'").fetchone() is None
+    c.execute('''CREATE TABLE IF NOT EXISTS message_counters
+                 (user_id INTEGER PRIMARY KEY,
+                  unread INTEGER NOT NULL DEFAULT 0)''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS messages_unread_insert AFTER INSERT ON messages
+                 WHEN new.is_read = 0
+                 BEGIN
+                     INSERT INTO message_counters (user_id, unread) VALUES (new.receiver_id, 1)
+                     ON CONFLICT(user_id) DO UPDATE SET unread = unread + 1;
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS messages_unread_update AFTER UPDATE OF is_read ON messages
+                 WHEN old.is_read != new.is_read
+                 BEGIN
+                     UPDATE message_counters SET unread = unread + (CASE WHEN new.is_read THEN -1 ELSE 1 END)
+                     WHERE user_id = new.receiver_id;
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS messages_unread_delete AFTER DELETE ON messages
+                 WHEN old.is_read = 0
+                 BEGIN
+                     UPDATE message_counters SET unread = unread - 1 WHERE user_id = old.receiver_id;
+                 END''')
+    if counters_missing:
+        c.execute("INSERT INTO message_counters (user_id, unread) SELECT receiver_id, SUM(is_read = 0) FROM messages GROUP BY receiver_id")
 
     # Add new columns if they don't exist
     c.execute("PRAGMA table_info(users)")
@@ -211,50 +524,173 @@ def setup_database():
         c.execute("ALTER TABLE users ADD COLUMN bio TEXT")
     if 'risk_tolerance' not in columns:
         c.execute("ALTER TABLE users ADD COLUMN risk_tolerance TEXT")
+    if 'session_generation' not in columns:
+        c.execute("ALTER TABLE users ADD COLUMN session_generation INTEGER NOT NULL DEFAULT 0")
     
-    c.execute("PRAGMA table_info(trades)")
-    columns = [column[1] for column in c.fetchall()]
-    if 'trade_type' not in columns:
-        c.execute("ALTER TABLE trades ADD COLUMN trade_type TEXT")
-
     conn.commit()
+    if rollup_missing:
+        rebuild_trade_rollup()
+
+# One-time initialization: runs once per process instead of on every rerun
+@st.cache_resource
+def initialize_database():
+    with PROFILER.section('startup', 'setup_database'):
+        setup_database()
+    return True
 
-setup_database()
+initialize_database()
 
 # Helper functions for users
+# Everything the login and the session need; profile_picture, bio and risk_tolerance stay on disk.
+# Same positions as SELECT * for the columns it keeps (user[3] is_admin, user[4] expiry_date).
+USER_COLUMNS = "id, username, password, is_admin, expiry_date, level"
+SESSION_SECRET_PATH = os.path.join(os.path.dirname(os.path.abspath(DB_PATH)), '.session_secret')
+SESSION_CACHE_SECONDS = 300
+# Comma-separated addresses of reverse proxies whose X-Forwarded-For is believed ('*' for any peer,
+# when the app is only reachable through the proxy); unset, the socket address is used as is
+TRUSTED_PROXIES = {address.strip() for address in os.environ.get('TRUSTED_PROXIES', '').split(',') if address.strip()}
+
+@st.cache_resource
+def get_password_hasher():
+    return PasswordHasher()
+
+@st.cache_resource
+def get_login_limiter():
+    return RateLimiter()
+
+@st.cache_resource
+def get_session_secret():
+    return load_secret(SESSION_SECRET_PATH)
+
 def create_user(username, password, is_admin=0):
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    hashed_password = get_password_hasher().hash(password)
     expiry_date = (datetime.now() + timedelta(days=30)).isoformat()
     c.execute("INSERT INTO users (username, password, is_admin, expiry_date, level) VALUES (?, ?, ?, ?, ?)",
               (username, hashed_password, is_admin, expiry_date, 1))
     conn.commit()
 
+def find_user(username):
+    c.execute(f"SELECT {USER_COLUMNS} FROM users WHERE username=?", (username,))
+    return c.fetchone()
+
 def verify_user(username, password):
-    c.execute("SELECT * FROM users WHERE username=?", (username,))
-    user = c.fetchone()
-    if user and bcrypt.checkpw(password.encode('utf-8'), user[2]):
+    # The bcrypt check runs in the shared pool; may raise AuthBusy or TimeoutError under a login burst
+    user = find_user(username)
+    if user and get_password_hasher().check(password, user[2]):
         return user
     return None
 
-def is_user_expired(username):
-    c.execute("SELECT expiry_date FROM users WHERE username=?", (username,))
-    expiry_date = c.fetchone()[0]
-    return datetime.fromisoformat(expiry_date) < datetime.now()
+@st.cache_data(ttl=SESSION_CACHE_SECONDS)
+def load_session_user(user_id):
+    # Reruns and reconnects read the user from here; admin changes to a user clear it
+    c.execute(f"SELECT {USER_COLUMNS} FROM users WHERE id=?", (user_id,))
+    return c.fetchone()
+
+def get_session_generation(user_id):
+    c.execute("SELECT session_generation FROM users WHERE id=?", (user_id,))
+    row = c.fetchone()
+    return row[0] if row else None
+
+@st.cache_data(ttl=SESSION_CACHE_SECONDS)
+def load_session_generation(user_id):
+    # Checked on every rerun; revoke_sessions clears it in this process, other processes notice
+    # within SESSION_CACHE_SECONDS
+    return get_session_generation(user_id)
+
+def revoke_sessions(user_id):
+    # Invalidates every session token issued to the user so far, and sessions still open elsewhere
+    c.execute("UPDATE users SET session_generation = session_generation + 1 WHERE id=?", (user_id,))
+    conn.commit()
+    load_session_generation.clear()
+
+def is_user_expired(user):
+    return bool(user[4]) and datetime.fromisoformat(user[4]) < datetime.now()
 
 def update_user_expiry(username, new_expiry_date):
     c.execute("UPDATE users SET expiry_date=? WHERE username=?", (new_expiry_date, username))
     conn.commit()
+    load_session_user.clear()
 
 def delete_user(username):
     c.execute("DELETE FROM users WHERE username=?", (username,))
     conn.commit()
+    load_session_user.clear()
+
+def get_client_ip():
+    # Behind a trusted proxy every socket comes from the proxy; the last forwarded hop is the
+    # address the proxy itself saw. Anyone else could send the header, so it is ignored for them.
+    peer = st.context.ip_address
+    forwarded = st.context.headers.get('X-Forwarded-For', '')
+    if forwarded and ('*' in TRUSTED_PROXIES or peer in TRUSTED_PROXIES):
+        return forwarded.split(',')[-1].strip()
+    return peer or 'unknown'
+
+SESSION_COOKIE = 'journal_session'
+
+def start_session(user):
+    generation = get_session_generation(user[0])
+    st.session_state.user = user
+    st.session_state.username = user[1]
+    st.session_state.session_generation = generation
+    # The signed token is kept in a cookie (see sync_session_cookie) so a reconnected or reloaded
+    # page resumes without a login, without the token ever appearing in the URL
+    st.session_state.session_token = issue_token(get_session_secret(), user[0], generation)
+
+def end_session(revoke=False):
+    # revoke=True (logout) also invalidates the user's tokens, so a copied cookie cannot log back in
+    if revoke and 'user' in st.session_state:
+        revoke_sessions(st.session_state.user[0])
+    st.session_state.pop('user', None)
+    st.session_state.pop('username', None)
+    st.session_state.pop('session_generation', None)
+    st.session_state.pop('session_token', None)
+
+def sync_session_cookie():
+    # Streamlit reads cookies (st.context.cookies, as sent when the page connected) but cannot set
+    # them, so a zero-height component writes the session's token into the page's cookie jar, or
+    # expires the cookie once the session has ended
+    token = st.session_state.get('session_token')
+    if token == st.context.cookies.get(SESSION_COOKIE):
+        return
+    value, max_age = (token, SESSION_SECONDS) if token else ('', 0)
+    components.html(f'''<script>
+        const secure = window.parent.location.protocol === 'https:' ? '; Secure' : '';
+        window.parent.document.cookie = '{SESSION_COOKIE}={value}; path=/; max-age={max_age}; SameSite=Strict' + secure;
+        </script>''', height=0)
+
+def restore_session():
+    # Refreshes the user from the session cache on every run (no query, no bcrypt) and picks a
+    # session back up from its token after a reconnect
+    if 'user' in st.session_state:
+        user = load_session_user(st.session_state.user[0])
+        if user is not None and load_session_generation(user[0]) != st.session_state.get('session_generation', 0):
+            user = None
+    else:
+        token = st.context.cookies.get(SESSION_COOKIE)
+        claims = read_token(get_session_secret(), token) if token else None
+        # A token from before the user's last logout carries an older generation
+        user = load_session_user(claims[0]) if claims and get_session_generation(claims[0]) == claims[1] else None
+        if user is not None:
+            st.session_state.session_generation = claims[1]
+            st.session_state.session_token = token
+    if user is None or (is_user_expired(user) and not user[3]):  # user[3] is is_admin
+        if 'user' in st.session_state:
+            end_session()
+        return
+    st.session_state.user = user
+    st.session_state.username = user[1]
 
 def update_user_level(user_id):
-    c.execute("SELECT COUNT(*) FROM trades WHERE user_id=?", (user_id,))
+    c.execute('''SELECT (SELECT COUNT(*) FROM trades WHERE user_id=?) +
+                        (SELECT COALESCE(SUM(trade_count), 0) FROM trade_archive_daily WHERE user_id=?)''',
+              (user_id, user_id))
     trade_count = c.fetchone()[0]
     new_level = min(10, trade_count // 10 + 1)  # Max level is 10
-    c.execute("UPDATE users SET level=? WHERE id=?", (new_level, user_id))
+    c.execute("UPDATE users SET level=? WHERE id=? AND level IS NOT ?", (new_level, user_id, new_level))
+    changed = c.rowcount
     conn.commit()
+    if changed:
+        load_session_user.clear()
 
 def update_profile_picture(user_id, image):
     image_bytes = image.getvalue()
@@ -271,19 +707,77 @@ def update_user_risk_tolerance(user_id, risk_tolerance):
 
 # Helper functions for trades
 @st.cache_data(ttl=60)
-def load_user_trades(user_id):
-    c.execute("SELECT * FROM trades WHERE user_id=?", (user_id,))
+def load_user_trades(user_id, version=None):
+    c.execute(f"SELECT {TRADE_COLUMNS} FROM trade_details WHERE user_id=?", (user_id,))
     return c.fetchall()
 
+def load_trade_page(user_id, fields, after_id=0, limit=100, status=None):
+    # Keyset page of a user's trades in id order, projected to the requested TRADE_FIELDS
+    columns = ', '.join(field for field in fields if field in TRADE_FIELDS)
+    status_filter = " AND status=?" if status else ""
+    c.execute(f"SELECT {columns} FROM trade_details WHERE user_id=? AND id > ?{status_filter} ORDER BY id LIMIT ?",
+              (user_id, after_id, *((status,) if status else ()), limit))
+    return c.fetchall()
+
+def get_trade_data_version(user_id):
+    c.execute("SELECT version FROM trade_versions WHERE user_id=?", (user_id,))
+    result = c.fetchone()
+    return result[0] if result else 0
+
+def build_search_query(text):
+    # Quoted segments become phrases, a trailing * makes a prefix term, everything else is ANDed.
+    # Tokens are re-quoted so user punctuation can never break the FTS5 query syntax.
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', text):
+        if phrase.strip():
+            terms.append('"' + phrase.replace('"', '') + '"')
+        else:
+            prefix = word.endswith('*')
+            word = word.strip('*"')
+            if word:
+                terms.append('"' + word + '"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+def search_trades(user_id, text, pair=None, strategy=None, start_date=None, end_date=None, limit=50):
+    match = build_search_query(text)
+    if not match:
+        return []
+    query = '''SELECT t.id, t.date, t.pair, t.strategy, t.status,
+                      snippet(trades_fts, 0, '**', '**', '…', 16), bm25(trades_fts)
+               FROM trades_fts JOIN trade_details t ON t.id = trades_fts.rowid
+               WHERE trades_fts MATCH ? AND t.user_id = ?'''
+    params = [match, user_id]
+    if pair:
+        query += " AND t.pair_id = ?"
+        params.append(get_reference_data()['trading_pairs'][1].get(pair))
+    if strategy:
+        query += " AND t.strategy_id = ?"
+        params.append(get_reference_data()['analysis_types'][1].get(strategy))
+    if start_date:
+        query += " AND t.date >= ?"
+        params.append(start_date.isoformat())
+    if end_date:
+        query += " AND t.date < ?"
+        params.append((end_date + timedelta(days=1)).isoformat())
+    query += " ORDER BY bm25(trades_fts) LIMIT ?"
+    params.append(limit)
+    try:
+        c.execute(query, params)
+        return c.fetchall()
+    except sqlite3.Error as e:
+        logger.error(f"Error searching trades: {str(e)}")
+        return []
+
 def save_trade(user_id, trade_data):
     try:
         c.execute('''INSERT INTO trades 
-                     (user_id, date, end_date, pair, amount, entry_price, exit_price, strategy, notes, entry_screenshot, exit_screenshot, status, trade_type) 
-                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                  (user_id, trade_data['date'], trade_data['end_date'], trade_data['pair'], trade_data['amount'],
-                   trade_data['entry_price'], trade_data['exit_price'], trade_data['strategy'],
+                     (user_id, date, end_date, pair_id, amount, entry_price, exit_price, strategy_id, notes, entry_screenshot, exit_screenshot, status, trade_type, source) 
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                  (user_id, trade_data['date'], trade_data['end_date'], get_reference_id(conn, 'trading_pairs', trade_data['pair']),
+                   trade_data['amount'], trade_data['entry_price'], trade_data['exit_price'],
+                   get_reference_id(conn, 'analysis_types', trade_data['strategy']),
                    trade_data['notes'], trade_data.get('entry_screenshot'), trade_data.get('exit_screenshot'),
-                   trade_data['status'], trade_data['trade_type']))
+                   trade_data['status'], trade_data['trade_type'], trade_data.get('source', 'journal')))
         conn.commit()
         update_user_level(user_id)
         return True, "Trade saved successfully"
@@ -299,11 +793,12 @@ def save_trade(user_id, trade_data):
 def update_trade(trade_id, trade_data):
     try:
         c.execute('''UPDATE trades 
-                     SET date=?, end_date=?, pair=?, amount=?, entry_price=?, exit_price=?, strategy=?, notes=?, 
+                     SET date=?, end_date=?, pair_id=?, amount=?, entry_price=?, exit_price=?, strategy_id=?, notes=?, 
                      entry_screenshot=?, exit_screenshot=?, status=?, trade_type=?
                      WHERE id=?''',
-                  (trade_data['date'], trade_data['end_date'], trade_data['pair'], trade_data['amount'],
-                   trade_data['entry_price'], trade_data['exit_price'], trade_data['strategy'],
+                  (trade_data['date'], trade_data['end_date'], get_reference_id(conn, 'trading_pairs', trade_data['pair']),
+                   trade_data['amount'], trade_data['entry_price'], trade_data['exit_price'],
+                   get_reference_id(conn, 'analysis_types', trade_data['strategy']),
                    trade_data['notes'], trade_data.get('entry_screenshot'), trade_data.get('exit_screenshot'),
                    trade_data['status'], trade_data['trade_type'], trade_id))
         
@@ -335,6 +830,8 @@ def delete_trade(trade_id):
         return False, f"Error deleting trade: {str(e)}"
 
 # Analysis functions
+STARTING_BALANCE = 10000.0
+
 def get_total_profit_loss(trades):
     total_pnl = 0
     for trade in trades:
@@ -390,14 +887,15 @@ def get_sharpe_ratio(trades):
     
     return np.mean(returns) / np.std(returns) if np.std(returns) != 0 else 0
 
-def get_max_drawdown(trades):
-    completed_trades = [trade for trade in trades if trade[7] is not None]
+def get_max_drawdown(trades, starting_balance=STARTING_BALANCE):
+    completed_trades = sorted([trade for trade in trades if trade[7] is not None], key=lambda trade: trade[3] or trade[2])
     if not completed_trades:
         return 0
-    cumulative = np.cumsum([get_trade_profit_loss(trade) for trade in completed_trades])
-    peak = np.maximum.accumulate(cumulative)
-    drawdown = (peak - cumulative) / peak
-    return np.max(drawdown)
+    equity = starting_balance + np.cumsum([get_trade_profit_loss(trade) for trade in completed_trades])
+    peak = np.maximum.accumulate(np.concatenate(([starting_balance], equity)))[1:]
+    # Drawdown as a fraction of the running account peak; undefined (0) while the peak is not positive
+    drawdown = np.where(peak > 0, (peak - equity) / np.where(peak > 0, peak, 1), 0)
+    return float(np.max(drawdown))
 
 def calculate_risk_reward_ratio(trade):
     try:
@@ -452,6 +950,61 @@ def calculate_profit_loss_percentage(trade):
             return ((entry_price - exit_price) / entry_price) * 100
     return 0
 
+# Journal statistics over live trades plus archived summaries
+def get_user_trade_stats(user_id, trades):
+    archived = get_archived_summary(user_id, get_trade_data_version(user_id))
+    completed_trades = [trade for trade in trades if trade[7] is not None]
+    completed = len(completed_trades) + archived['trades']
+    wins = round(get_win_rate(trades) * len(completed_trades)) + archived['wins']
+    total_pnl = get_total_profit_loss(trades) + archived['pnl']
+    timed = [trade for trade in trades if trade[3] is not None]
+    timed_count = len(timed) + archived['timed_count']
+    duration = get_average_trade_duration(trades) * len(timed) + timedelta(seconds=round(archived['duration_seconds'], 3))
+    return {
+        'total_trades': len(trades) + archived['trades'],
+        'archived_trades': archived['trades'],
+        'total_profit_loss': total_pnl,
+        'win_rate': wins / completed if completed else 0,
+        'average_profit_loss': total_pnl / completed if completed else 0,
+        'average_trade_duration': duration / timed_count if timed_count else timedelta(0),
+    }
+
+# Admin aggregate functions
+MAX_ADMIN_ROWS = 2000
+
+def get_system_trade_totals():
+    c.execute("SELECT COALESCE(SUM(trade_count), 0), COALESCE(SUM(completed_count), 0), SUM(pnl) FROM trade_daily_rollup")
+    return c.fetchone()
+
+def get_daily_trade_volume(start_date, end_date, limit=MAX_ADMIN_ROWS):
+    c.execute('''SELECT day, SUM(trade_count), SUM(volume), SUM(pnl)
+                 FROM trade_daily_rollup
+                 WHERE day BETWEEN ? AND ?
+                 GROUP BY day
+                 ORDER BY day DESC
+                 LIMIT ?''', (start_date, end_date, limit))
+    return c.fetchall()[::-1]
+
+def get_pair_trade_counts(start_date, end_date, limit=20):
+    c.execute('''SELECT COALESCE(p.pair, ''), SUM(r.trade_count) AS trades, SUM(r.pnl)
+                 FROM trade_daily_rollup r
+                 LEFT JOIN trading_pairs p ON p.id = r.pair_id
+                 WHERE r.day BETWEEN ? AND ?
+                 GROUP BY r.pair_id
+                 ORDER BY trades DESC
+                 LIMIT ?''', (start_date, end_date, limit))
+    return c.fetchall()
+
+def get_strategy_profits(start_date, end_date, limit=20):
+    c.execute('''SELECT COALESCE(s.name, ''), SUM(r.pnl) AS profit, SUM(r.trade_count), SUM(r.completed_count)
+                 FROM trade_daily_rollup r
+                 LEFT JOIN analysis_types s ON s.id = r.strategy_id
+                 WHERE r.day BETWEEN ? AND ?
+                 GROUP BY r.strategy_id
+                 ORDER BY profit DESC
+                 LIMIT ?''', (start_date, end_date, limit))
+    return c.fetchall()
+
 # Registration code functions
 def generate_registration_code():
     code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
@@ -475,49 +1028,91 @@ def verify_registration_code(code):
     return c.fetchone() is not None
 
 # Analysis type and trading pair functions
+@st.cache_resource
+def get_reference_data():
+    # Pairs and strategies only change from the admin tab, which clears this cache; trade writes
+    # (and their st.cache_data.clear()) leave it alone. Per table: (active names, id by name).
+    data = {}
+    for table, column in REFERENCE_TABLES.items():
+        rows = conn.execute(f"SELECT id, {column}, active FROM {table} ORDER BY id").fetchall()
+        data[table] = ([name for _, name, active in rows if active], {name: ref_id for ref_id, name, _ in rows})
+    return data
+
+def get_reference_id(db, table, name):
+    if name is None:
+        return None
+    ref_id = get_reference_data()[table][1].get(name)
+    if ref_id is None:
+        # Names outside the admin lists (e.g. the paper-trading strategy) are stored inactive
+        column = REFERENCE_TABLES[table]
+        db.execute(f"INSERT OR IGNORE INTO {table} ({column}, active) VALUES (?, 0)", (name,))
+        ref_id = db.execute(f"SELECT id FROM {table} WHERE {column}=?", (name,)).fetchone()[0]
+        get_reference_data.clear()
+    return ref_id
+
+def add_reference(table, name):
+    column = REFERENCE_TABLES[table]
+    try:
+        c.execute(f"INSERT INTO {table} ({column}) VALUES (?)", (name,))
+    except sqlite3.IntegrityError:
+        c.execute(f"UPDATE {table} SET active=1 WHERE {column}=? AND active=0", (name,))
+        if c.rowcount != 1:
+            return False
+    conn.commit()
+    get_reference_data.clear()
+    return True
+
+def delete_reference(table, name, trade_column):
+    column = REFERENCE_TABLES[table]
+    c.execute(f"SELECT id FROM {table} WHERE {column}=?", (name,))
+    row = c.fetchone()
+    if row is None:
+        return
+    c.execute(f"SELECT 1 FROM trades WHERE {trade_column}=? LIMIT 1", (row[0],))
+    if c.fetchone():
+        # Trades still point at it: hide it from the lists but keep the name
+        c.execute(f"UPDATE {table} SET active=0 WHERE id=?", (row[0],))
+    else:
+        c.execute(f"DELETE FROM {table} WHERE id=?", (row[0],))
+    conn.commit()
+    get_reference_data.clear()
+
 def get_analysis_types():
-    c.execute("SELECT name FROM analysis_types")
-    return [row[0] for row in c.fetchall()]
+    return list(get_reference_data()['analysis_types'][0])
 
 def get_trading_pairs():
-    c.execute("SELECT pair FROM trading_pairs")
-    return [row[0] for row in c.fetchall()]
+    return list(get_reference_data()['trading_pairs'][0])
 
 def add_analysis_type(name):
-    try:
-        c.execute("INSERT INTO analysis_types (name) VALUES (?)", (name,))
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        return False
+    return add_reference('analysis_types', name)
 
 def delete_analysis_type(name):
-    c.execute("DELETE FROM analysis_types WHERE name=?", (name,))
-    conn.commit()
+    delete_reference('analysis_types', name, 'strategy_id')
 
 def add_trading_pair(pair):
-    try:
-        c.execute("INSERT INTO trading_pairs (pair) VALUES (?)", (pair,))
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        return False
+    return add_reference('trading_pairs', pair)
 
 def delete_trading_pair(pair):
-    c.execute("DELETE FROM trading_pairs WHERE pair=?", (pair,))
-    conn.commit()
+    delete_reference('trading_pairs', pair, 'pair_id')
 
 # Top Traders functions
 @st.cache_data(ttl=60)
+@upstream_cache.cached(ttl=60)
 def get_top_traders(limit=10):
+    # Completed trades from the journal plus the archived summaries
     c.execute('''
-        SELECT u.username, COUNT(*) as total_trades, 
-               SUM(CASE WHEN t.exit_price > t.entry_price AND t.trade_type = 'long' OR
-                         t.exit_price < t.entry_price AND t.trade_type = 'short' THEN 1 ELSE 0 END) as winning_trades,
-               u.level
+        SELECT u.username, SUM(s.total_trades) as total_trades, SUM(s.winning_trades) as winning_trades, u.level
         FROM users u
-        JOIN trades t ON u.id = t.user_id
-        WHERE t.exit_price IS NOT NULL
+        JOIN (SELECT t.user_id, COUNT(*) as total_trades,
+                     SUM(CASE WHEN t.exit_price > t.entry_price AND t.trade_type = 'long' OR
+                               t.exit_price < t.entry_price AND t.trade_type = 'short' THEN 1 ELSE 0 END) as winning_trades
+              FROM trades t
+              WHERE t.exit_price IS NOT NULL
+              GROUP BY t.user_id
+              UNION ALL
+              SELECT user_id, SUM(trade_count), SUM(wins)
+              FROM trade_archive_daily
+              GROUP BY user_id) s ON s.user_id = u.id
         GROUP BY u.id
         ORDER BY (CAST(winning_trades AS FLOAT) / CAST(total_trades AS FLOAT)) DESC
         LIMIT ?
@@ -525,14 +1120,25 @@ def get_top_traders(limit=10):
     return c.fetchall()
 
 # New function for real-time market data
+@upstream_cache.cached(ttl=QUOTE_CACHE_SECONDS)
+@PROFILER.timed('fetch')
 def get_real_time_data(symbol):
     ticker = yf.Ticker(symbol)
     data = ticker.history(period="1d")
     return data.iloc[-1]['Close']
 
 # New function for technical analysis
-def perform_technical_analysis(symbol):
-    data = yf.download(symbol, start="2022-01-01", end=datetime.now().strftime("%Y-%m-%d"))
+# Indicators are computed over the full cached history so downsampling for display never changes them.
+# Chart timeframes (TIMEFRAMES) read resampled candles; other intervals read the stored bars as-is.
+@st.cache_data(ttl=3600, max_entries=32)
+def perform_technical_analysis(symbol, interval="1d", version=None):
+    from ta.trend import MACD
+    from ta.momentum import RSIIndicator
+    from ta.volatility import BollingerBands
+    
+    data = get_candles(symbol, interval, version).copy() if interval in TIMEFRAMES else load_price_frame(symbol, interval, version)
+    if data.empty:
+        return data
     
     # Calculate MACD
     macd = MACD(close=data['Close'])
@@ -550,6 +1156,740 @@ def perform_technical_analysis(symbol):
     
     return data
 
+# Price history cache functions
+QUOTE_CURRENCIES = ('USDT', 'USDC', 'BUSD', 'USD')
+
+def pair_to_symbol(pair):
+    # Map journal pairs like "BTC/USDT" or "ICPUSDT" to yfinance symbols like "BTC-USD"
+    base = pair.replace('-', '/').split('/')[0].upper()
+    if base == pair.upper():
+        for quote in QUOTE_CURRENCIES:
+            if base.endswith(quote) and len(base) > len(quote):
+                base = base[:-len(quote)]
+                break
+    return f"{base}-USD"
+
+def split_downloaded_prices(data, symbols):
+    # yf.download returns (symbol, field) columns for several tickers and plain columns for one
+    if data is None or data.empty:
+        return {}
+    if not isinstance(data.columns, pd.MultiIndex):
+        return {symbols[0]: data}
+    level = 0 if set(symbols) & set(data.columns.get_level_values(0)) else 1
+    frames = {}
+    for symbol in symbols:
+        if symbol in data.columns.get_level_values(level):
+            frames[symbol] = data.xs(symbol, axis=1, level=level).dropna(how='all')
+    return frames
+
+def store_price_history(db, symbol, interval, frame):
+    rows = [(symbol, interval, pd.Timestamp(ts).strftime('%Y-%m-%dT%H:%M:%S'),
+             float(row['Open']), float(row['High']), float(row['Low']), float(row['Close']),
+             float(row['Volume']) if not pd.isna(row['Volume']) else 0.0)
+            for ts, row in frame.dropna(subset=['Close']).iterrows()]
+    db.executemany('''INSERT OR REPLACE INTO price_history
+                     (symbol, interval, ts, open, high, low, close, volume)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+    return len(rows)
+
+@upstream_cache.cached(ttl=900)
+def download_prices(symbols, start, interval):
+    with PROFILER.section('fetch', 'sync_price_history download'):
+        return yf.download(list(symbols), start=start, interval=interval, group_by='ticker',
+                           auto_adjust=False, progress=False, threads=True)
+
+def fetch_price_history(db, symbols, interval, start):
+    # Download only the missing tail per symbol; the last cached bar is refetched since it may have been incomplete
+    placeholders = ','.join('?' * len(symbols))
+    last_cached = dict(db.execute(f'''SELECT symbol, MAX(ts) FROM price_history
+                                      WHERE interval=? AND symbol IN ({placeholders}) GROUP BY symbol''',
+                                  (interval, *symbols)).fetchall())
+    batches = {}
+    for symbol in symbols:
+        batch_start = last_cached[symbol][:10] if symbol in last_cached else start
+        batches.setdefault(batch_start, []).append(symbol)
+    stored = 0
+    for batch_start, batch in batches.items():
+        try:
+            data = download_prices(tuple(batch), batch_start, interval)
+        except Exception as e:
+            logger.error(f"Error downloading price history for {batch}: {str(e)}")
+            continue
+        for symbol, frame in split_downloaded_prices(data, batch).items():
+            stored += store_price_history(db, symbol, interval, frame)
+    db.commit()
+    logger.info(f"Synced {stored} {interval} bars for {len(symbols)} symbols")
+    return stored
+
+@st.cache_data(ttl=900)
+def sync_price_history(symbols, interval="1d", start="2022-01-01"):
+    fetch_price_history(conn, symbols, interval, start)
+    return datetime.now().isoformat()
+
+@st.cache_data(ttl=3600)
+def load_close_matrix(symbols, start, interval="1d", version=None):
+    placeholders = ','.join('?' * len(symbols))
+    c.execute(f'''SELECT ts, symbol, close FROM price_history
+                  WHERE interval=? AND ts >= ? AND symbol IN ({placeholders})''',
+              (interval, start, *symbols))
+    rows = c.fetchall()
+    if not rows:
+        return pd.DataFrame()
+    closes = pd.DataFrame(rows, columns=['ts', 'symbol', 'close']).pivot(index='ts', columns='symbol', values='close')
+    closes.index = pd.to_datetime(closes.index)
+    return closes
+
+@st.cache_data(ttl=3600, max_entries=32)
+def load_price_frame(symbol, interval="1d", version=None):
+    c.execute('''SELECT ts, open, high, low, close, volume FROM price_history
+                 WHERE symbol=? AND interval=? ORDER BY ts''', (symbol, interval))
+    data = pd.DataFrame(c.fetchall(), columns=['ts', 'Open', 'High', 'Low', 'Close', 'Volume'])
+    data.index = pd.to_datetime(data.pop('ts'))
+    return data
+
+# Candle functions
+@st.cache_resource
+def get_candle_series():
+    return {}
+
+def candle_history_start(timeframe):
+    history_days = BASE_HISTORY_DAYS[TIMEFRAMES[timeframe][0]]
+    return (datetime.now() - timedelta(days=history_days)).strftime("%Y-%m-%d") if history_days else "2022-01-01"
+
+def sync_candles(symbol, timeframe):
+    # Brings the timeframe's base interval up to date; the returned version keys the caches below
+    return sync_price_history((symbol,), TIMEFRAMES[timeframe][0], candle_history_start(timeframe))
+
+def get_candles(symbol, timeframe, version=None):
+    # One CandleSeries per symbol and timeframe for the process; a new base version re-aggregates
+    # only the last bucket onwards
+    series = get_candle_series().setdefault((symbol, timeframe), CandleSeries(timeframe))
+    return series.update(load_price_frame(symbol, TIMEFRAMES[timeframe][0], version), version)
+
+# Trading range functions
+@st.cache_data(ttl=3600, max_entries=32)
+def detect_trading_ranges(symbol, interval="1d", version=None):
+    data = get_candles(symbol, interval, version) if interval in TIMEFRAMES else load_price_frame(symbol, interval, version)
+    return wyckoff.detect(data)
+
+def get_price_versions(symbols, interval):
+    # Per-symbol data version: changes when bars are added and when the last bar is rewritten
+    placeholders = ','.join('?' * len(symbols))
+    c.execute(f'''SELECT symbol, MAX(ts), COUNT(*), TOTAL(close) + TOTAL(volume) FROM price_history
+                  WHERE interval=? AND symbol IN ({placeholders}) GROUP BY symbol''', (interval, *symbols))
+    return {symbol: tuple(version) for symbol, *version in c.fetchall()}
+
+def load_price_frames(symbols, interval):
+    # One query for many symbols' OHLCV bars, split into a frame per symbol
+    placeholders = ','.join('?' * len(symbols))
+    c.execute(f'''SELECT symbol, ts, open, high, low, close, volume FROM price_history
+                  WHERE interval=? AND symbol IN ({placeholders}) ORDER BY symbol, ts''', (interval, *symbols))
+    data = pd.DataFrame(c.fetchall(), columns=['symbol', 'ts', 'Open', 'High', 'Low', 'Close', 'Volume'])
+    data.index = pd.to_datetime(data.pop('ts'))
+    return {symbol: frame.drop(columns='symbol') for symbol, frame in data.groupby('symbol', sort=False)}
+
+def sync_trading_pair_prices(timeframe):
+    # Brings every configured pair's base bars for the timeframe up to date; returns the data
+    # versions of the symbols that have history
+    symbols = tuple(sorted({pair_to_symbol(pair) for pair in get_trading_pairs()}))
+    if not symbols:
+        return {}
+    base = TIMEFRAMES[timeframe][0]
+    sync_price_history(symbols, base, candle_history_start(timeframe))
+    return get_price_versions(symbols, base)
+
+@st.cache_resource
+def get_range_scans():
+    # (symbol, timeframe) -> (data version, scan row) for the process, so a rescan only recomputes
+    # the symbols whose bars changed since the last one
+    return {}
+
+def scan_trading_ranges(timeframe="1d", processes=1):
+    versions = sync_trading_pair_prices(timeframe)
+    base = TIMEFRAMES[timeframe][0]
+    scans = get_range_scans()
+    stale = tuple(symbol for symbol, version in versions.items() if scans.get((symbol, timeframe), (None,))[0] != version)
+    if stale:
+        with PROFILER.section('compute', f'Trading range scan: {len(stale)} symbols'):
+            frames = load_price_frames(stale, base)
+            if timeframe != base:
+                frames = {symbol: resample_ohlcv(frame, timeframe) for symbol, frame in frames.items()}
+            for symbol, row in wyckoff.scan(frames, processes).items():
+                scans[(symbol, timeframe)] = (versions[symbol], row)
+    return pd.DataFrame([scans[(symbol, timeframe)][1] for symbol in versions if (symbol, timeframe) in scans])
+
+# Screener functions
+def load_price_matrix(symbols, timeframe, start):
+    # Closes and volumes of many symbols as time x symbol frames at the timeframe
+    base = TIMEFRAMES[timeframe][0]
+    placeholders = ','.join('?' * len(symbols))
+    c.execute(f'''SELECT ts, symbol, close, volume FROM price_history
+                  WHERE interval=? AND ts >= ? AND symbol IN ({placeholders})''', (base, start, *symbols))
+    data = pd.DataFrame(c.fetchall(), columns=['ts', 'symbol', 'close', 'volume'])
+    data['ts'] = pd.to_datetime(data['ts'])
+    close = data.pivot(index='ts', columns='symbol', values='close')
+    volume = data.pivot(index='ts', columns='symbol', values='volume')
+    if timeframe != base and not close.empty:
+        buckets = pd.DatetimeIndex(bucket_starts(close.index, timeframe), name='ts')
+        close = close.groupby(buckets).last()
+        volume = volume.groupby(buckets).sum(min_count=1)
+    return close, volume
+
+@st.cache_data(ttl=3600, max_entries=16)
+def get_screener_snapshot(symbols, timeframe, versions, processes=1):
+    # Keyed on the per-symbol data versions, so indicators are recomputed only when bars arrive,
+    # however often the conditions change. The window ends at the newest bar of any symbol.
+    latest = pd.Timestamp(max(version[0] for version in versions))
+    start = latest - timedelta(seconds=TIMEFRAMES[timeframe][1] * screener.SCREEN_BARS)
+    close, volume = load_price_matrix(symbols, timeframe, start.strftime('%Y-%m-%dT%H:%M:%S'))
+    with PROFILER.section('compute', f'Screener: {len(symbols)} symbols'):
+        return screener.screen(close, volume, processes)
+
+def screen_trading_pairs(timeframe, conditions, match_all=True, processes=1):
+    # (matching rows, number of symbols screened)
+    versions = sync_trading_pair_prices(timeframe)
+    if not versions:
+        return None, 0
+    snapshot = get_screener_snapshot(tuple(versions), timeframe, tuple(versions.values()), processes)
+    return screener.apply_conditions(snapshot, conditions, match_all), len(snapshot)
+
+# Chart data functions
+RANGE_COLORS = {'Accumulation': 'rgba(0, 200, 83, 0.12)', 'Distribution': 'rgba(255, 82, 82, 0.12)',
+                None: 'rgba(158, 158, 158, 0.12)'}
+EVENT_MARKERS = {
+    'spring': ('triangle-up', '#00c853'),
+    'selling_climax': ('star', '#00e5ff'),
+    'upthrust': ('triangle-down', '#ff5252'),
+    'buying_climax': ('star', '#ffab00'),
+}
+
+@st.cache_data(ttl=3600, max_entries=128)
+def get_market_figures(symbol, start, end, interval="1d", version=None, max_points=CHART_POINTS, ranges=False):
+    # Figure JSON per (symbol, range, data version), built from at most max_points rows per chart
+    # however long the underlying history is
+    data = perform_technical_analysis(symbol, interval, version)
+    data = data[(data.index >= pd.Timestamp(start)) & (data.index < pd.Timestamp(end) + timedelta(days=1))]
+    
+    price = downsample_frame(data, max_points, ['Close', 'BB_high', 'BB_low'])
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=price.index, y=price['Close'], name='Close Price'))
+    fig.add_trace(go.Scatter(x=price.index, y=price['BB_high'], name='Bollinger High', line=dict(dash='dash')))
+    fig.add_trace(go.Scatter(x=price.index, y=price['BB_low'], name='Bollinger Low', line=dict(dash='dash')))
+    if ranges and not data.empty:
+        # Ranges and events come from the full history, clipped to the selection
+        detected = detect_trading_ranges(symbol, interval, version)
+        first, last = data.index[0], data.index[-1]
+        for _, trading_range in detected['ranges'].iterrows():
+            if trading_range['end'] < first or trading_range['start'] > last:
+                continue
+            fig.add_shape(type="rect", x0=max(trading_range['start'], first), x1=min(trading_range['end'], last),
+                          y0=trading_range['support'], y1=trading_range['resistance'], layer="below", line_width=0,
+                          fillcolor=RANGE_COLORS[trading_range['phase']],
+                          label=dict(text=trading_range['phase'] or "Range", textposition="top left", font=dict(size=10)))
+        events = detected['events']
+        events = events[(events.index >= first) & (events.index <= last)]
+        for kind, (marker, color) in EVENT_MARKERS.items():
+            selected = events[events['kind'] == kind]
+            if not selected.empty:
+                fig.add_trace(go.Scatter(x=selected.index, y=selected['price'], mode='markers', name=wyckoff.EVENT_LABELS[kind],
+                                         marker=dict(symbol=marker, size=11, color=color),
+                                         customdata=selected['volume_z'],
+                                         hovertemplate="%{x}<br>%{y:.2f}<br>Volume z %{customdata:.1f}"))
+    fig.update_layout(title=f"{symbol} {interval} Price and Bollinger Bands", xaxis_title="Date", yaxis_title="Price", template="plotly_dark", height=600)
+    
+    macd = downsample_frame(data, max_points, ['MACD', 'Signal'])
+    fig_macd = go.Figure()
+    fig_macd.add_trace(go.Scatter(x=macd.index, y=macd['MACD'], name='MACD'))
+    fig_macd.add_trace(go.Scatter(x=macd.index, y=macd['Signal'], name='Signal Line'))
+    fig_macd.update_layout(title="MACD", xaxis_title="Date", yaxis_title="Value", template="plotly_dark", height=600)
+    
+    rsi = downsample_frame(data, max_points, ['RSI'], method='lttb')
+    fig_rsi = go.Figure()
+    fig_rsi.add_trace(go.Scatter(x=rsi.index, y=rsi['RSI'], name='RSI'))
+    fig_rsi.add_hline(y=70, line_dash="dash", line_color="red", annotation_text="Overbought")
+    fig_rsi.add_hline(y=30, line_dash="dash", line_color="green", annotation_text="Oversold")
+    fig_rsi.update_layout(title="RSI", xaxis_title="Date", yaxis_title="RSI Value", template="plotly_dark", height=600)
+    
+    return {
+        'price': fig.to_json(),
+        'macd': fig_macd.to_json(),
+        'rsi': fig_rsi.to_json(),
+        'points': len(price),
+        'total': len(data),
+    }
+
+@st.cache_data(ttl=3600)
+def get_portfolio_analytics(symbols, start, window, version=None):
+    closes = load_close_matrix(symbols, start, "1d", version)
+    benchmark = "BTC-USD" if "BTC-USD" in symbols else None
+    return portfolio_analytics(closes, window, benchmark)
+
+# Portfolio equity functions
+@st.cache_resource
+def get_equity_engines():
+    return {}
+
+def get_user_equity_curve(user_id, freq="D", starting_balance=STARTING_BALANCE):
+    engine = get_equity_engines().setdefault(user_id, EquityEngine())
+    version = get_trade_data_version(user_id)
+    # Writes from other threads (paper fills) bump the version without clearing load_user_trades, so
+    # the trades are keyed by the same version the engine stores them under
+    engine.update(load_user_trades(user_id, version), version, get_archived_daily_pnl(user_id, version))
+    prices = {}
+    price_version = None
+    open_pairs = engine.open_pairs()
+    if open_pairs:
+        # Open positions are marked to market against the cached daily closes
+        symbols = tuple(sorted({pair_to_symbol(pair) for pair in open_pairs}))
+        start = engine.first_trade_time().strftime("%Y-%m-%d")
+        price_version = sync_price_history(symbols, "1d", start)
+        closes = load_close_matrix(symbols, start, "1d", price_version)
+        prices = {pair: closes[pair_to_symbol(pair)] for pair in open_pairs if pair_to_symbol(pair) in closes}
+    return engine.equity_curve(prices, freq, starting_balance, price_version)
+
+@st.cache_data(ttl=3600)
+def get_user_risk_report(user_id, version, starting_balance=STARTING_BALANCE, n_resamples=2000, window=30):
+    # Keyed on the user's trade data version so bootstraps only rerun when trades change
+    equity_curve = get_user_equity_curve(user_id, "D", starting_balance)
+    if equity_curve.empty:
+        return None
+    return risk_report(equity_returns(equity_curve['Equity']), n_resamples=n_resamples, window=window, seed=user_id)
+
+# Monte Carlo functions
+def get_completed_trade_returns(trades):
+    completed_trades = sorted([trade for trade in trades if trade[7] is not None and trade[13] in ('long', 'short')],
+                              key=lambda trade: trade[3] or trade[2])
+    return [calculate_profit_loss_percentage(trade) / 100 for trade in completed_trades]
+
+@st.cache_data(ttl=3600, max_entries=50)
+def run_monte_carlo(user_id, version, n_paths, n_trades, starting_balance, position_fraction, sizing, ruin_threshold, processes):
+    returns = get_completed_trade_returns(load_user_trades(user_id, version))
+    return monte_carlo.simulate(returns, n_paths=n_paths, n_trades=n_trades or None, starting_balance=starting_balance,
+                                position_fraction=position_fraction, sizing=sizing, ruin_threshold=ruin_threshold,
+                                processes=processes, seed=user_id)
+
+def show_monte_carlo(user_id, trades, starting_balance):
+    st.subheader("Monte Carlo Simulation")
+    returns = get_completed_trade_returns(trades)
+    if len(returns) < 2:
+        st.info("At least two completed long/short trades are needed for a simulation")
+        return
+    if starting_balance <= 0:
+        st.info("Set a starting balance greater than 0 to run a simulation")
+        return
+    
+    with st.form("monte_carlo_form"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            n_paths = st.select_slider("Simulated Paths", options=[1000, 10000, 50000, 100000], value=10000)
+            n_trades = st.number_input("Trades per Path", min_value=1, max_value=5000, value=len(returns))
+        with col2:
+            position_fraction = st.slider("Position Size (% of equity)", min_value=1, max_value=100, value=10) / 100
+            sizing = st.selectbox("Sizing", ["fractional", "fixed"], format_func=lambda x: "Compounding (% of current equity)" if x == "fractional" else "Fixed (% of starting balance)")
+        with col3:
+            ruin_threshold = st.slider("Ruin Threshold (% loss)", min_value=10, max_value=100, value=50) / 100
+            use_all_cores = st.checkbox("Use all CPU cores")
+        submitted = st.form_submit_button("Run Simulation")
+    
+    if not submitted and 'monte_carlo_params' not in st.session_state:
+        return
+    if submitted:
+        st.session_state.monte_carlo_params = (n_paths, int(n_trades), position_fraction, sizing, ruin_threshold, 0 if use_all_cores else 1)
+    n_paths, n_trades, position_fraction, sizing, ruin_threshold, processes = st.session_state.monte_carlo_params
+    result = run_monte_carlo(user_id, get_trade_data_version(user_id), n_paths, n_trades, starting_balance,
+                             position_fraction, sizing, ruin_threshold, processes)
+    summary = result['summary']
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Risk of Ruin", f"{summary['Risk of Ruin']*100:.2f}%")
+    col2.metric("Median Final Equity", f"${summary['Median Final Equity']:.2f}")
+    col3.metric("Median Max Drawdown", f"{summary['Median Max Drawdown']*100:.2f}%")
+    col4.metric("Expected Growth per Trade", f"{summary['Expected Growth per Trade']*100:.3f}%")
+    
+    fig = px.line(result['fan'].reset_index(), x='Trade', y=list(result['fan'].columns), title='Equity Percentiles Across Simulated Paths')
+    fig.update_layout(template="plotly_dark", height=600, yaxis_title="Equity")
+    st.plotly_chart(fig, use_container_width=True)
+    
+    fig = px.histogram(x=result['max_drawdown'], nbins=50, title='Max Drawdown Distribution')
+    fig.update_layout(template="plotly_dark", height=600, xaxis_title="Max Drawdown", xaxis_tickformat='.0%')
+    st.plotly_chart(fig, use_container_width=True)
+    
+    st.dataframe(pd.DataFrame(summary.items(), columns=['Statistic', 'Value']))
+
+# Paper trading functions
+PAPER_STRATEGY = "Paper Trading"
+PAPER_POLL_SECONDS = 15
+# 'live' quotes from yfinance, or 'simulated' for a random walk that starts at each pair's last
+# cached daily close, so orders can be exercised offline (PAPER_FEED_SEED makes it repeatable)
+PAPER_PRICE_FEED = os.environ.get('PAPER_PRICE_FEED', 'live')
+
+def get_paper_account(user_id):
+    c.execute("SELECT balance, starting_balance FROM paper_accounts WHERE user_id=?", (user_id,))
+    account = c.fetchone()
+    if account is None:
+        c.execute("INSERT OR IGNORE INTO paper_accounts (user_id, balance, starting_balance, created_at) VALUES (?, ?, ?, ?)",
+                  (user_id, STARTING_BALANCE, STARTING_BALANCE, datetime.now().isoformat()))
+        conn.commit()
+        account = (STARTING_BALANCE, STARTING_BALANCE)
+    return account
+
+def get_open_paper_positions(user_id):
+    c.execute(f"SELECT {TRADE_COLUMNS} FROM trade_details WHERE user_id=? AND source='paper' AND status='active' ORDER BY date", (user_id,))
+    return c.fetchall()
+
+def get_paper_orders(user_id, status=None, limit=50):
+    if status:
+        c.execute('''SELECT id, pair, side, order_type, quantity, price, close_trade_id, status, created_at, filled_at, fill_price
+                     FROM paper_orders WHERE user_id=? AND status=? ORDER BY id DESC LIMIT ?''', (user_id, status, limit))
+    else:
+        c.execute('''SELECT id, pair, side, order_type, quantity, price, close_trade_id, status, created_at, filled_at, fill_price
+                     FROM paper_orders WHERE user_id=? AND status != 'open' ORDER BY id DESC LIMIT ?''', (user_id, limit))
+    return c.fetchall()
+
+def apply_paper_fill(db, fill):
+    order, price = fill
+    cursor = db.cursor()
+    now = datetime.now().isoformat(timespec='seconds')
+    try:
+        # Claiming the order first keeps fills idempotent when more than one process sees the tick
+        cursor.execute("UPDATE paper_orders SET status='filled', fill_price=?, filled_at=? WHERE id=? AND status='open'",
+                       (price, now, order.id))
+        if cursor.rowcount != 1:
+            db.rollback()
+            return None
+        if order.close_trade_id:
+            cursor.execute(f"SELECT {TRADE_COLUMNS} FROM trade_details WHERE id=? AND user_id=? AND source='paper' AND status='active'",
+                           (order.close_trade_id, order.user_id))
+            trade = cursor.fetchone()
+            if trade is None:
+                cursor.execute("UPDATE paper_orders SET status='cancelled', fill_price=NULL WHERE id=?", (order.id,))
+                db.commit()
+                return None
+            cursor.execute("UPDATE trades SET exit_price=?, end_date=?, status='completed' WHERE id=?", (price, now, trade[0]))
+            pnl = get_trade_profit_loss(trade[:7] + (price,) + trade[8:])
+            cursor.execute("UPDATE paper_accounts SET balance = balance + ? WHERE user_id=?", (pnl, order.user_id))
+            trade_id = trade[0]
+        else:
+            cursor.execute('''INSERT INTO trades
+                              (user_id, date, end_date, pair_id, amount, entry_price, exit_price, strategy_id, notes, status, trade_type, source)
+                              VALUES (?, ?, NULL, ?, ?, ?, NULL, ?, ?, 'active', ?, 'paper')''',
+                           (order.user_id, now, get_reference_id(db, 'trading_pairs', order.pair), order.quantity, price,
+                            get_reference_id(db, 'analysis_types', PAPER_STRATEGY),
+                            f"Paper {order.order_type} order #{order.id}", 'long' if order.side == 'buy' else 'short'))
+            trade_id = cursor.lastrowid
+        cursor.execute("UPDATE paper_orders SET trade_id=? WHERE id=?", (trade_id, order.id))
+        db.commit()
+        logger.info(f"Paper order {order.id} filled at {price}")
+        return trade_id
+    except sqlite3.Error as e:
+        db.rollback()
+        logger.error(f"Database error when filling paper order {order.id}: {str(e)}")
+        return None
+
+@st.cache_resource
+def get_simulated_price_feed():
+    seed = os.environ.get('PAPER_FEED_SEED')
+    return SimulatedPriceFeed(seed=int(seed) if seed else None)
+
+def get_paper_price(db, pair):
+    if PAPER_PRICE_FEED != 'simulated':
+        return float(get_real_time_data(pair_to_symbol(pair)))
+    feed = get_simulated_price_feed()
+    price = feed.latest(pair)
+    if price is None:
+        row = db.execute('''SELECT close FROM price_history WHERE symbol=? AND interval='1d'
+                            ORDER BY ts DESC LIMIT 1''', (pair_to_symbol(pair),)).fetchone()
+        price = feed.add_pair(pair, row[0] if row else float(get_real_time_data(pair_to_symbol(pair))))
+    return price
+
+def run_paper_trading_worker(engine, db):
+    while True:
+        if PAPER_PRICE_FEED == 'simulated':
+            get_simulated_price_feed().next_prices()
+        for pair in engine.active_pairs():
+            try:
+                price = get_paper_price(db, pair)
+            except Exception as e:
+                logger.error(f"Error fetching paper trading price for {pair}: {str(e)}")
+                continue
+            for fill in engine.on_tick(pair, price):
+                apply_paper_fill(db, fill)
+        time.sleep(PAPER_POLL_SECONDS)
+
+@st.cache_resource
+def get_paper_engine():
+    engine = MatchingEngine()
+    db = sqlite3.connect(DB_PATH, check_same_thread=False, timeout=30)
+    rows = db.execute('''SELECT id, user_id, pair, side, order_type, quantity, price, close_trade_id
+                         FROM paper_orders WHERE status='open' ''').fetchall()
+    for row in rows:
+        engine.add_order(Order(*row))
+    threading.Thread(target=run_paper_trading_worker, args=(engine, db), daemon=True).start()
+    logger.info(f"Paper trading engine started with {len(rows)} resting orders")
+    return engine
+
+def place_paper_order(user_id, pair, side, order_type, quantity, price=None, close_trade_id=None):
+    if order_type not in ORDER_TYPES:
+        return False, f"Unknown order type: {order_type}"
+    if quantity <= 0:
+        return False, "Quantity must be greater than 0"
+    if order_type != 'market' and (price is None or price <= 0):
+        return False, "Limit and stop orders need a price greater than 0"
+    if close_trade_id is not None and close_trade_id not in {trade[0] for trade in get_open_paper_positions(user_id)}:
+        return False, f"Trade #{close_trade_id} is not one of your open paper positions"
+    engine = get_paper_engine()
+    if order_type == 'market':
+        try:
+            price_now = get_paper_price(conn, pair)
+        except Exception as e:
+            logger.error(f"Error fetching paper trading price for {pair}: {str(e)}")
+            return False, f"No market price available for {pair}"
+        # The fresh quote is a tick like any other: resting orders it crosses fill here
+        for fill in engine.on_tick(pair, price_now):
+            apply_paper_fill(conn, fill)
+    if close_trade_id is None:
+        balance, _ = get_paper_account(user_id)
+        used = sum(float(trade[5]) * float(trade[6]) for trade in get_open_paper_positions(user_id))
+        notional = quantity * (price if order_type != 'market' else engine.last_prices[pair])
+        if notional > balance - used:
+            return False, f"Insufficient buying power: order needs ${notional:.2f}, available ${balance - used:.2f}"
+    try:
+        c.execute('''INSERT INTO paper_orders (user_id, pair, side, order_type, quantity, price, close_trade_id, created_at)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                  (user_id, pair, side, order_type, quantity, price if order_type != 'market' else None, close_trade_id,
+                   datetime.now().isoformat(timespec='seconds')))
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        logger.error(f"Database error when placing paper order: {str(e)}")
+        return False, f"Database error: {str(e)}"
+    order = Order(c.lastrowid, user_id, pair, side, order_type, quantity, price, close_trade_id)
+    fills = engine.add_order(order)
+    for fill in fills:
+        apply_paper_fill(conn, fill)
+    return True, f"Order #{order.id} filled at {fills[0].price:.8g}" if fills else f"Order #{order.id} placed"
+
+def cancel_paper_order(user_id, order_id):
+    c.execute("UPDATE paper_orders SET status='cancelled' WHERE id=? AND user_id=? AND status='open'", (order_id, user_id))
+    conn.commit()
+    if c.rowcount != 1:
+        return False, f"Order #{order_id} is no longer open"
+    get_paper_engine().cancel_order(order_id)
+    return True, f"Order #{order_id} cancelled"
+
+# Alert functions
+ALERT_POLL_SECONDS = 30
+ALERT_KIND_LABELS = {
+    'price_cross': "Price crosses level",
+    'rsi_above': "RSI crosses above",
+    'rsi_below': "RSI crosses below",
+    'bollinger_breakout': "Bollinger band breakout",
+}
+
+def seed_indicator_state(db, symbol, before):
+    # Warm the indicators on cached daily closes up to (not including) the live bar
+    state = IndicatorState()
+    for (close,) in db.execute('''SELECT close FROM price_history WHERE symbol=? AND interval='1d' AND ts < ?
+                                  ORDER BY ts''', (symbol, before)):
+        state.update(close)
+    return state
+
+def record_fired_alert(db, alert, value):
+    db.execute("UPDATE alerts SET status='fired', fired_at=?, fired_value=? WHERE id=? AND status='active'",
+               (datetime.now().isoformat(timespec='seconds'), value, alert.id))
+    db.commit()
+    logger.info(f"Alert {alert.id} ({alert.kind} {alert.symbol}) fired at {value}")
+
+def warn_unevaluable_alerts(engine, symbol, indicators):
+    for alert in engine.indicator_alerts(symbol):
+        field = 'RSI' if alert.kind.startswith('rsi') else 'BB_high'
+        if indicators.get(field) != indicators.get(field):
+            logger.warning(f"Alert {alert.id} ({alert.kind} {alert.symbol}) cannot be evaluated: no daily price history for its indicator")
+
+def run_alert_worker(engine, db):
+    states = {}
+    while True:
+        today = datetime.now().date().isoformat()
+        symbols = engine.symbols()
+        unseeded = tuple(symbol for symbol in symbols if states.get(symbol, (None,))[0] != today)
+        if unseeded:
+            # Indicators are seeded from cached daily closes, which only exist for symbols someone
+            # has charted unless the worker fetches them itself. The worker runs beside script
+            # threads, so it writes through its own connection rather than the shared cursor.
+            try:
+                fetch_price_history(db, unseeded, "1d", "2022-01-01")
+            except Exception as e:
+                logger.error(f"Error syncing alert price history for {unseeded}: {str(e)}")
+        for symbol in symbols:
+            try:
+                price = float(get_real_time_data(symbol))
+            except Exception as e:
+                logger.error(f"Error fetching alert price for {symbol}: {str(e)}")
+                continue
+            seeded = states.get(symbol, (None,))[0] != today
+            if seeded:
+                states[symbol] = (today, seed_indicator_state(db, symbol, today))
+            # The live price is evaluated as today's provisional close without advancing the state
+            indicators = copy.deepcopy(states[symbol][1]).update(price)
+            if seeded:
+                warn_unevaluable_alerts(engine, symbol, indicators)
+            for alert, value in engine.on_tick(symbol, price, indicators):
+                record_fired_alert(db, alert, value)
+        time.sleep(ALERT_POLL_SECONDS)
+
+@st.cache_resource
+def get_alert_engine():
+    engine = AlertEngine()
+    db = sqlite3.connect(DB_PATH, check_same_thread=False, timeout=30)
+    rows = db.execute("SELECT id, user_id, symbol, kind, level FROM alerts WHERE status='active'").fetchall()
+    for row in rows:
+        engine.add(Alert(*row))
+    threading.Thread(target=run_alert_worker, args=(engine, db), daemon=True).start()
+    logger.info(f"Alert engine started with {len(rows)} active alerts")
+    return engine
+
+def create_alert(user_id, symbol, kind, level=None):
+    if kind == 'price_cross':
+        if level is None or level <= 0:
+            return False, "Price level must be greater than 0"
+        try:
+            current_price = float(get_real_time_data(symbol))
+        except Exception as e:
+            logger.error(f"Error fetching alert price for {symbol}: {str(e)}")
+            return False, f"No market price available for {symbol}"
+        kind = 'price_above' if level > current_price else 'price_below'
+    elif kind not in ALERT_KINDS:
+        return False, f"Unknown alert type: {kind}"
+    try:
+        c.execute("INSERT INTO alerts (user_id, symbol, kind, level, created_at) VALUES (?, ?, ?, ?, ?)",
+                  (user_id, symbol, kind, level, datetime.now().isoformat(timespec='seconds')))
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        logger.error(f"Database error when creating alert: {str(e)}")
+        return False, f"Database error: {str(e)}"
+    get_alert_engine().add(Alert(c.lastrowid, user_id, symbol, kind, level))
+    return True, "Alert created"
+
+def cancel_alert(user_id, alert_id):
+    c.execute("UPDATE alerts SET status='cancelled' WHERE id=? AND user_id=? AND status='active'", (alert_id, user_id))
+    conn.commit()
+    get_alert_engine().remove(alert_id)
+
+def get_user_alerts(user_id, status, limit=100):
+    c.execute('''SELECT id, symbol, kind, level, created_at, fired_at, fired_value, seen
+                 FROM alerts WHERE user_id=? AND status=? ORDER BY id DESC LIMIT ?''', (user_id, status, limit))
+    return c.fetchall()
+
+def get_unseen_alert_count(user_id):
+    c.execute("SELECT COUNT(*) FROM alerts WHERE user_id=? AND status='fired' AND seen=0", (user_id,))
+    return c.fetchone()[0]
+
+def mark_alerts_seen(user_id):
+    c.execute("UPDATE alerts SET seen=1 WHERE user_id=? AND status='fired' AND seen=0", (user_id,))
+    conn.commit()
+
+def describe_alert(kind, level):
+    if kind == 'price_above':
+        return f"Price crosses above {level:.8g}"
+    if kind == 'price_below':
+        return f"Price crosses below {level:.8g}"
+    if kind == 'rsi_above':
+        return f"RSI crosses above {level:.2f}"
+    if kind == 'rsi_below':
+        return f"RSI crosses below {level:.2f}"
+    return "Bollinger band breakout"
+
+# Presence functions
+PRESENCE_TIMEOUT_SECONDS = 300
+PRESENCE_FLUSH_SECONDS = 30
+
+def flush_presence(tracker, db):
+    # One batched upsert per interval instead of a write per rerun, then refresh the active set
+    pending = tracker.take_pending()
+    try:
+        if pending:
+            db.executemany('''INSERT INTO online_users (user_id, last_activity) VALUES (?, ?)
+                              ON CONFLICT(user_id) DO UPDATE SET last_activity = MAX(last_activity, excluded.last_activity)''',
+                           [(user_id, datetime.fromtimestamp(seen).isoformat(timespec='seconds')) for user_id, seen in pending.items()])
+            db.commit()
+        cutoff = datetime.fromtimestamp(time.time() - PRESENCE_TIMEOUT_SECONDS).isoformat(timespec='seconds')
+        active = db.execute("SELECT user_id, last_activity FROM online_users WHERE last_activity >= ?", (cutoff,)).fetchall()
+    except sqlite3.Error as e:
+        tracker.restore_pending(pending)
+        logger.error(f"Error flushing presence: {str(e)}")
+        return
+    tracker.merge([(user_id, datetime.fromisoformat(seen).timestamp()) for user_id, seen in active])
+
+def run_presence_worker(tracker, db):
+    while True:
+        time.sleep(PRESENCE_FLUSH_SECONDS)
+        flush_presence(tracker, db)
+
+@st.cache_resource
+def get_presence_tracker():
+    tracker = PresenceTracker(PRESENCE_TIMEOUT_SECONDS)
+    db = sqlite3.connect(DB_PATH, check_same_thread=False, timeout=30)
+    flush_presence(tracker, db)
+    threading.Thread(target=run_presence_worker, args=(tracker, db), daemon=True).start()
+    return tracker
+
+def get_online_users(limit=50):
+    # Most recently active first, read from the last_activity index one page at a time
+    cutoff = datetime.fromtimestamp(time.time() - PRESENCE_TIMEOUT_SECONDS).isoformat(timespec='seconds')
+    c.execute('''SELECT u.username, o.last_activity FROM online_users o
+                 JOIN users u ON u.id = o.user_id
+                 WHERE o.last_activity >= ?
+                 ORDER BY o.last_activity DESC LIMIT ?''', (cutoff, limit))
+    return c.fetchall()
+
+# Messaging functions
+INBOX_PAGE_SIZE = 20
+MAX_MESSAGE_LENGTH = 2000
+
+def send_message(sender_id, receiver_username, text):
+    text = text.strip()
+    if not text:
+        return False, "Message is empty"
+    if len(text) > MAX_MESSAGE_LENGTH:
+        return False, f"Messages are limited to {MAX_MESSAGE_LENGTH} characters"
+    c.execute("SELECT id FROM users WHERE username=?", (receiver_username,))
+    receiver = c.fetchone()
+    if not receiver:
+        return False, f"No user named {receiver_username}"
+    try:
+        c.execute("INSERT INTO messages (sender_id, receiver_id, message, timestamp, is_read) VALUES (?, ?, ?, ?, 0)",
+                  (sender_id, receiver[0], text, datetime.now().isoformat(timespec='seconds')))
+        conn.commit()
+        return True, f"Message sent to {receiver_username}"
+    except sqlite3.Error as e:
+        logger.error(f"Error sending message: {str(e)}")
+        return False, "Error sending message"
+
+def get_inbox_page(user_id, before=None, limit=INBOX_PAGE_SIZE):
+    # Keyset pagination over idx_messages_receiver: before is the (timestamp, id) of the previous
+    # page's last row, so every page costs O(page) however deep it is
+    after_cursor = " AND (m.timestamp, m.id) < (?, ?)" if before else ""
+    c.execute(f'''SELECT m.id, m.sender_id, u.username, m.message, m.timestamp, m.is_read
+                  FROM messages m
+                  LEFT JOIN users u ON u.id = m.sender_id
+                  WHERE m.receiver_id=?{after_cursor}
+                  ORDER BY m.timestamp DESC, m.id DESC LIMIT ?''', (user_id, *(before or ()), limit))
+    return c.fetchall()
+
+def get_unread_message_count(user_id):
+    c.execute("SELECT unread FROM message_counters WHERE user_id=?", (user_id,))
+    result = c.fetchone()
+    return result[0] if result else 0
+
+def mark_messages_read(user_id, message_ids):
+    if not message_ids:
+        return
+    placeholders = ','.join('?' * len(message_ids))
+    c.execute(f"UPDATE messages SET is_read=1 WHERE receiver_id=? AND is_read=0 AND id IN ({placeholders})",
+              (user_id, *message_ids))
+    conn.commit()
+
 # Backup functions
 def create_backup():
     backup_dir = "backups"
@@ -559,21 +1899,205 @@ def create_backup():
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     backup_file = os.path.join(backup_dir, f"backup_{timestamp}.db")
     
-    shutil.copy2('crypto_backtest.db', backup_file)
+    shutil.copy2(DB_PATH, backup_file)
     logger.info(f"Backup created: {backup_file}")
     return backup_file
 
 def schedule_backup():
     schedule.every().day.at("13:00").do(create_backup)
 
+# Columnar snapshot functions
+def refresh_trade_snapshot():
+    try:
+        summary = trade_snapshot.export_snapshot(DB_PATH)
+        logger.info(f"Trade snapshot refreshed: {summary['users_updated']} users, {summary['rows_written']} trades in {summary['seconds']:.2f}s")
+        return summary
+    except Exception as e:
+        logger.error(f"Error refreshing trade snapshot: {str(e)}")
+        return None
+
+def schedule_snapshot():
+    schedule.every().hour.do(refresh_trade_snapshot)
+
+# Trade archive functions
+# Closed trades older than this many days move from trades to the yearly archive partitions
+ARCHIVE_AFTER_DAYS = int(os.environ.get('TRADE_ARCHIVE_DAYS', 365))
+
+@st.cache_data(ttl=3600)
+def get_archived_summary(user_id, version=None):
+    c.execute('''SELECT COALESCE(SUM(trade_count), 0), COALESCE(SUM(wins), 0), COALESCE(SUM(volume), 0),
+                        COALESCE(SUM(pnl), 0), COALESCE(SUM(timed_count), 0), COALESCE(SUM(duration_seconds), 0),
+                        MAX(day)
+                 FROM trade_archive_daily WHERE user_id=?''', (user_id,))
+    row = c.fetchone()
+    return dict(zip(('trades', 'wins', 'volume', 'pnl', 'timed_count', 'duration_seconds', 'last_day'), row))
+
+@st.cache_data(ttl=3600)
+def get_archived_daily_pnl(user_id, version=None):
+    # (first opened, day closed, realized P&L) per day
+    c.execute("SELECT MIN(opened), day, SUM(pnl) FROM trade_archive_daily WHERE user_id=? GROUP BY day ORDER BY day", (user_id,))
+    return c.fetchall()
+
+@st.cache_data(ttl=3600)
+def get_archived_breakdown(user_id, version=None):
+    c.execute('''SELECT COALESCE(p.pair, ''), COALESCE(s.name, ''), SUM(a.trade_count), SUM(a.pnl)
+                 FROM trade_archive_daily a
+                 LEFT JOIN trading_pairs p ON p.id = a.pair_id
+                 LEFT JOIN analysis_types s ON s.id = a.strategy_id
+                 WHERE a.user_id=?
+                 GROUP BY a.pair_id, a.strategy_id''', (user_id,))
+    return pd.DataFrame(c.fetchall(), columns=['Pair', 'Strategy', 'Trades', 'Profit/Loss'])
+
+def load_archived_trades(user_id):
+    # Reads the user's chunks from every partition their summaries point at; rows are ARCHIVE_COLUMNS
+    c.execute("SELECT DISTINCT substr(day, 1, 4) FROM trade_archive_daily WHERE user_id=?", (user_id,))
+    rows = []
+    for (year,) in c.fetchall():
+        path = trade_archive.partition_path(trade_archive.ARCHIVE_DIR, year)
+        if not os.path.exists(path):
+            logger.error(f"Archive partition {path} is missing")
+            continue
+        with sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True) as archive:
+            for (payload,) in archive.execute("SELECT payload FROM trade_chunks WHERE user_id=? ORDER BY month, id", (user_id,)):
+                rows.extend(trade_archive.decode_chunk(payload))
+    return rows
+
+def archive_old_trades(max_age_days=ARCHIVE_AFTER_DAYS, archive_dir=trade_archive.ARCHIVE_DIR):
+    # Moves closed trades that ended before the cutoff into their year's partition. Each year is one
+    # transaction over the main database and the attached partition: chunks written, summaries and
+    # rollup kept whole, rows deleted (the delete triggers bump versions and drop the search index).
+    cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat()
+    started = time.perf_counter()
+    db = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+    archived = 0
+    try:
+        db.execute("CREATE TEMP TABLE IF NOT EXISTS archive_ids (id INTEGER PRIMARY KEY)")
+        # Trades are summarized, partitioned and aged by the day they closed, when their P&L is realized
+        selection = '''exit_price IS NOT NULL AND date IS NOT NULL AND COALESCE(end_date, date) < ?'''
+        years = [year for (year,) in db.execute(f"SELECT DISTINCT substr(COALESCE(end_date, date), 1, 4) FROM trades WHERE {selection}",
+                                                (cutoff,))]
+        for year in sorted(years):
+            trade_archive.attach_partition(db, archive_dir, year)
+            try:
+                db.execute("BEGIN IMMEDIATE")
+                try:
+                    db.execute("DELETE FROM temp.archive_ids")
+                    db.execute(f'''INSERT INTO temp.archive_ids SELECT id FROM trades
+                                   WHERE {selection} AND COALESCE(end_date, date) >= ? AND COALESCE(end_date, date) < ?''',
+                               (cutoff, year, str(int(year) + 1)))
+                    rows = db.execute(f'''SELECT {', '.join('t.' + column for column in trade_archive.ARCHIVE_COLUMNS)}
+                                          FROM trades t JOIN temp.archive_ids a ON a.id = t.id
+                                          ORDER BY t.user_id, COALESCE(t.end_date, t.date)''').fetchall()
+                    archived_at = datetime.now().isoformat()
+                    db.executemany('''INSERT INTO archive.trade_chunks (user_id, month, trade_count, first_id, last_id, archived_at, payload)
+                                      VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                                   [(user_id, month, len(chunk), min(row[0] for row in chunk), max(row[0] for row in chunk),
+                                     archived_at, trade_archive.encode_chunk(chunk))
+                                    for user_id, month, chunk in trade_archive.chunk_rows(rows)])
+                    db.execute(f'''INSERT INTO trade_archive_daily
+                                   (user_id, day, pair_id, strategy_id, trade_count, wins, volume, pnl, timed_count, duration_seconds, opened)
+                                   SELECT t.user_id, DATE(COALESCE(t.end_date, t.date)), COALESCE(t.pair_id, 0), COALESCE(t.strategy_id, 0), COUNT(*),
+                                          SUM(CASE WHEN t.exit_price > t.entry_price AND t.trade_type = 'long' OR
+                                                        t.exit_price < t.entry_price AND t.trade_type = 'short' THEN 1 ELSE 0 END),
+                                          SUM(COALESCE(t.amount, 0)), SUM({TRADE_PNL_SQL.format(t='t')}),
+                                          SUM(t.end_date IS NOT NULL),
+                                          COALESCE(SUM((julianday(t.end_date) - julianday(t.date)) * 86400), 0), MIN(t.date)
+                                   FROM trades t JOIN temp.archive_ids a ON a.id = t.id
+                                   WHERE true
+                                   GROUP BY 1, 2, 3, 4
+                                   ON CONFLICT(user_id, day, pair_id, strategy_id) DO UPDATE SET
+                                       trade_count = trade_count + excluded.trade_count,
+                                       wins = wins + excluded.wins,
+                                       volume = volume + excluded.volume,
+                                       pnl = pnl + excluded.pnl,
+                                       timed_count = timed_count + excluded.timed_count,
+                                       duration_seconds = duration_seconds + excluded.duration_seconds,
+                                       opened = MIN(opened, excluded.opened)''')
+                    # The system-wide rollup covers archived trades too: add their share back before
+                    # the delete trigger takes it out
+                    db.execute(trade_rollup_adjustment_sql('+'))
+                    db.execute("DELETE FROM trades WHERE id IN (SELECT id FROM temp.archive_ids)")
+                    db.execute("COMMIT")
+                except BaseException:
+                    db.execute("ROLLBACK")
+                    raise
+            finally:
+                trade_archive.detach_partition(db)
+            archived += len(rows)
+            logger.info(f"Archived {len(rows)} trades from {year}")
+    finally:
+        db.close()
+    return {'trades': archived, 'cutoff': cutoff, 'seconds': time.perf_counter() - started}
+
+def restore_archived_trades(user_id, archive_dir=trade_archive.ARCHIVE_DIR):
+    # Puts a user's archived trades back into trades with their original ids
+    db = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+    restored = 0
+    try:
+        db.execute("CREATE TEMP TABLE IF NOT EXISTS archive_ids (id INTEGER PRIMARY KEY)")
+        years = [year for (year,) in db.execute("SELECT DISTINCT substr(day, 1, 4) FROM trade_archive_daily WHERE user_id=?", (user_id,))]
+        for year in sorted(years):
+            trade_archive.attach_partition(db, archive_dir, year)
+            try:
+                db.execute("BEGIN IMMEDIATE")
+                try:
+                    rows = [row for (payload,) in db.execute("SELECT payload FROM archive.trade_chunks WHERE user_id=?", (user_id,))
+                            for row in trade_archive.decode_chunk(payload)]
+                    db.executemany(f'''INSERT INTO trades ({', '.join(trade_archive.ARCHIVE_COLUMNS)})
+                                       VALUES ({', '.join('?' * len(trade_archive.ARCHIVE_COLUMNS))})''', rows)
+                    db.execute("DELETE FROM temp.archive_ids")
+                    db.executemany("INSERT INTO temp.archive_ids (id) VALUES (?)", [(row[0],) for row in rows])
+                    # The insert trigger counted them again; the rollup already had them
+                    db.execute(trade_rollup_adjustment_sql('-'))
+                    db.execute("DELETE FROM trade_archive_daily WHERE user_id=? AND day >= ? AND day < ?",
+                               (user_id, year, str(int(year) + 1)))
+                    db.execute("DELETE FROM archive.trade_chunks WHERE user_id=?", (user_id,))
+                    db.execute("COMMIT")
+                except BaseException:
+                    db.execute("ROLLBACK")
+                    raise
+            finally:
+                trade_archive.detach_partition(db)
+            restored += len(rows)
+    finally:
+        db.close()
+    update_user_level(user_id)
+    logger.info(f"Restored {restored} archived trades for user {user_id}")
+    return restored
+
+def run_scheduled_archive():
+    try:
+        summary = archive_old_trades()
+        if summary['trades']:
+            # Trade lists are cached by user id only; the summaries key on the version the deletes bumped
+            load_user_trades.clear()
+        return summary
+    except Exception as e:
+        logger.error(f"Error archiving trades: {str(e)}")
+        return None
+
+def schedule_archive():
+    schedule.every().day.at("03:00").do(run_scheduled_archive)
+
 def run_schedule():
     while True:
         schedule.run_pending()
         time.sleep(60)
 
-# Start the backup scheduler in a separate thread
-backup_thread = threading.Thread(target=run_schedule)
-backup_thread.start()
+# Start the backup, snapshot and archive scheduler in a separate thread, once per process
+@st.cache_resource
+def start_scheduler():
+    schedule_backup()
+    schedule_snapshot()
+    schedule_archive()
+    scheduler_thread = threading.Thread(target=run_schedule, daemon=True)
+    scheduler_thread.start()
+    return scheduler_thread
+
+start_scheduler()
+# Resting paper orders and active alerts are watched from startup, not from the first page visit
+get_paper_engine()
+get_alert_engine()
 
 def get_last_backup_time():
     backup_dir = "backups"
@@ -588,6 +2112,8 @@ def get_last_backup_time():
     return datetime.fromtimestamp(os.path.getctime(os.path.join(backup_dir, latest_backup)))
 
 # Function to fetch latest crypto news
+@upstream_cache.cached(ttl=900)
+@PROFILER.timed('fetch')
 def get_crypto_news():
     url = "https://newsapi.org/v2/everything"
     params = {
@@ -613,13 +2139,22 @@ def login_page():
         username = st.text_input("Username")
         password = st.text_input("Password", type="password")
         if st.button("Login", key="login_button"):
-            user = verify_user(username, password)
+            client_ip = get_client_ip()
+            wait_seconds = get_login_limiter().acquire(client_ip)
+            if wait_seconds:
+                st.error(f"Too many login attempts. Try again in {int(wait_seconds) + 1} seconds.")
+                return
+            try:
+                user = verify_user(username, password)
+            except (AuthBusy, TimeoutError):
+                st.error("The server is busy. Please try again in a moment.")
+                return
             if user:
-                if is_user_expired(username) and not user[3]:  # user[3] is is_admin
+                if is_user_expired(user) and not user[3]:  # user[3] is is_admin
                     st.error("Your account has expired. Please contact the administrator.")
                 else:
-                    st.session_state.user = user
-                    st.session_state.username = username
+                    get_login_limiter().reset(client_ip)
+                    start_session(user)
                     st.success("Logged in successfully!")
                     st.rerun()
             else:
@@ -646,6 +2181,8 @@ def register_page():
                     st.rerun()
                 except sqlite3.IntegrityError:
                     st.error("Username already exists")
+                except (AuthBusy, TimeoutError):
+                    st.error("The server is busy. Please try again in a moment.")
             else:
                 st.error("Invalid registration code")
         if st.button("Back to Login", key="back_to_login"):
@@ -657,18 +2194,26 @@ def add_or_edit_trade_form(user_id, trade_id=None):
     st.header("Edit Trade" if is_edit else "Add New Trade")
     
     if is_edit:
-        c.execute("SELECT * FROM trades WHERE id=?", (trade_id,))
+        c.execute(f"SELECT {TRADE_COLUMNS} FROM trade_details WHERE id=?", (trade_id,))
         trade = c.fetchone()
     else:
         trade = None
     
+    trading_pairs = get_trading_pairs()
+    strategies = get_analysis_types()
+    # A pair or strategy removed from the admin lists is still offered for the trades that use it,
+    # so saving the form does not quietly move the trade to another one
+    if trade and trade[4] is not None and trade[4] not in trading_pairs:
+        trading_pairs.insert(0, trade[4])
+    if trade and trade[8] is not None and trade[8] not in strategies:
+        strategies.insert(0, trade[8])
     form_key = f"trade_form_{trade_id}" if is_edit else "new_trade_form"
     with st.form(form_key):
         col1, col2 = st.columns(2)
         with col1:
             date = st.date_input("Start Date", value=datetime.fromisoformat(trade[2]).date() if trade else None)
             time = st.time_input("Start Time", value=datetime.fromisoformat(trade[2]).time() if trade else None)
-            pair = st.selectbox("Trading Pair", get_trading_pairs(), index=get_trading_pairs().index(trade[4]) if trade else 0)
+            pair = st.selectbox("Trading Pair", trading_pairs, index=trading_pairs.index(trade[4]) if trade and trade[4] in trading_pairs else 0)
             amount = st.number_input("Amount", min_value=0.0, format="%.8f", value=float(trade[5]) if trade else 0.0)
             entry_price = st.number_input("Entry Price", min_value=0.0, format="%.8f", value=float(trade[6]) if trade else 0.0)
             trade_type = st.selectbox("Trade Type", ['long', 'short'], index=['long', 'short'].index(trade[13]) if trade and trade[13] else 0)
@@ -676,7 +2221,7 @@ def add_or_edit_trade_form(user_id, trade_id=None):
             end_date = st.date_input("End Date (Leave blank if trade is open)", value=datetime.fromisoformat(trade[3]).date() if trade and trade[3] else None)
             end_time = st.time_input("End Time (Leave blank if trade is open)", value=datetime.fromisoformat(trade[3]).time() if trade and trade[3] else None)
             exit_price = st.number_input("Exit Price (Leave 0 if trade is open)", min_value=0.0, format="%.8f", value=float(trade[7]) if trade and trade[7] else 0.0)
-            strategy = st.selectbox("Strategy", get_analysis_types(), index=get_analysis_types().index(trade[8]) if trade and trade[8] in get_analysis_types() else 0)
+            strategy = st.selectbox("Strategy", strategies, index=strategies.index(trade[8]) if trade and trade[8] in strategies else 0)
         
         notes = st.text_area("Notes", value=trade[9] if trade else '')
         entry_screenshot = st.file_uploader("Upload Entry Screenshot", type=['png', 'jpg', 'jpeg'])
@@ -730,6 +2275,31 @@ def add_or_edit_trade_form(user_id, trade_id=None):
                 st.error(f"An unexpected error occurred: {str(e)}")
                 logger.error(f"Unexpected error in add_or_edit_trade_form: {str(e)}")
 
+def show_trade_search(user_id):
+    st.subheader("Search Journal")
+    text = st.text_input("Search notes and strategies", placeholder='e.g. breakout, "failed retest", fomo*')
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        pair = st.selectbox("Pair", ["All"] + get_trading_pairs(), key="search_pair")
+    with col2:
+        strategy = st.selectbox("Strategy", ["All"] + get_analysis_types(), key="search_strategy")
+    with col3:
+        date_range = st.date_input("Date Range", value=(), key="search_dates")
+    if not text:
+        return
+    start_date = date_range[0] if len(date_range) > 0 else None
+    end_date = date_range[1] if len(date_range) > 1 else start_date
+    started = time.perf_counter()
+    results = search_trades(user_id, text, None if pair == "All" else pair, None if strategy == "All" else strategy,
+                            start_date, end_date)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if results:
+        st.caption(f"{len(results)} matching trades in {elapsed_ms:.1f} ms")
+        for trade_id, date, trade_pair, trade_strategy, status, snippet, _ in results:
+            st.markdown(f"**#{trade_id}** {date[:10] if date else ''} · {trade_pair} · {trade_strategy} · {status}  \n{snippet or ''}")
+    else:
+        st.info("No trades match your search")
+
 def show_trades_table(user_id):
     st.header("Trades Table")
     
@@ -738,6 +2308,8 @@ def show_trades_table(user_id):
         st.cache_data.clear()
         st.rerun()
     
+    show_trade_search(user_id)
+    
     trades = load_user_trades(user_id)
     if trades:
         df = pd.DataFrame(trades, columns=['ID', 'User ID', 'Start Date', 'End Date', 'Pair', 'Amount', 'Entry Price', 'Exit Price', 'Strategy', 'Notes', 'Entry Screenshot', 'Exit Screenshot', 'Status', 'Trade Type'])
@@ -809,24 +2381,49 @@ def show_trades_table(user_id):
                             st.error(message)
     else:
         st.info("No trades to display")
+    
+    archived = get_archived_summary(user_id, get_trade_data_version(user_id))
+    if archived['trades']:
+        with st.expander(f"Archived Trades ({archived['trades']}, through {archived['last_day']})"):
+            st.caption(f"Closed trades older than {ARCHIVE_AFTER_DAYS} days are archived. They count in your statistics "
+                       "but are read-only and not searchable.")
+            if st.button("Load Archived Trades", key="load_archived_trades"):
+                archived_df = pd.DataFrame(load_archived_trades(user_id), columns=trade_archive.ARCHIVE_COLUMNS)
+                references = get_reference_data()
+                for column, table in (('pair', 'trading_pairs'), ('strategy', 'analysis_types')):
+                    names = {ref_id: name for name, ref_id in references[table][1].items()}
+                    archived_df[column] = archived_df[f"{column}_id"].map(names)
+                st.dataframe(archived_df[['id', 'date', 'end_date', 'pair', 'amount', 'entry_price', 'exit_price',
+                                          'strategy', 'status', 'trade_type']])
 
 def show_analysis(user_id):
     st.header("Performance Analysis")
     trades = load_user_trades(user_id)
     
+    col5, col6 = st.columns(2)
+    with col5:
+        resolution = st.selectbox("Equity Curve Resolution", ["Daily", "Hourly"])
+    with col6:
+        starting_balance = st.number_input("Starting Balance", min_value=0.0, value=STARTING_BALANCE, step=1000.0)
+    
+    version = get_trade_data_version(user_id)
+    risk = get_user_risk_report(user_id, version, starting_balance)
+    
     col1, col2, col3, col4 = st.columns(4)
-    total_pnl = get_total_profit_loss(trades)
-    win_rate = get_win_rate(trades)
-    avg_pnl = get_average_profit_loss(trades)
-    sharpe = get_sharpe_ratio(trades)
+    stats = get_user_trade_stats(user_id, trades)
+    total_pnl = stats['total_profit_loss']
+    win_rate = stats['win_rate']
+    avg_pnl = stats['average_profit_loss']
+    sharpe = risk['metrics'].loc['Sharpe Ratio', 'Value'] if risk else get_sharpe_ratio(trades)
     
     col1.metric("Total Profit/Loss", f"${total_pnl:.2f}", delta=f"${total_pnl:.2f}")
     col2.metric("Win Rate", f"{win_rate*100:.2f}%")
     col3.metric("Avg Profit/Loss per Trade", f"${avg_pnl:.2f}", delta=f"${avg_pnl:.2f}")
-    col4.metric("Sharpe Ratio", f"{sharpe:.2f}")
+    col4.metric("Sharpe Ratio (annualized)" if risk else "Sharpe Ratio", f"{sharpe:.2f}")
     
-    max_dd = get_max_drawdown(trades)
-    avg_duration = get_average_trade_duration(trades)
+    equity_curve = get_user_equity_curve(user_id, "D" if resolution == "Daily" else "h", starting_balance)
+    max_dd = max_drawdown(equity_curve)
+    avg_duration = stats['average_trade_duration']
     
     st.metric("Maximum Drawdown", f"{max_dd*100:.2f}%")
     st.metric("Average Trade Duration", f"{avg_duration}")
@@ -836,31 +2433,54 @@ def show_analysis(user_id):
         df['Start Date'] = pd.to_datetime(df['Start Date'])
         df['End Date'] = pd.to_datetime(df['End Date'])
         df['Profit/Loss'] = df.apply(lambda row: get_trade_profit_loss(row), axis=1)
-        df['Cumulative PnL'] = df['Profit/Loss'].cumsum()
-        
-        # Cumulative Profit/Loss Over Time
-        fig = px.line(df, x='Start Date', y='Cumulative PnL', title='Cumulative Profit/Loss Over Time')
-        fig.update_layout(template="plotly_dark", height=600)
-        st.plotly_chart(fig, use_container_width=True)
         
-        # Profit/Loss by Strategy
-        strategy_pnl = df.groupby('Strategy')['Profit/Loss'].sum().reset_index()
-        fig = px.bar(strategy_pnl, x='Strategy', y='Profit/Loss', title='Profit/Loss by Strategy')
-        fig.update_layout(template="plotly_dark", height=600)
-        st.plotly_chart(fig, use_container_width=True)
-        
-        # Trade Distribution by Pair
-        pair_counts = df['Pair'].value_counts()
-        fig = px.pie(pair_counts, values=pair_counts.values, names=pair_counts.index, title='Trade Distribution by Pair')
-        fig.update_layout(template="plotly_dark", height=600)
-        st.plotly_chart(fig, use_container_width=True)
-        
-        # Win Rate Trend
-        df['Win'] = df['Profit/Loss'] > 0
-        df['Cumulative Win Rate'] = df['Win'].cumsum() / (df.index + 1)
-        fig = px.line(df, x='Start Date', y='Cumulative Win Rate', title='Win Rate Trend')
-        fig.update_layout(template="plotly_dark", height=600)
-        st.plotly_chart(fig, use_container_width=True)
+        with PROFILER.section('chart', 'Analysis: equity and risk'):
+            # Equity curve with open positions marked to market; hourly curves are downsampled for display
+            chart_curve = downsample_frame(equity_curve, CHART_POINTS, ['Equity', 'Realized P&L', 'Unrealized P&L'])
+            fig = px.line(chart_curve.reset_index(), x='Date', y=['Equity', 'Realized P&L', 'Unrealized P&L'], title='Portfolio Equity Over Time')
+            fig.update_layout(template="plotly_dark", height=600, yaxis_title="Value")
+            st.plotly_chart(fig, use_container_width=True)
+            
+            chart_drawdown = downsample_frame(equity_curve, CHART_POINTS, ['Drawdown %'])
+            fig = px.area(chart_drawdown.reset_index(), x='Date', y='Drawdown %', title='Drawdown')
+            fig.update_layout(template="plotly_dark", height=600, yaxis_tickformat='.0%')
+            st.plotly_chart(fig, use_container_width=True)
+            
+            # Risk metrics with bootstrap confidence intervals
+            if risk:
+                st.subheader("Risk Metrics")
+                st.caption(f"Daily equity returns, {risk['confidence']:.0%} bootstrap confidence intervals")
+                st.dataframe(risk['metrics'].style.format('{:.4f}'))
+                chart_rolling = downsample_frame(risk['rolling'], CHART_POINTS, ['Rolling Sharpe', 'Rolling Sortino'])
+                fig = px.line(chart_rolling.reset_index(), x='Date', y=['Rolling Sharpe', 'Rolling Sortino'], title='Rolling 30-Day Risk-Adjusted Return')
+                fig.update_layout(template="plotly_dark", height=600, yaxis_title="Ratio")
+                st.plotly_chart(fig, use_container_width=True)
+            
+        with PROFILER.section('chart', 'Analysis: breakdowns'):
+            # Breakdowns include archived trades through their summaries
+            archived = get_archived_breakdown(user_id, version)
+            
+            # Profit/Loss by Strategy
+            strategy_pnl = pd.concat([df[['Strategy', 'Profit/Loss']], archived[['Strategy', 'Profit/Loss']]]) \
+                .groupby('Strategy')['Profit/Loss'].sum().reset_index()
+            fig = px.bar(strategy_pnl, x='Strategy', y='Profit/Loss', title='Profit/Loss by Strategy')
+            fig.update_layout(template="plotly_dark", height=600)
+            st.plotly_chart(fig, use_container_width=True)
+            
+            # Trade Distribution by Pair
+            pair_counts = df['Pair'].value_counts().add(archived.groupby('Pair')['Trades'].sum(), fill_value=0)
+            fig = px.pie(pair_counts, values=pair_counts.values, names=pair_counts.index, title='Trade Distribution by Pair')
+            fig.update_layout(template="plotly_dark", height=600)
+            st.plotly_chart(fig, use_container_width=True)
+            
+            # Win Rate Trend
+            df['Win'] = df['Profit/Loss'] > 0
+            df['Cumulative Win Rate'] = df['Win'].cumsum() / (df.index + 1)
+            fig = px.line(downsample_frame(df, CHART_POINTS, ['Cumulative Win Rate'], method='lttb'), x='Start Date', y='Cumulative Win Rate', title='Win Rate Trend')
+            fig.update_layout(template="plotly_dark", height=600)
+            st.plotly_chart(fig, use_container_width=True)
+            
+        show_monte_carlo(user_id, trades, starting_balance)
     else:
         st.info("No trades to analyze")
 
@@ -894,34 +2514,478 @@ def show_market_data():
     with col2:
         refresh = st.button("Refresh Data")
         if refresh:
+            sync_price_history.clear()
+            upstream_cache.clear('download_prices')
             st.rerun()
     
     # Display historical data and technical analysis
     st.subheader("Technical Analysis")
-    data = perform_technical_analysis(symbol)
+    timeframe = st.radio("Timeframe", list(TIMEFRAMES), index=list(TIMEFRAMES).index("1d"), horizontal=True,
+                         key="market_timeframe")
+    version = sync_candles(symbol, timeframe)
+    data = perform_technical_analysis(symbol, timeframe, version)
+    if data.empty:
+        st.info(f"No {timeframe} price history available for {symbol}")
+        show_range_scan(timeframe)
+        return
+    
+    # Streamlit charts report no zoom events, so detail comes from narrowing the range: the
+    # selection is downsampled again on its own and shows full resolution once it is short enough
+    first, last = data.index[0].date(), data.index[-1].date()
+    start, end = first, last
+    if first < last:
+        start, end = st.slider("Date Range", min_value=first, max_value=last, value=(first, last),
+                               key=f"market_range_{symbol}_{timeframe}")
+    
+    show_ranges = st.checkbox("Show Wyckoff trading ranges", value=True, key="market_ranges")
+    
+    with PROFILER.section('chart', 'Market Data: charts'):
+        figures = get_market_figures(symbol, start, end, timeframe, version, ranges=show_ranges)
+        st.caption(f"Showing {figures['points']:,} of {figures['total']:,} points")
+        # Plot price and indicators
+        st.plotly_chart(pio.from_json(figures['price']), use_container_width=True)
+        st.plotly_chart(pio.from_json(figures['macd']), use_container_width=True)
+        st.plotly_chart(pio.from_json(figures['rsi']), use_container_width=True)
+    
+    show_range_scan(timeframe)
+
+def show_range_scan(timeframe):
+    st.subheader("Trading Range Scan")
+    st.caption(f"Latest Wyckoff range and event on the {timeframe} chart of every configured trading pair")
+    col1, col2 = st.columns(2)
+    with col1:
+        use_all_cores = st.checkbox("Use all CPU cores", key="range_scan_cores")
+    with col2:
+        if st.button("Scan All Pairs"):
+            st.session_state.range_scan = True
+    if not st.session_state.get('range_scan'):
+        return
+    results = scan_trading_ranges(timeframe, 0 if use_all_cores else 1)
+    if results.empty:
+        st.info("No price history available for the configured trading pairs")
+        return
+    # Symbols sitting in a range first, nearest the bottom of it first
+    results = results.sort_values(['In Range', 'Range Position'], ascending=[False, True]).set_index('Symbol')
+    st.dataframe(results.style.format({'Last Close': '{:,.4f}', 'Support': '{:,.4f}', 'Resistance': '{:,.4f}',
+                                       'Range Position': '{:.0%}'}, na_rep='-'), use_container_width=True)
+
+def show_screener():
+    st.header("Market Screener")
+    st.caption("Screens every configured trading pair at once; matches are listed with the conditions they met")
+    with st.form("screener_form"):
+        col1, col2 = st.columns(2)
+        with col1:
+            timeframe = st.selectbox("Timeframe", list(TIMEFRAMES), index=list(TIMEFRAMES).index("1d"))
+        with col2:
+            match = st.radio("Match", ["All conditions", "Any condition"], horizontal=True)
+            use_all_cores = st.checkbox("Use all CPU cores")
+        col1, col2 = st.columns(2)
+        with col1:
+            use_rsi = st.checkbox("RSI", value=True)
+            rsi_operator = st.selectbox("RSI Condition", ["<", ">"])
+            rsi_level = st.number_input("RSI Level", min_value=0.0, max_value=100.0, value=30.0)
+            use_macd = st.checkbox("MACD Crossover")
+            macd_direction = st.selectbox("Crossover Direction", ["bullish", "bearish"], format_func=str.title)
+            macd_within = st.number_input("Crossed Within (bars)", min_value=1, max_value=screener.CROSS_LOOKBACK, value=3)
+        with col2:
+            use_bollinger = st.checkbox("Bollinger Bands")
+            bollinger_side = st.selectbox("Close", ["outside", "below", "above"],
+                                          format_func=lambda x: {"outside": "Outside the bands", "below": "Below the lower band", "above": "Above the upper band"}[x])
+            use_volume = st.checkbox("Volume Spike")
+            volume_multiple = st.number_input(f"Volume vs {screener.VOLUME_WINDOW}-Bar Average", min_value=1.0, value=2.0, step=0.5)
+        submitted = st.form_submit_button("Run Screener")
+    
+    if submitted:
+        conditions = []
+        if use_rsi:
+            conditions.append(('rsi', rsi_operator, float(rsi_level)))
+        if use_macd:
+            conditions.append(('macd_cross', macd_direction, int(macd_within)))
+        if use_bollinger:
+            conditions.append(('bollinger', bollinger_side))
+        if use_volume:
+            conditions.append(('volume_spike', float(volume_multiple)))
+        st.session_state.screener_params = (timeframe, tuple(conditions), match == "All conditions", 0 if use_all_cores else 1)
+    if 'screener_params' not in st.session_state:
+        return
+    timeframe, conditions, match_all, processes = st.session_state.screener_params
+    started = time.perf_counter()
+    results, screened = screen_trading_pairs(timeframe, conditions, match_all, processes)
+    if results is None:
+        st.info("No price history available for the configured trading pairs")
+        return
+    st.caption(f"{len(results)} of {screened} pairs match on {timeframe} · {(time.perf_counter() - started) * 1000:.0f} ms")
+    if results.empty:
+        return
+    results = results.assign(Cross=results['Cross'].map({1: "Bullish", -1: "Bearish", 0: ""})).rename_axis("Symbol")
+    st.dataframe(results.style.format({'Close': '{:,.4f}', 'RSI': '{:.1f}', 'MACD': '{:.4f}', 'Signal': '{:.4f}',
+                                       'Bars Since Cross': '{:.0f}', 'BB High': '{:,.4f}', 'BB Low': '{:,.4f}',
+                                       'Volume Ratio': '{:.2f}x'}, na_rep='-'), use_container_width=True)
+
+def show_portfolio_analytics():
+    st.header("Portfolio Analytics")
+    symbols = tuple(sorted({pair_to_symbol(pair) for pair in get_trading_pairs()}))
+    if not symbols:
+        st.info("No trading pairs configured")
+        return
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        window = st.selectbox("Rolling Window (days)", [7, 30, 90, 180], index=1)
+    with col2:
+        start = st.date_input("History Start", value=datetime(2022, 1, 1).date())
+    
+    version = sync_price_history(symbols, "1d", "2022-01-01")
+    analytics = get_portfolio_analytics(symbols, start.isoformat(), window, version)
+    if analytics is None:
+        st.info("No price history available for the configured trading pairs")
+        return
+    
+    summary = analytics['summary']
+    st.subheader("Universe Summary")
+    st.dataframe(summary.style.format({column: '{:.2%}' for column in summary.columns if column != 'Last Close'}))
+    
+    # Correlation heatmap
+    fig = px.imshow(analytics['correlation'], zmin=-1, zmax=1, color_continuous_scale='RdBu_r',
+                    title=f'{window}-Day Return Correlation')
+    fig.update_layout(template="plotly_dark", height=600)
+    st.plotly_chart(fig, use_container_width=True)
+    
+    # Normalized performance and volatility for a selection of symbols
+    selected = st.multiselect("Compare Symbols", options=list(summary.index), default=list(summary.index[:5]))
+    if selected:
+        fig = px.line(analytics['normalized'][selected], title='Normalized Performance')
+        fig.update_layout(template="plotly_dark", height=600, yaxis_title="Growth of $1")
+        st.plotly_chart(fig, use_container_width=True)
+        
+        fig = px.line(analytics['volatility'][selected], title=f'{window}-Day Annualized Volatility')
+        fig.update_layout(template="plotly_dark", height=600, yaxis_title="Volatility")
+        st.plotly_chart(fig, use_container_width=True)
+        
+        rolling_corr = analytics['rolling_correlation']
+        benchmark_columns = [symbol for symbol in selected if symbol in rolling_corr.columns and symbol != "BTC-USD"]
+        if benchmark_columns:
+            fig = px.line(rolling_corr[benchmark_columns], title=f'{window}-Day Rolling Correlation to BTC-USD')
+            fig.update_layout(template="plotly_dark", height=600, yaxis_title="Correlation")
+            st.plotly_chart(fig, use_container_width=True)
+
+def show_paper_trading(user_id):
+    st.header("Paper Trading")
+    if PAPER_PRICE_FEED == 'simulated':
+        st.caption("Prices come from the simulated feed, not the live market")
+    engine = get_paper_engine()
+    balance, starting_balance = get_paper_account(user_id)
+    positions = get_open_paper_positions(user_id)
+    
+    marks = {}
+    for pair in {trade[4] for trade in positions}:
+        marks[pair] = engine.last_prices.get(pair)
+        if marks[pair] is None:
+            try:
+                marks[pair] = get_paper_price(conn, pair)
+            except Exception as e:
+                logger.error(f"Error fetching paper trading price for {pair}: {str(e)}")
+    unrealized = sum(get_trade_profit_loss(trade[:7] + (marks[trade[4]],) + trade[8:]) for trade in positions if marks.get(trade[4]))
+    equity = balance + unrealized
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Cash Balance", f"${balance:.2f}")
+    col2.metric("Equity", f"${equity:.2f}", delta=f"${equity - starting_balance:.2f}")
+    col3.metric("Unrealized P&L", f"${unrealized:.2f}")
+    col4.metric("Open Positions", len(positions))
+    
+    st.subheader("Place Order")
+    with st.form("paper_order_form"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            pair = st.selectbox("Trading Pair", get_trading_pairs(), key="paper_pair")
+            side = st.selectbox("Side", ['buy', 'sell'], format_func=lambda x: "Buy (open long)" if x == 'buy' else "Sell (open short)")
+        with col2:
+            order_type = st.selectbox("Order Type", list(ORDER_TYPES), format_func=str.title)
+            quantity = st.number_input("Quantity", min_value=0.0, format="%.8f")
+        with col3:
+            price = st.number_input("Limit/Stop Price (ignored for market orders)", min_value=0.0, format="%.8f")
+        submitted = st.form_submit_button("Submit Order")
+    if submitted:
+        success, message = place_paper_order(user_id, pair, side, order_type, quantity, price if order_type != 'market' else None)
+        if success:
+            st.success(message)
+            st.cache_data.clear()
+        else:
+            st.error(message)
+    
+    st.subheader("Open Positions")
+    if positions:
+        for trade in positions:
+            mark = marks.get(trade[4])
+            pnl = get_trade_profit_loss(trade[:7] + (mark,) + trade[8:]) if mark else 0
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                color = "green" if pnl > 0 else "red"
+                st.markdown(f"#{trade[0]} {trade[13]} {trade[5]} {trade[4]} @ {trade[6]} | Mark: {mark if mark else 'N/A'} | "
+                            f"P&L: <span style='color:{color}'>{pnl:.2f}</span>", unsafe_allow_html=True)
+            with col2:
+                if st.button(f"Close #{trade[0]}", key=f"close_paper_{trade[0]}"):
+                    close_side = 'sell' if trade[13] == 'long' else 'buy'
+                    success, message = place_paper_order(user_id, trade[4], close_side, 'market', float(trade[5]), close_trade_id=trade[0])
+                    if success:
+                        st.cache_data.clear()
+                        st.rerun()
+                    else:
+                        st.error(message)
+    else:
+        st.info("No open paper positions")
     
-    # Plot price and indicators
+    st.subheader("Open Orders")
+    open_orders = get_paper_orders(user_id, 'open')
+    if open_orders:
+        orders_df = pd.DataFrame(open_orders, columns=['ID', 'Pair', 'Side', 'Type', 'Quantity', 'Price', 'Closes Trade', 'Status', 'Created', 'Filled', 'Fill Price'])
+        st.dataframe(orders_df[['ID', 'Pair', 'Side', 'Type', 'Quantity', 'Price', 'Closes Trade', 'Created']])
+        order_to_cancel = st.selectbox("Select Order to Cancel", options=orders_df['ID'].tolist())
+        if st.button("Cancel Order"):
+            success, message = cancel_paper_order(user_id, order_to_cancel)
+            if success:
+                st.success(message)
+                st.rerun()
+            else:
+                st.error(message)
+    else:
+        st.info("No open orders")
+    
+    st.subheader("Order History")
+    history = get_paper_orders(user_id)
+    if history:
+        history_df = pd.DataFrame(history, columns=['ID', 'Pair', 'Side', 'Type', 'Quantity', 'Price', 'Closes Trade', 'Status', 'Created', 'Filled', 'Fill Price'])
+        st.dataframe(history_df)
+    else:
+        st.info("No filled or cancelled orders yet")
+
+REPLAY_FRAME_SECONDS = 0.5
+REPLAY_WARMUP_BARS = 100
+
+def start_replay(pair, interval, start):
+    symbol = pair_to_symbol(pair)
+    # 1h history only reaches back about two years; candle_history_start keeps the request inside it
+    sync_price_history((symbol,), interval, candle_history_start(interval))
+    # Each replay gets its own connection so its paging queries are independent of the shared cursor
+    db = sqlite3.connect(DB_PATH, check_same_thread=False)
+    # Start REPLAY_WARMUP_BARS early so the indicators are warm at the chosen date
+    warmup_rows = db.execute('''SELECT ts FROM price_history WHERE symbol=? AND interval=? AND ts < ?
+                                ORDER BY ts DESC LIMIT ?''', (symbol, interval, start, REPLAY_WARMUP_BARS)).fetchall()
+    session = ReplaySession(db, symbol, interval, start=warmup_rows[-1][0] if warmup_rows else start, warmup=len(warmup_rows))
+    session.pair = pair
+    return session
+
+def close_replay_trade(trade_id, bar):
+    c.execute(f"SELECT {TRADE_COLUMNS} FROM trade_details WHERE id=?", (trade_id,))
+    trade = c.fetchone()
+    trade_data = {
+        "date": trade[2], "end_date": bar['ts'], "pair": trade[4], "amount": trade[5], "entry_price": trade[6],
+        "exit_price": bar['close'], "strategy": trade[8], "notes": trade[9], "entry_screenshot": trade[10],
+        "exit_screenshot": trade[11], "status": "completed", "trade_type": trade[13]
+    }
+    return update_trade(trade_id, trade_data)
+
+def show_replay(user_id):
+    st.header("Bar Replay")
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        pair = st.selectbox("Trading Pair", get_trading_pairs(), key="replay_pair")
+    with col2:
+        interval = st.selectbox("Interval", ["1d", "1h"], key="replay_interval")
+    with col3:
+        start = st.date_input("Replay From", value=datetime(2023, 1, 1).date(), key="replay_start")
+    if st.button("Start Replay"):
+        st.session_state.replay = start_replay(pair, interval, start.isoformat())
+        st.session_state.replay_trades = []
+        st.session_state.replay_playing = False
+    
+    session = st.session_state.get('replay')
+    if session is None:
+        st.info("Choose a pair and start date, then start the replay")
+        return
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        if st.button("Step 1 Bar"):
+            session.step(1)
+    with col2:
+        if st.button("Step 10 Bars"):
+            session.step(10)
+    with col3:
+        speed = st.select_slider("Speed (bars/sec)", options=[1, 2, 5, 10, 25, 50, 100], value=5)
+    with col4:
+        playing = st.session_state.get('replay_playing', False)
+        if st.button("Pause" if playing else "Play"):
+            st.session_state.replay_playing = not playing
+    
+    if not session.history:
+        session.step(1)
+    bar = session.current
+    if bar is None:
+        st.info(f"No cached {session.interval} history for {session.pair} after the chosen date")
+        return
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Bar", session.position)
+    col2.metric("Time", bar['ts'])
+    col3.metric("Close", f"{bar['close']:.8g}")
+    col4.metric("RSI", f"{bar['RSI']:.2f}" if bar['RSI'] == bar['RSI'] else "N/A")
+    
+    data = session.frame()
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=data.index, y=data['Close'], name='Close Price'))
+    fig.add_trace(go.Candlestick(x=data.index, open=data['open'], high=data['high'], low=data['low'], close=data['close'], name='Price'))
     fig.add_trace(go.Scatter(x=data.index, y=data['BB_high'], name='Bollinger High', line=dict(dash='dash')))
     fig.add_trace(go.Scatter(x=data.index, y=data['BB_low'], name='Bollinger Low', line=dict(dash='dash')))
-    fig.update_layout(title=f"{symbol} Price and Bollinger Bands", xaxis_title="Date", yaxis_title="Price", template="plotly_dark", height=600)
+    fig.update_layout(title=f"{session.symbol} Replay", template="plotly_dark", height=600, xaxis_rangeslider_visible=False)
     st.plotly_chart(fig, use_container_width=True)
     
-    # MACD Plot
     fig_macd = go.Figure()
     fig_macd.add_trace(go.Scatter(x=data.index, y=data['MACD'], name='MACD'))
     fig_macd.add_trace(go.Scatter(x=data.index, y=data['Signal'], name='Signal Line'))
-    fig_macd.update_layout(title="MACD", xaxis_title="Date", yaxis_title="Value", template="plotly_dark", height=600)
+    fig_macd.update_layout(title="MACD", template="plotly_dark", height=300)
     st.plotly_chart(fig_macd, use_container_width=True)
     
-    # RSI Plot
-    fig_rsi = go.Figure()
-    fig_rsi.add_trace(go.Scatter(x=data.index, y=data['RSI'], name='RSI'))
-    fig_rsi.add_hline(y=70, line_dash="dash", line_color="red", annotation_text="Overbought")
-    fig_rsi.add_hline(y=30, line_dash="dash", line_color="green", annotation_text="Oversold")
-    fig_rsi.update_layout(title="RSI", xaxis_title="Date", yaxis_title="RSI Value", template="plotly_dark", height=600)
-    st.plotly_chart(fig_rsi, use_container_width=True)
+    # Trades are journaled at the replayed bar's time and price, tagged as replay
+    st.subheader("Replay Trading")
+    with st.form("replay_trade_form"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            trade_type = st.selectbox("Trade Type", ['long', 'short'], key="replay_trade_type")
+        with col2:
+            amount = st.number_input("Amount", min_value=0.0, format="%.8f", key="replay_amount")
+        with col3:
+            strategies = get_analysis_types()
+            strategy = st.selectbox("Strategy", strategies, key="replay_strategy") if strategies else None
+        submitted = st.form_submit_button("Enter at Current Bar")
+    if submitted:
+        if amount <= 0:
+            st.error("Amount must be greater than 0")
+        else:
+            success, message = save_trade(user_id, {
+                "date": bar['ts'], "end_date": None, "pair": session.pair, "amount": amount, "entry_price": bar['close'],
+                "exit_price": None, "strategy": strategy, "notes": f"Replay trade on {session.interval} bars",
+                "status": "active", "trade_type": trade_type, "source": "replay"
+            })
+            if success:
+                c.execute("SELECT MAX(id) FROM trades WHERE user_id=? AND source='replay'", (user_id,))
+                st.session_state.replay_trades.append(c.fetchone()[0])
+                st.cache_data.clear()
+                st.success(message)
+            else:
+                st.error(message)
+    
+    for trade_id in list(st.session_state.get('replay_trades', [])):
+        if st.button(f"Exit Replay Trade {trade_id} at Current Bar", key=f"replay_exit_{trade_id}"):
+            success, message = close_replay_trade(trade_id, bar)
+            if success:
+                st.session_state.replay_trades.remove(trade_id)
+                st.cache_data.clear()
+                st.success(message)
+            else:
+                st.error(message)
+    
+    st.caption(f"Last step took {session.last_step_seconds * 1000:.3f} ms per bar")
+    if session.finished:
+        st.session_state.replay_playing = False
+        st.info("Replay reached the end of the cached history")
+    elif st.session_state.get('replay_playing'):
+        time.sleep(REPLAY_FRAME_SECONDS)
+        session.step(max(1, int(speed * REPLAY_FRAME_SECONDS)))
+        st.rerun()
+
+def show_alerts(user_id):
+    st.header("Price Alerts")
+    
+    with st.form("alert_form"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            symbol = pair_to_symbol(st.selectbox("Trading Pair", get_trading_pairs(), key="alert_pair"))
+        with col2:
+            kind = st.selectbox("Condition", list(ALERT_KIND_LABELS), format_func=ALERT_KIND_LABELS.get)
+        with col3:
+            level = st.number_input("Level (price, or RSI 0-100)", min_value=0.0, format="%.8f", value=0.0)
+        submitted = st.form_submit_button("Create Alert")
+    if submitted:
+        if kind == 'rsi_above' and level == 0:
+            level = 70.0
+        elif kind == 'rsi_below' and level == 0:
+            level = 30.0
+        success, message = create_alert(user_id, symbol, kind, None if kind == 'bollinger_breakout' else level)
+        if success:
+            st.success(message)
+        else:
+            st.error(message)
+    
+    st.subheader("Fired Alerts")
+    fired = get_user_alerts(user_id, 'fired')
+    if fired:
+        fired_df = pd.DataFrame(fired, columns=['ID', 'Symbol', 'Kind', 'Level', 'Created', 'Fired At', 'Value', 'Seen'])
+        fired_df['Condition'] = [describe_alert(kind, level) for kind, level in zip(fired_df['Kind'], fired_df['Level'])]
+        fired_df['New'] = fired_df['Seen'] == 0
+        st.dataframe(fired_df[['ID', 'Symbol', 'Condition', 'Fired At', 'Value', 'New']])
+        mark_alerts_seen(user_id)
+    else:
+        st.info("No alerts have fired yet")
+    
+    st.subheader("Active Alerts")
+    active = get_user_alerts(user_id, 'active')
+    if active:
+        active_df = pd.DataFrame(active, columns=['ID', 'Symbol', 'Kind', 'Level', 'Created', 'Fired At', 'Value', 'Seen'])
+        active_df['Condition'] = [describe_alert(kind, level) for kind, level in zip(active_df['Kind'], active_df['Level'])]
+        st.dataframe(active_df[['ID', 'Symbol', 'Condition', 'Created']])
+        alert_to_cancel = st.selectbox("Select Alert to Cancel", options=active_df['ID'].tolist())
+        if st.button("Cancel Alert"):
+            cancel_alert(user_id, alert_to_cancel)
+            st.success(f"Alert {alert_to_cancel} cancelled")
+            st.rerun()
+    else:
+        st.info("No active alerts")
+
+def show_messages(user_id):
+    st.header("Messages")
+    presence = get_presence_tracker()
+    
+    with st.form("message_form", clear_on_submit=True):
+        recipient = st.text_input("To (username)")
+        text = st.text_area("Message", max_chars=MAX_MESSAGE_LENGTH)
+        submitted = st.form_submit_button("Send")
+    if submitted:
+        success, message = send_message(user_id, recipient.strip(), text)
+        if success:
+            st.success(message)
+        else:
+            st.error(message)
+    
+    st.subheader(f"Inbox ({get_unread_message_count(user_id)} unread)")
+    # Cursor of every page opened so far, so Newer steps back without offsets
+    cursors = st.session_state.setdefault('inbox_cursors', [None])
+    page = get_inbox_page(user_id, cursors[-1])
+    if page:
+        inbox_df = pd.DataFrame(page, columns=['ID', 'Sender ID', 'From', 'Message', 'Sent', 'Read'])
+        inbox_df['Online'] = [presence.is_online(sender_id) for sender_id in inbox_df['Sender ID']]
+        inbox_df['New'] = inbox_df['Read'] == 0
+        st.dataframe(inbox_df[['From', 'Online', 'Message', 'Sent', 'New']])
+        mark_messages_read(user_id, [row[0] for row in page if not row[5]])
+    else:
+        st.info("No messages")
+    col1, col2 = st.columns(2)
+    with col1:
+        if len(cursors) > 1 and st.button("Newer", key="inbox_newer"):
+            cursors.pop()
+            st.rerun()
+    with col2:
+        if len(page) == INBOX_PAGE_SIZE and st.button("Older", key="inbox_older"):
+            cursors.append((page[-1][4], page[-1][0]))
+            st.rerun()
+    
+    st.subheader(f"Online Now ({presence.online_count()})")
+    online_users = get_online_users()
+    if online_users:
+        st.dataframe(pd.DataFrame(online_users, columns=['Username', 'Last Active']))
+    else:
+        st.info("Nobody else is online")
 
 def user_profile(user_id):
     st.header("User Profile")
@@ -958,10 +3022,10 @@ def user_profile(user_id):
             update_user_risk_tolerance(user_id, risk_tolerance)
             st.success("Risk tolerance updated successfully!")
         
-        trades = load_user_trades(user_id)
-        total_trades = len(trades)
-        win_rate = get_win_rate(trades)
-        total_pnl = get_total_profit_loss(trades)
+        stats = get_user_trade_stats(user_id, load_user_trades(user_id))
+        total_trades = stats['total_trades']
+        win_rate = stats['win_rate']
+        total_pnl = stats['total_profit_loss']
         
         st.write(f"Total Trades: {total_trades}")
         st.write(f"Win Rate: {win_rate*100:.2f}%")
@@ -978,9 +3042,9 @@ def user_profile(user_id):
 def admin_panel():
     st.title("Admin Panel")
     
-    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["User Management", "Registration Codes", "System Statistics", "Trade Analysis", "Trading Pairs & Strategies", "Backup Management"])
+    tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs(["User Management", "Registration Codes", "System Statistics", "Trade Analysis", "Trading Pairs & Strategies", "Backup Management", "Performance"])
     
-    with tab1:
+    with tab1, PROFILER.section('render', 'Admin: User Management'):
         st.header("User Management")
         users = c.execute("SELECT id, username, is_admin, expiry_date, level FROM users").fetchall()
         user_df = pd.DataFrame(users, columns=['ID', 'Username', 'Is Admin', 'Expiry Date', 'Level'])
@@ -1011,7 +3075,7 @@ def admin_panel():
             user_id = c.fetchone()[0]
             show_trades_table(user_id)
     
-    with tab2:
+    with tab2, PROFILER.section('render', 'Admin: Registration Codes'):
         # Registration code management
         st.header("Registration Code Management")
         current_code = get_current_registration_code()
@@ -1020,12 +3084,11 @@ def admin_panel():
             new_code = generate_registration_code()
             st.success(f"New registration code generated: {new_code}")
     
-    with tab3:
+    with tab3, PROFILER.section('render', 'Admin: System Statistics'):
         # System statistics
         st.header("System Statistics")
         total_users = len(users)
-        total_trades = c.execute("SELECT COUNT(*) FROM trades").fetchone()[0]
-        total_profit = c.execute("SELECT SUM((exit_price - entry_price) * amount) FROM trades WHERE exit_price IS NOT NULL").fetchone()[0]
+        total_trades, completed_trades, total_profit = get_system_trade_totals()
         
         col1, col2, col3 = st.columns(3)
         col1.metric("Total Users", total_users)
@@ -1043,32 +3106,98 @@ def admin_panel():
         fig.update_layout(template="plotly_dark", height=600)
         st.plotly_chart(fig, use_container_width=True)
     
-    with tab4:
+    with tab4, PROFILER.section('render', 'Admin: Trade Analysis'):
         st.header("Trade Analysis")
-        all_trades = c.execute("SELECT * FROM trades").fetchall()
-        trades_df = pd.DataFrame(all_trades, columns=['ID', 'User ID', 'Start Date', 'End Date', 'Pair', 'Amount', 'Entry Price', 'Exit Price', 'Strategy', 'Notes', 'Entry Screenshot', 'Exit Screenshot', 'Status', 'Trade Type'])
-        trades_df['Start Date'] = pd.to_datetime(trades_df['Start Date'])
-        trades_df['End Date'] = pd.to_datetime(trades_df['End Date'])
-        trades_df['Profit/Loss'] = trades_df.apply(lambda row: get_trade_profit_loss(row), axis=1)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            analysis_start = st.date_input("From", value=(datetime.now() - timedelta(days=365)).date(), key="analysis_start")
+        with col2:
+            analysis_end = st.date_input("To", value=datetime.now().date(), key="analysis_end")
+        with col3:
+            top_n = st.number_input("Top N", min_value=1, max_value=100, value=10, key="analysis_top_n")
+        start_day, end_day = analysis_start.isoformat(), analysis_end.isoformat()
         
         # Trade volume over time
-        fig_volume = px.bar(trades_df, x='Start Date', y='Amount', title='Trade Volume Over Time')
-        fig_volume.update_layout(template="plotly_dark", height=600)
-        st.plotly_chart(fig_volume, use_container_width=True)
-        
-        # Most popular trading pairs
-        pair_counts = trades_df['Pair'].value_counts()
-        fig_pairs = px.pie(pair_counts, values=pair_counts.values, names=pair_counts.index, title='Most Popular Trading Pairs')
-        fig_pairs.update_layout(template="plotly_dark", height=600)
-        st.plotly_chart(fig_pairs, use_container_width=True)
-        
-        # Most profitable strategies
-        strategy_profits = trades_df.groupby('Strategy')['Profit/Loss'].sum().sort_values(ascending=False)
-        fig_strategies = px.bar(strategy_profits, x=strategy_profits.index, y=strategy_profits.values, title='Most Profitable Strategies')
-        fig_strategies.update_layout(template="plotly_dark", height=600)
-        st.plotly_chart(fig_strategies, use_container_width=True)
-    
-    with tab5:
+        volume_df = pd.DataFrame(get_daily_trade_volume(start_day, end_day), columns=['Date', 'Trades', 'Amount', 'Profit/Loss'])
+        if volume_df.empty:
+            st.info("No trades in the selected date range")
+        else:
+            fig_volume = px.bar(volume_df, x='Date', y='Amount', hover_data=['Trades', 'Profit/Loss'], title='Trade Volume Over Time')
+            fig_volume.update_layout(template="plotly_dark", height=600)
+            st.plotly_chart(fig_volume, use_container_width=True)
+            
+            # Most popular trading pairs
+            pair_df = pd.DataFrame(get_pair_trade_counts(start_day, end_day, top_n), columns=['Pair', 'Trades', 'Profit/Loss'])
+            fig_pairs = px.pie(pair_df, values='Trades', names='Pair', title='Most Popular Trading Pairs')
+            fig_pairs.update_layout(template="plotly_dark", height=600)
+            st.plotly_chart(fig_pairs, use_container_width=True)
+            
+            # Most profitable strategies
+            strategy_df = pd.DataFrame(get_strategy_profits(start_day, end_day, top_n), columns=['Strategy', 'Profit/Loss', 'Trades', 'Completed Trades'])
+            fig_strategies = px.bar(strategy_df, x='Strategy', y='Profit/Loss', hover_data=['Trades', 'Completed Trades'], title='Most Profitable Strategies')
+            fig_strategies.update_layout(template="plotly_dark", height=600)
+            st.plotly_chart(fig_strategies, use_container_width=True)
+        
+        if st.button("Rebuild Daily Rollups", key="rebuild_rollups"):
+            rebuild_trade_rollup()
+            st.success("Daily trade rollups rebuilt")
+            st.rerun()
+        
+        # Platform-wide group-bys over the Parquet snapshot, without touching the live database
+        st.subheader("Columnar Snapshot")
+        if st.button("Refresh Snapshot", key="refresh_snapshot"):
+            summary = refresh_trade_snapshot()
+            if summary:
+                st.success(f"Updated {summary['users_updated']} users ({summary['rows_written']} trades) in {summary['seconds']:.2f}s")
+            else:
+                st.error("Error refreshing the snapshot")
+        exported = trade_snapshot.load_manifest(trade_snapshot.SNAPSHOT_DIR)['exported']
+        st.caption(f"Last exported: {exported or 'never'} (refreshed hourly)")
+        if exported:
+            group_by = st.multiselect("Group By", trade_snapshot.GROUP_KEYS, default=['pair'], key="snapshot_group_by")
+            if group_by:
+                with PROFILER.section('query', 'trade_snapshot.aggregate'):
+                    snapshot_df = trade_snapshot.aggregate(trade_snapshot.SNAPSHOT_DIR, group_by,
+                                                           analysis_start.strftime('%Y-%m'), analysis_end.strftime('%Y-%m'))
+                st.dataframe(snapshot_df.style.format({'win_rate': '{:.2%}', 'volume': '{:.2f}', 'profit_loss': '{:.2f}', 'avg_profit_loss': '{:.2f}'}))
+        
+        st.subheader("Trade Archive")
+        hot_trades, archived_trades = c.execute('''SELECT (SELECT COUNT(*) FROM trades),
+                                                          (SELECT COALESCE(SUM(trade_count), 0) FROM trade_archive_daily)''').fetchone()
+        partitions = trade_archive.list_partitions()
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Live Trades", hot_trades)
+        col2.metric("Archived Trades", archived_trades)
+        col3.metric("Archive Size", f"{sum(size for _, _, size in partitions) / 1024 / 1024:.1f} MB")
+        if partitions:
+            st.dataframe(pd.DataFrame([(year, path, size / 1024) for year, path, size in partitions],
+                                      columns=['Year', 'File', 'Size (KB)']))
+        archive_days = st.number_input("Archive closed trades older than (days)", min_value=1, value=ARCHIVE_AFTER_DAYS,
+                                       step=30, key="archive_days")
+        st.caption(f"Runs daily at 03:00 with {ARCHIVE_AFTER_DAYS} days (TRADE_ARCHIVE_DAYS)")
+        if st.button("Archive Now", key="archive_now"):
+            try:
+                summary = archive_old_trades(int(archive_days))
+                st.cache_data.clear()
+                st.success(f"Archived {summary['trades']} trades closed before {summary['cutoff'][:10]} in {summary['seconds']:.2f}s")
+            except sqlite3.Error as e:
+                logger.error(f"Error archiving trades: {str(e)}")
+                st.error(f"Error archiving trades: {str(e)}")
+        archived_users = c.execute('''SELECT u.id, u.username, SUM(a.trade_count) FROM trade_archive_daily a
+                                      JOIN users u ON u.id = a.user_id GROUP BY u.id ORDER BY u.username''').fetchall()
+        if archived_users:
+            restore_user = st.selectbox("Restore Archived Trades For", archived_users,
+                                        format_func=lambda row: f"{row[1]} ({row[2]} trades)", key="restore_archive_user")
+            if st.button("Restore", key="restore_archive"):
+                try:
+                    restored = restore_archived_trades(restore_user[0])
+                    st.cache_data.clear()
+                    st.success(f"Restored {restored} trades for {restore_user[1]}")
+                except sqlite3.Error as e:
+                    logger.error(f"Error restoring archived trades: {str(e)}")
+                    st.error(f"Error restoring archived trades: {str(e)}")
+    
+    with tab5, PROFILER.section('render', 'Admin: Trading Pairs & Strategies'):
         st.header("Trading Pairs & Strategies Management")
         
         # Trading Pairs Management
@@ -1125,7 +3254,7 @@ def admin_panel():
                 st.success(f"Removed {strategy_to_remove} from strategies")
                 st.rerun()
     
-    with tab6:
+    with tab6, PROFILER.section('render', 'Admin: Backup Management'):
         st.header("Backup Management")
         
         st.subheader("Manual Backup")
@@ -1149,8 +3278,78 @@ def admin_panel():
                 st.warning("Restore functionality not implemented yet.")
         else:
             st.write("No backup files available for restore.")
+    
+    with tab7, PROFILER.section('render', 'Admin: Performance'):
+        st.header("Performance Profiler")
+        st.caption(f"Timings collected in this process since {PROFILER.started:%Y-%m-%d %H:%M:%S}: "
+                   "query = SQL statements, fetch = external APIs, render = pages and admin tabs, chart = chart building")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            PROFILER.slow_query_ms = st.number_input("Slow Query Threshold (ms)", min_value=1.0,
+                                                     value=float(PROFILER.slow_query_ms), step=10.0)
+        with col2:
+            if st.button("Reset Timings"):
+                PROFILER.reset()
+                st.rerun()
+        
+        timings = PROFILER.snapshot()
+        if timings:
+            timing_df = pd.DataFrame(timings)
+            category = st.selectbox("Category", ["All"] + sorted(timing_df['category'].unique()))
+            if category != "All":
+                timing_df = timing_df[timing_df['category'] == category]
+            st.dataframe(timing_df.drop(columns='histogram').rename(columns={
+                'category': 'Category', 'name': 'Name', 'count': 'Calls', 'total_ms': 'Total (ms)', 'mean_ms': 'Mean (ms)',
+                'p50_ms': 'P50 (ms)', 'p95_ms': 'P95 (ms)', 'p99_ms': 'P99 (ms)', 'max_ms': 'Max (ms)'
+            }).style.format(precision=2))
+            
+            labels = [f"{row['category']}: {row['name']}" for _, row in timing_df.iterrows()]
+            selected_timing = st.selectbox("Latency Histogram", range(len(labels)), format_func=lambda i: labels[i])
+            histogram = timing_df.iloc[selected_timing]['histogram']
+            fig = px.bar(x=[f"≤{bound} ms" for bound in histogram], y=list(histogram.values()),
+                         labels={'x': 'Latency', 'y': 'Calls'}, title=labels[selected_timing])
+            fig.update_layout(template="plotly_dark", height=400)
+            st.plotly_chart(fig, use_container_width=True)
+            
+            st.download_button("Export Timings (CSV)", timing_df.drop(columns='histogram').to_csv(index=False),
+                               file_name=f"timings_{datetime.now():%Y%m%d_%H%M%S}.csv", mime="text/csv")
+        else:
+            st.info("No timings recorded yet")
+        
+        st.subheader("Slow Query Log")
+        slow_queries = PROFILER.slow_queries()
+        if slow_queries:
+            slow_df = pd.DataFrame(slow_queries)
+            slow_df['plan'] = slow_df['plan'].apply(' | '.join)
+            st.dataframe(slow_df.rename(columns={'time': 'Time', 'ms': 'Duration (ms)', 'sql': 'SQL', 'params': 'Parameters', 'plan': 'Query Plan'}))
+        else:
+            st.info(f"No queries slower than {PROFILER.slow_query_ms:.0f} ms")
+        
+        st.download_button("Export Profile (JSON)", PROFILER.export_json(),
+                           file_name=f"profile_{datetime.now():%Y%m%d_%H%M%S}.json", mime="application/json")
+        
+        st.subheader("Shared Cache")
+        st.caption("Quotes, price downloads, news and the leaderboard, shared by every app process on this host. "
+                   "Hits, misses and waits count this process only; a wait is a miss another process was already fetching.")
+        cache_stats = upstream_cache.stats()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Entries", cache_stats['entries'])
+        col2.metric("Size", f"{cache_stats['bytes'] / 1024 / 1024:.1f} MB")
+        lookups = cache_stats['hits'] + cache_stats['misses']
+        col3.metric("Hit Rate", f"{cache_stats['hits'] / lookups:.0%}" if lookups else "N/A")
+        col4.metric("Upstream Calls", cache_stats['fills'])
+        if st.button("Clear Shared Cache"):
+            upstream_cache.clear()
+            st.success("Shared cache cleared")
 
 def main():
+    restore_session()
+    sync_session_cookie()
+    run_ctx = get_script_run_ctx()
+    set_log_context(session_id=run_ctx.session_id if run_ctx else None,
+                    user_id=st.session_state.user[0] if 'user' in st.session_state else None)
+    
     if 'page' not in st.session_state:
         st.session_state.page = 'login'
     
@@ -1210,10 +3409,10 @@ def main():
         """, unsafe_allow_html=True)
         
         if user[3]:  # if user is admin
-            selected = option_menu(
+            selected = streamlit_option_menu.option_menu(
                 menu_title=None,
-                options=["Dashboard", "Trades", "Analysis", "Market Data", "Top Traders", "Profile", "Admin"],
-                icons=["house", "list-task", "graph-up", "currency-exchange", "trophy", "person", "gear"],
+                options=["Dashboard", "Trades", "Analysis", "Market Data", "Screener", "Portfolio", "Paper Trading", "Replay", "Alerts", "Messages", "Top Traders", "Profile", "Admin"],
+                icons=["house", "list-task", "graph-up", "currency-exchange", "funnel", "pie-chart", "cash-coin", "skip-forward", "bell", "envelope", "trophy", "person", "gear"],
                 menu_icon="cast",
                 default_index=0,
                 orientation="horizontal",
@@ -1225,10 +3424,10 @@ def main():
                 }
             )
         else:
-            selected = option_menu(
+            selected = streamlit_option_menu.option_menu(
                 menu_title=None,
-                options=["Dashboard", "Trades", "Analysis", "Market Data", "Top Traders", "Profile"],
-                icons=["house", "list-task", "graph-up", "currency-exchange", "trophy", "person"],
+                options=["Dashboard", "Trades", "Analysis", "Market Data", "Screener", "Portfolio", "Paper Trading", "Replay", "Alerts", "Messages", "Top Traders", "Profile"],
+                icons=["house", "list-task", "graph-up", "currency-exchange", "funnel", "pie-chart", "cash-coin", "skip-forward", "bell", "envelope", "trophy", "person"],
                 menu_icon="cast",
                 default_index=0,
                 orientation="horizontal",
@@ -1243,6 +3442,19 @@ def main():
         # Display user level prominently
         st.markdown(f"<div class='user-level'>Level: {user[4]}</div>", unsafe_allow_html=True)
         
+        unseen_alerts = get_unseen_alert_count(user[0])
+        if unseen_alerts and selected != "Alerts":
+            st.sidebar.warning(f"🔔 {unseen_alerts} new price alert{'s' if unseen_alerts > 1 else ''}")
+        
+        # Presence is an in-memory heartbeat; the worker writes it to the database in batches
+        presence = get_presence_tracker()
+        presence.heartbeat(user[0])
+        unread_messages = get_unread_message_count(user[0])
+        if unread_messages and selected != "Messages":
+            st.sidebar.info(f"✉️ {unread_messages} unread message{'s' if unread_messages > 1 else ''}")
+        st.sidebar.caption(f"🟢 {presence.online_count()} online")
+        
+        render_started = time.perf_counter()
         if selected == "Dashboard":
             st.title(f"Welcome, {st.session_state.username}!")
             
@@ -1271,23 +3483,18 @@ def main():
             # Quick Stats
             st.subheader("Quick Stats")
             trades = load_user_trades(user[0])
-            total_pnl = get_total_profit_loss(trades)
-            win_rate = get_win_rate(trades)
+            stats = get_user_trade_stats(user[0], trades)
             
             col1, col2, col3 = st.columns(3)
-            col1.metric("Total Profit/Loss", f"${total_pnl:.2f}")
-            col2.metric("Win Rate", f"{win_rate*100:.2f}%")
-            col3.metric("Total Trades", len(trades))
+            col1.metric("Total Profit/Loss", f"${stats['total_profit_loss']:.2f}")
+            col2.metric("Win Rate", f"{stats['win_rate']*100:.2f}%")
+            col3.metric("Total Trades", stats['total_trades'])
             
             # Performance Chart
             st.subheader("Performance Over Time")
             if trades:
-                df = pd.DataFrame(trades, columns=['ID', 'User ID', 'Start Date', 'End Date', 'Pair', 'Amount', 'Entry Price', 'Exit Price', 'Strategy', 'Notes', 'Entry Screenshot', 'Exit Screenshot', 'Status', 'Trade Type'])
-                df['Start Date'] = pd.to_datetime(df['Start Date'])
-                df['Profit/Loss'] = df.apply(lambda row: get_trade_profit_loss(row), axis=1)
-                df['Cumulative PnL'] = df['Profit/Loss'].cumsum()
-                
-                fig = px.line(df, x='Start Date', y='Cumulative PnL', title='Cumulative Profit/Loss Over Time')
+                equity_curve = downsample_frame(get_user_equity_curve(user[0]), CHART_POINTS, ['Equity'], method='lttb')
+                fig = px.line(equity_curve.reset_index(), x='Date', y='Equity', title='Portfolio Equity Over Time')
                 fig.update_layout(template="plotly_dark", height=400)
                 st.plotly_chart(fig, use_container_width=True)
             else:
@@ -1315,6 +3522,24 @@ def main():
         elif selected == "Market Data":
             show_market_data()
         
+        elif selected == "Screener":
+            show_screener()
+        
+        elif selected == "Portfolio":
+            show_portfolio_analytics()
+        
+        elif selected == "Paper Trading":
+            show_paper_trading(user[0])
+        
+        elif selected == "Replay":
+            show_replay(user[0])
+        
+        elif selected == "Alerts":
+            show_alerts(user[0])
+        
+        elif selected == "Messages":
+            show_messages(user[0])
+        
         elif selected == "Top Traders":
             show_top_traders()
         
@@ -1323,12 +3548,17 @@ def main():
         
         elif selected == "Admin" and user[3]:
             admin_panel()
+        render_seconds = time.perf_counter() - render_started
+        PROFILER.record('render', selected, render_seconds)
+        logger.debug("Rendered page", extra={'page': selected, 'duration_ms': round(render_seconds * 1000, 2)})
         
         if st.sidebar.button("Logout"):
-            del st.session_state.user
-            del st.session_state.username
+            end_session(revoke=True)
             st.session_state.page = 'login'
             st.rerun()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    try:
+        main()
+    finally:
+        record_script_run(SCRIPT_STARTED)
\ No newline at end of file
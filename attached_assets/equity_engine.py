@@ -0,0 +1,139 @@
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+
+def trade_direction(trade_type):
+    return {'long': 1.0, 'short': -1.0}.get(trade_type, 0.0)
+
+
+def trade_record(trade):
+    # Only the fields that move the equity curve; notes and screenshots are ignored
+    return (trade[2], trade[3], trade[4], float(trade[5] or 0),
+            float(trade[6]) if trade[6] is not None else None,
+            float(trade[7]) if trade[7] is not None else None,
+            trade[13])
+
+
+def realized_time(record):
+    start, end = record[0], record[1]
+    return pd.Timestamp(end or start)
+
+
+def realized_pnl(record):
+    amount, entry_price, exit_price, trade_type = record[3], record[4], record[5], record[6]
+    if entry_price is None or exit_price is None:
+        return 0.0
+    return trade_direction(trade_type) * (exit_price - entry_price) * amount
+
+
+def drawdown_frame(equity):
+    peak = equity.cummax()
+    drawdown = peak - equity
+    # Percentage drawdown is only meaningful against a positive peak
+    drawdown_pct = (drawdown / peak.where(peak > 0)).fillna(0.0)
+    return drawdown, drawdown_pct
+
+
+def max_drawdown(curve):
+    if curve is None or curve.empty:
+        return 0.0
+    return float(curve['Drawdown %'].max())
+
+
+class EquityEngine:
+    # Per-user equity state: realized P&L events are patched in place when trades change,
+    # and only the cumulative suffix after the earliest changed close time is rebuilt.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.records = {}
+        self.realized_events = pd.Series(dtype=float, index=pd.DatetimeIndex([]))
+        self.cumulative = pd.Series(dtype=float, index=pd.DatetimeIndex([]))
+        self.curves = {}
+
+    def update(self, trades, version=None, archived=()):
+        # archived: (first opened, day closed, realized P&L) for trades moved out of the journal; each
+        # day is booked like one closed trade so the curve still starts at the first trade
+        with self.lock:
+            if version is not None and version == self.version:
+                return False
+            records = {trade[0]: trade_record(trade) for trade in trades}
+            records.update({('archived', day): (opened or day, day, None, 1.0, 0.0, float(pnl), 'long')
+                            for opened, day, pnl in archived})
+            changed = [trade_id for trade_id in self.records.keys() | records.keys()
+                       if self.records.get(trade_id) != records.get(trade_id)]
+            deltas = {}
+            for trade_id in changed:
+                for record, sign in ((self.records.get(trade_id), -1.0), (records.get(trade_id), 1.0)):
+                    if record is not None and record[5] is not None:
+                        ts = realized_time(record)
+                        deltas[ts] = deltas.get(ts, 0.0) + sign * realized_pnl(record)
+            self.records = records
+            self.version = version
+            if changed:
+                self.curves.clear()
+            if deltas:
+                self.apply_realized(deltas)
+            return bool(changed)
+
+    def apply_realized(self, deltas):
+        delta = pd.Series(deltas, dtype=float).sort_index()
+        events = self.realized_events.add(delta, fill_value=0.0).sort_index()
+        start = delta.index[0]
+        before = self.cumulative[self.cumulative.index < start]
+        offset = before.iloc[-1] if len(before) else 0.0
+        tail = events[events.index >= start].cumsum() + offset
+        self.realized_events = events
+        self.cumulative = pd.concat([before, tail]) if len(before) else tail
+
+    def open_pairs(self):
+        return sorted({record[2] for record in self.records.values() if record[5] is None})
+
+    def first_trade_time(self):
+        if not self.records:
+            return None
+        return min(pd.Timestamp(record[0]) for record in self.records.values())
+
+    def unrealized(self, index, prices, freq):
+        unrealized = np.zeros(len(index))
+        for record in self.records.values():
+            if record[5] is not None or record[4] is None:
+                continue
+            closes = prices.get(record[2]) if prices else None
+            if closes is None or closes.empty:
+                continue
+            closes = closes.dropna().sort_index()
+            closes = closes.groupby(closes.index.floor(freq)).last()
+            marks = closes.reindex(closes.index.union(index)).ffill().reindex(index).to_numpy()
+            pnl = trade_direction(record[6]) * (marks - record[4]) * record[3]
+            pnl[index < pd.Timestamp(record[0]).floor(freq)] = 0.0
+            unrealized += np.nan_to_num(pnl)
+        return unrealized
+
+    def equity_curve(self, prices=None, freq='D', starting_balance=0.0, price_version=None, now=None):
+        with self.lock:
+            key = (freq, starting_balance, price_version)
+            if key in self.curves:
+                return self.curves[key]
+            first = self.first_trade_time()
+            if first is None:
+                return pd.DataFrame(columns=['Realized P&L', 'Unrealized P&L', 'Equity', 'Drawdown', 'Drawdown %'])
+            end = pd.Timestamp(now or datetime.now())
+            if len(self.cumulative):
+                end = max(end, self.cumulative.index.max())
+            index = pd.date_range(first.floor(freq), end.floor(freq), freq=freq)
+            realized = self.cumulative.groupby(self.cumulative.index.floor(freq)).last()
+            realized = realized.reindex(realized.index.union(index)).ffill().reindex(index).fillna(0.0)
+            curve = pd.DataFrame(index=index)
+            curve['Realized P&L'] = realized.to_numpy()
+            curve['Unrealized P&L'] = self.unrealized(index, prices, freq)
+            curve['Equity'] = starting_balance + curve['Realized P&L'] + curve['Unrealized P&L']
+            curve['Drawdown'], curve['Drawdown %'] = drawdown_frame(curve['Equity'])
+            curve.index.name = 'Date'
+            self.curves = {cached: value for cached, value in self.curves.items() if cached[0] != freq}
+            self.curves[key] = curve
+            return curve
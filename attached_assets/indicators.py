@@ -0,0 +1,104 @@
+import math
+from collections import deque
+
+# Incremental versions of the ta indicators used by perform_technical_analysis. Each update()
+# is O(1) and returns NaN until the same warm-up as ta's defaults has passed, so a replayed
+# series matches MACD(close), RSIIndicator(close) and BollingerBands(close) bar for bar.
+
+NAN = float('nan')
+
+
+class EMA:
+    # ewm(span=window, min_periods=window, adjust=False), skipping leading NaNs like pandas
+
+    def __init__(self, window=None, alpha=None):
+        self.window = window
+        self.alpha = alpha if alpha is not None else 2.0 / (window + 1)
+        self.value = None
+        self.count = 0
+
+    def update(self, x):
+        if x != x:
+            return self.current()
+        self.value = x if self.value is None else self.alpha * x + (1 - self.alpha) * self.value
+        self.count += 1
+        return self.current()
+
+    def current(self):
+        return self.value if self.value is not None and self.count >= self.window else NAN
+
+
+class IncrementalMACD:
+
+    def __init__(self, window_slow=26, window_fast=12, window_sign=9):
+        self.fast = EMA(window_fast)
+        self.slow = EMA(window_slow)
+        self.signal = EMA(window_sign)
+
+    def update(self, close):
+        macd = self.fast.update(close) - self.slow.update(close)
+        return macd, self.signal.update(macd)
+
+
+class IncrementalRSI:
+
+    def __init__(self, window=14):
+        self.up = EMA(window, alpha=1.0 / window)
+        self.down = EMA(window, alpha=1.0 / window)
+        self.previous = None
+
+    def update(self, close):
+        diff = 0.0 if self.previous is None else close - self.previous
+        self.previous = close
+        up = self.up.update(max(diff, 0.0))
+        down = self.down.update(max(-diff, 0.0))
+        if up != up or down != down:
+            return NAN
+        if down == 0:
+            return 100.0
+        return 100.0 - 100.0 / (1.0 + up / down)
+
+
+class IncrementalBollinger:
+
+    def __init__(self, window=20, window_dev=2):
+        self.window = window
+        self.window_dev = window_dev
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    def update(self, close):
+        if len(self.values) == self.window:
+            oldest = self.values[0]
+            self.total -= oldest
+            self.total_sq -= oldest * oldest
+        self.values.append(close)
+        self.total += close
+        self.total_sq += close * close
+        if len(self.values) < self.window:
+            return NAN, NAN, NAN
+        mean = self.total / self.window
+        std = math.sqrt(max(self.total_sq / self.window - mean * mean, 0.0))
+        return mean, mean + self.window_dev * std, mean - self.window_dev * std
+
+
+class IndicatorState:
+    # The indicator set shown on the Market Data page, advanced one close at a time
+
+    def __init__(self):
+        self.macd = IncrementalMACD()
+        self.rsi = IncrementalRSI()
+        self.bollinger = IncrementalBollinger()
+
+    def update(self, close):
+        macd, signal = self.macd.update(close)
+        bb_mid, bb_high, bb_low = self.bollinger.update(close)
+        return {
+            'MACD': macd,
+            'Signal': signal,
+            'RSI': self.rsi.update(close),
+            'BB_mid': bb_mid,
+            'BB_high': bb_high,
+            'BB_low': bb_low,
+        }
@@ -0,0 +1,297 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import benchmark
+
+# Concurrent-session load harness. Simulated users log in with verify_user, browse the Dashboard
+# and Analysis pages (rendered through Streamlit's AppTest harness, so every rerun re-executes the
+# script like a live session) and add/edit trades through the app's own helpers, sharing one app
+# instance, connection and cursor per process exactly as concurrent Streamlit sessions do.
+#
+#   python load_test.py --sessions 16 --duration 60
+#   python load_test.py --sessions 32 --processes 4 --market-latency 0.2 --output load.json
+#
+# Everything runs offline: market data and news come from benchmark.install_synthetic_market_data.
+
+ACTIONS = ('dashboard', 'analysis', 'add_trade', 'edit_trade')
+DEFAULT_MIX = 'dashboard=4,analysis=2,add_trade=2,edit_trade=2'
+PERCENTILES = (50, 90, 95, 99)
+
+
+def parse_mix(text):
+    mix = dict(item.split('=') for item in text.split(','))
+    unknown = set(mix) - set(ACTIONS)
+    if unknown:
+        raise SystemExit(f"Unknown actions in --mix: {', '.join(sorted(unknown))}")
+    weights = np.array([float(mix.get(action, 0)) for action in ACTIONS])
+    return weights / weights.sum()
+
+
+def classify_error(message):
+    # SQLite contention shows up as lock/busy errors between connections and as cursor or
+    # transaction misuse when sessions share the app's single connection
+    message = message.lower()
+    if 'locked' in message or 'busy' in message:
+        return 'lock'
+    if 'recursive use of cursors' in message or 'statements in progress' in message or 'api misuse' in message:
+        return 'shared_cursor'
+    if 'transaction' in message:
+        return 'transaction'
+    return 'other'
+
+
+class Recorder:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(Counter)
+        self.error_examples = {}
+
+    def run(self, action, func):
+        started = time.perf_counter()
+        try:
+            result = func()
+            # App helpers report database failures as (False, message) instead of raising
+            if isinstance(result, tuple) and len(result) == 2 and result[0] is False:
+                raise RuntimeError(result[1])
+        except Exception as e:
+            kind = classify_error(str(e))
+            with self.lock:
+                self.errors[action][kind] += 1
+                self.error_examples.setdefault((action, kind), f"{type(e).__name__}: {e}"[:300])
+            return None
+        finally:
+            elapsed = time.perf_counter() - started
+            with self.lock:
+                self.samples[action].append(elapsed)
+        return result
+
+    def export(self):
+        return {
+            'samples': {action: list(values) for action, values in self.samples.items()},
+            'errors': {action: dict(counts) for action, counts in self.errors.items()},
+            'error_examples': {f"{action}/{kind}": example for (action, kind), example in self.error_examples.items()},
+        }
+
+
+def synthetic_trade(rng):
+    pair = benchmark.BENCH_PAIRS[int(rng.integers(len(benchmark.BENCH_PAIRS)))]
+    entry_price = benchmark.BASE_PRICES[pair.split('/')[0]] * float(np.exp(rng.normal(0, 0.1)))
+    opened = datetime.now() - timedelta(hours=float(rng.uniform(1, 500)))
+    completed = rng.random() < 0.5
+    return {
+        'date': opened.isoformat(timespec='seconds'),
+        'end_date': (opened + timedelta(hours=1)).isoformat(timespec='seconds') if completed else None,
+        'pair': pair,
+        'amount': float(rng.lognormal(0, 1)),
+        'entry_price': entry_price,
+        'exit_price': entry_price * float(np.exp(rng.normal(0, 0.03))) if completed else None,
+        'strategy': benchmark.BENCH_STRATEGIES[int(rng.integers(len(benchmark.BENCH_STRATEGIES)))],
+        'notes': ' '.join(rng.choice(benchmark.NOTE_WORDS, 8)),
+        'status': 'completed' if completed else 'active',
+        'trade_type': 'long' if rng.random() < 0.6 else 'short',
+    }
+
+
+def run_session(app, recorder, username, deadline, weights, think_time, render_timeout, latency, seed):
+    import streamlit as st
+    rng = np.random.default_rng(seed)
+    user = recorder.run('login', lambda: app.verify_user(username, benchmark.BENCH_PASSWORD))
+    if not user:
+        return
+    while time.time() < deadline:
+        action = ACTIONS[rng.choice(len(ACTIONS), p=weights)]
+        if action == 'dashboard':
+            recorder.run(action, lambda: benchmark.render_page('app.main()', user, render_timeout, latency))
+        elif action == 'analysis':
+            recorder.run(action, lambda: benchmark.render_page('app.show_analysis(st_user[0])', user, render_timeout, latency))
+        elif action == 'add_trade':
+            # Same sequence as the trade form: save, then drop every cached query result
+            def add_trade():
+                result = app.save_trade(user[0], synthetic_trade(rng))
+                st.cache_data.clear()
+                return result
+            recorder.run(action, add_trade)
+        else:
+            def edit_trade():
+                trades = app.load_user_trades(user[0])
+                if not trades:
+                    return None
+                trade = trades[int(rng.integers(len(trades)))]
+                result = app.update_trade(trade[0], {
+                    'date': trade[2], 'end_date': trade[3], 'pair': trade[4], 'amount': trade[5],
+                    'entry_price': trade[6], 'exit_price': trade[7], 'strategy': trade[8],
+                    'notes': f"{trade[9] or ''} edited".strip(), 'entry_screenshot': trade[10],
+                    'exit_screenshot': trade[11], 'status': trade[12], 'trade_type': trade[13]})
+                st.cache_data.clear()
+                return result
+            recorder.run(action, edit_trade)
+        if think_time:
+            time.sleep(float(rng.exponential(think_time)))
+
+
+def run_process(workdir, usernames, duration, weights, think_time, render_timeout, latency, seed):
+    # One app instance (and so one shared connection and cursor) per process, one thread per session
+    os.chdir(workdir)
+    benchmark.install_synthetic_market_data(latency)
+    app = benchmark.load_app()
+    recorder = Recorder()
+    deadline = time.time() + duration
+    threads = [threading.Thread(target=run_session, daemon=True,
+                                args=(app, recorder, username, deadline, weights, think_time, render_timeout,
+                                      latency, seed + i))
+               for i, username in enumerate(usernames)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder.export()
+
+
+def run_child(results, *args):
+    results.put(run_process(*args))
+    results.close()
+    results.join_thread()
+    sys.stdout.flush()
+    # Leave without waiting for the app's background worker threads
+    os._exit(0)
+
+
+def merge(exports):
+    samples = defaultdict(list)
+    errors = defaultdict(Counter)
+    examples = {}
+    for exported in exports:
+        for action, values in exported['samples'].items():
+            samples[action].extend(values)
+        for action, counts in exported['errors'].items():
+            errors[action].update(counts)
+        examples.update(exported['error_examples'])
+    return samples, errors, examples
+
+
+def report(samples, errors, examples, wall_seconds):
+    actions = {}
+    for action in sorted(samples):
+        values = np.asarray(samples[action]) * 1000
+        failed = sum(errors[action].values())
+        actions[action] = {
+            'count': len(values),
+            'errors': failed,
+            'error_kinds': dict(errors[action]),
+            'throughput_per_s': len(values) / wall_seconds,
+            'mean_ms': float(values.mean()),
+            'max_ms': float(values.max()),
+            **{f"p{p}_ms": float(np.percentile(values, p)) for p in PERCENTILES},
+        }
+    total = sum(len(values) for values in samples.values())
+    error_kinds = sum((Counter(counts) for counts in errors.values()), Counter())
+    return {
+        'actions': actions,
+        'total_operations': total,
+        'total_errors': sum(error_kinds.values()),
+        'throughput_per_s': total / wall_seconds,
+        'lock_contention': {
+            'lock_errors': error_kinds.get('lock', 0),
+            'shared_cursor_errors': error_kinds.get('shared_cursor', 0),
+            'transaction_errors': error_kinds.get('transaction', 0),
+        },
+        'error_examples': examples,
+    }
+
+
+def build_dataset(workdir, users, trades, screenshot_fraction, seed):
+    os.chdir(workdir)
+    benchmark.install_synthetic_market_data()
+    app = benchmark.load_app()
+    benchmark.generate_dataset(app, users, trades, screenshot_fraction, 150, 730, seed)
+    app.conn.close()
+    sys.stdout.flush()
+    os._exit(0)
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive concurrent simulated sessions against a local app instance")
+    parser.add_argument('--sessions', type=int, default=8, help="concurrent sessions in total")
+    parser.add_argument('--processes', type=int, default=1, help="app processes the sessions are spread across")
+    parser.add_argument('--duration', type=float, default=30, help="seconds each session keeps running")
+    parser.add_argument('--think-time', type=float, default=0.5, help="mean pause between actions in seconds")
+    parser.add_argument('--mix', default=DEFAULT_MIX, help="action weights, e.g. " + DEFAULT_MIX)
+    parser.add_argument('--market-latency', type=float, default=0.0, help="simulated market-data call latency in seconds")
+    parser.add_argument('--users', type=int, default=None, help="synthetic users (default: one per session)")
+    parser.add_argument('--trades', type=int, default=200, help="trades per synthetic user")
+    parser.add_argument('--screenshot-fraction', type=float, default=0.05)
+    parser.add_argument('--render-timeout', type=float, default=120)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--workdir', help="directory for the synthetic database (default: a temporary one)")
+    parser.add_argument('--output', default='load_test_results.json')
+    args = parser.parse_args()
+
+    weights = parse_mix(args.mix)
+    output = os.path.abspath(args.output)
+    workdir = args.workdir or tempfile.mkdtemp(prefix='journal_load_')
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+
+    # Build the dataset in a child process so this one never holds the database open
+    ctx = multiprocessing.get_context('spawn')
+    users = args.users or args.sessions
+    setup = ctx.Process(target=build_dataset, args=(workdir, users, args.trades, args.screenshot_fraction, args.seed))
+    setup.start()
+    setup.join()
+    if setup.exitcode:
+        raise SystemExit("Dataset generation failed")
+    usernames = [f"bench_user_{i % users}" for i in range(args.sessions)]
+
+    started = time.perf_counter()
+    if args.processes > 1:
+        results = ctx.Queue()
+        shares = [usernames[i::args.processes] for i in range(args.processes)]
+        processes = [ctx.Process(target=run_child,
+                                 args=(results, workdir, share, args.duration, weights, args.think_time,
+                                       args.render_timeout, args.market_latency, args.seed + 1000 * i))
+                     for i, share in enumerate(shares) if share]
+        for process in processes:
+            process.start()
+        exports = [results.get() for _ in processes]
+        for process in processes:
+            process.join(timeout=5)
+    else:
+        exports = [run_process(workdir, usernames, args.duration, weights, args.think_time, args.render_timeout,
+                               args.market_latency, args.seed)]
+    wall_seconds = time.perf_counter() - started
+
+    summary = report(*merge(exports), wall_seconds)
+    summary['meta'] = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': benchmark.git_commit(),
+        'wall_seconds': wall_seconds,
+        'parameters': vars(args),
+    }
+    with open(output, 'w') as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"\n{'action':<12} {'count':>7} {'errors':>7} {'ops/s':>8} " + ' '.join(f"{f'p{p} ms':>9}" for p in PERCENTILES))
+    for action, stats in summary['actions'].items():
+        print(f"{action:<12} {stats['count']:>7} {stats['errors']:>7} {stats['throughput_per_s']:>8.2f} "
+              + ' '.join(f"{stats[f'p{p}_ms']:>9.1f}" for p in PERCENTILES))
+    print(f"\n{summary['total_operations']} operations, {summary['throughput_per_s']:.2f} ops/s, "
+          f"{summary['total_errors']} errors, contention: {summary['lock_contention']}")
+    print(f"Results written to {output}")
+    sys.stdout.flush()
+    os._exit(0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+
+# Crypto markets trade every day of the year
+PERIODS_PER_YEAR = 365
+
+
+def align_closes(closes, max_gap=3):
+    # Forward fill short gaps (exchange outages, late listings stay NaN) and drop empty columns
+    closes = closes.sort_index().ffill(limit=max_gap)
+    return closes.dropna(axis=1, how='all')
+
+
+def log_returns(closes):
+    return np.log(closes).diff()
+
+
+def rolling_returns(closes, window):
+    return closes / closes.shift(window) - 1
+
+
+def rolling_volatility(returns, window, periods_per_year=PERIODS_PER_YEAR):
+    min_periods = max(2, window // 2)
+    return returns.rolling(window, min_periods=min_periods).std() * np.sqrt(periods_per_year)
+
+
+def correlation_matrix(returns, window):
+    recent = returns.tail(window)
+    values = recent.to_numpy(dtype=float)
+    if not np.isnan(values).any():
+        # Fast path: one BLAS call for the whole universe
+        std = values.std(axis=0, ddof=1)
+        if len(values) > 1 and (std > 0).all():
+            return pd.DataFrame(np.corrcoef(values, rowvar=False), index=recent.columns, columns=recent.columns)
+    return recent.corr(min_periods=max(2, window // 2))
+
+
+def rolling_correlation(returns, benchmark, window):
+    if benchmark not in returns.columns:
+        return pd.DataFrame(index=returns.index)
+    min_periods = max(2, window // 2)
+    return returns.rolling(window, min_periods=min_periods).corr(returns[benchmark])
+
+
+def universe_summary(closes, returns, window, benchmark=None, periods_per_year=PERIODS_PER_YEAR):
+    last_close = closes.ffill().iloc[-1]
+    window_return = rolling_returns(closes, window).iloc[-1]
+    volatility = rolling_volatility(returns, window, periods_per_year).iloc[-1]
+    summary = pd.DataFrame({
+        'Last Close': last_close,
+        f'{window}d Return': window_return,
+        f'{window}d Volatility': volatility,
+    })
+    if benchmark is not None and benchmark in returns.columns:
+        summary[f'{window}d Corr to {benchmark}'] = correlation_matrix(returns, window)[benchmark]
+    summary.index.name = 'Symbol'
+    return summary.sort_values(f'{window}d Return', ascending=False)
+
+
+def portfolio_analytics(closes, window, benchmark=None, periods_per_year=PERIODS_PER_YEAR):
+    closes = align_closes(closes)
+    if closes.empty or len(closes) < 2:
+        return None
+    returns = log_returns(closes)
+    return {
+        'closes': closes,
+        'normalized': closes / closes.bfill().iloc[0],
+        'volatility': rolling_volatility(returns, window, periods_per_year),
+        'correlation': correlation_matrix(returns, window),
+        'rolling_correlation': rolling_correlation(returns, benchmark, window),
+        'summary': universe_summary(closes, returns, window, benchmark, periods_per_year),
+    }
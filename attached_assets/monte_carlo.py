@@ -0,0 +1,86 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Paths are simulated in chunks of about CHUNK_CELLS equity points so the sampled returns, growth
+# and drawdown intermediates of 100k+ paths never materialize as huge matrices; only the equity
+# paths themselves are gathered, for exact fan percentiles
+CHUNK_CELLS = 2000000
+FAN_PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def simulate_chunk(returns, n_paths, n_trades, seed, starting_balance, position_fraction, sizing, ruin_level,
+                   keep_paths=0):
+    rng = np.random.default_rng(seed)
+    sampled = returns[rng.integers(0, len(returns), size=(n_paths, n_trades))]
+    if sizing == 'fixed':
+        # Same dollar notional every trade: P&L adds up
+        steps = sampled * (starting_balance * position_fraction)
+        equity = starting_balance + np.cumsum(steps, axis=1)
+    else:
+        # Fixed fraction of current equity every trade: growth compounds
+        growth = np.maximum(1.0 + sampled * position_fraction, 0.0)
+        equity = starting_balance * np.cumprod(growth, axis=1)
+    equity = np.concatenate([np.full((n_paths, 1), starting_balance), equity], axis=1)
+    peak = np.maximum.accumulate(equity, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdown = np.where(peak > 0, (peak - equity) / peak, 0.0)
+    return {
+        'final': equity[:, -1],
+        'max_drawdown': drawdown.max(axis=1),
+        'ruined': (equity <= ruin_level).any(axis=1),
+        'equity': equity,
+        'paths': equity[:keep_paths],
+    }
+
+
+def simulate(returns, n_paths=10000, n_trades=None, starting_balance=10000.0, position_fraction=1.0,
+             sizing='fractional', ruin_threshold=0.5, processes=1, seed=None, keep_paths=50):
+    # Growth, ruin and drawdown are all relative to the starting balance
+    if not starting_balance > 0:
+        raise ValueError("Starting balance must be greater than 0")
+    returns = np.asarray(returns, dtype=float)
+    returns = returns[np.isfinite(returns)]
+    if len(returns) == 0:
+        return None
+    n_trades = n_trades or len(returns)
+    ruin_level = starting_balance * (1.0 - ruin_threshold)
+    chunk_paths = max(100, CHUNK_CELLS // (n_trades + 1))
+    chunks = [chunk_paths] * (n_paths // chunk_paths) + ([n_paths % chunk_paths] if n_paths % chunk_paths else [])
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    jobs = [(returns, size, n_trades, chunk_seed, starting_balance, position_fraction, sizing, ruin_level,
+             keep_paths if i == 0 else 0) for i, (size, chunk_seed) in enumerate(zip(chunks, seeds))]
+    processes = min(processes or os.cpu_count() or 1, len(jobs))
+    if processes > 1:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            results = list(executor.map(simulate_chunk, *zip(*jobs)))
+    else:
+        results = [simulate_chunk(*job) for job in jobs]
+    final = np.concatenate([result['final'] for result in results])
+    drawdowns = np.concatenate([result['max_drawdown'] for result in results])
+    ruined = np.concatenate([result['ruined'] for result in results])
+    # Percentiles of all paths together; per-chunk percentiles do not combine into them
+    fan = np.percentile(np.concatenate([result.pop('equity') for result in results]), FAN_PERCENTILES, axis=0)
+    with np.errstate(divide='ignore'):
+        log_growth = np.log(np.maximum(final, 1e-12) / starting_balance) / n_trades
+    summary = {
+        'Paths': n_paths,
+        'Trades per Path': n_trades,
+        'Risk of Ruin': float(ruined.mean()),
+        'Median Final Equity': float(np.median(final)),
+        'Mean Final Equity': float(final.mean()),
+        '5th Percentile Final Equity': float(np.percentile(final, 5)),
+        'Median Max Drawdown': float(np.median(drawdowns)),
+        '95th Percentile Max Drawdown': float(np.percentile(drawdowns, 95)),
+        'Expected Growth per Trade': float(np.expm1(np.median(log_growth))),
+        'Probability of Profit': float((final > starting_balance).mean()),
+    }
+    return {
+        'summary': summary,
+        'final_equity': final,
+        'max_drawdown': drawdowns,
+        'fan': pd.DataFrame(fan.T, columns=[f'P{p}' for p in FAN_PERCENTILES]).rename_axis('Trade'),
+        'sample_paths': results[0]['paths'],
+    }
@@ -0,0 +1,156 @@
+import heapq
+import itertools
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+ORDER_TYPES = ('market', 'limit', 'stop')
+ORDER_SIDES = ('buy', 'sell')
+
+Order = namedtuple('Order', ['id', 'user_id', 'pair', 'side', 'order_type', 'quantity', 'price', 'close_trade_id'])
+Fill = namedtuple('Fill', ['order', 'price'])
+
+
+class OrderBook:
+    # Resting orders for one pair, kept in four price-indexed heaps so a tick only pops the
+    # orders whose trigger it crosses. Cancelled orders are dropped lazily when they surface.
+
+    def __init__(self):
+        self.orders = {}
+        self.pending_market = []
+        self.buy_limits = []    # max-heap on limit: fills when price <= limit
+        self.sell_limits = []   # min-heap on limit: fills when price >= limit
+        self.buy_stops = []     # min-heap on stop: triggers when price >= stop
+        self.sell_stops = []    # max-heap on stop: triggers when price <= stop
+        self.sequence = itertools.count()
+
+    def __len__(self):
+        return len(self.orders)
+
+    def add(self, order):
+        self.orders[order.id] = order
+        if order.order_type == 'market':
+            self.pending_market.append(order.id)
+            return
+        entry = (order.price, next(self.sequence), order.id)
+        if order.order_type == 'limit':
+            if order.side == 'buy':
+                heapq.heappush(self.buy_limits, (-entry[0],) + entry[1:])
+            else:
+                heapq.heappush(self.sell_limits, entry)
+        else:
+            if order.side == 'buy':
+                heapq.heappush(self.buy_stops, entry)
+            else:
+                heapq.heappush(self.sell_stops, (-entry[0],) + entry[1:])
+
+    def cancel(self, order_id):
+        return self.orders.pop(order_id, None)
+
+    def pop_crossed(self, heap, crossed):
+        order_ids = []
+        while heap and crossed(heap[0][0]):
+            order_id = heapq.heappop(heap)[2]
+            if order_id in self.orders:
+                order_ids.append(order_id)
+        return order_ids
+
+    def match(self, price):
+        fills = []
+        for order_id in self.pending_market:
+            if order_id in self.orders:
+                fills.append(Fill(self.orders.pop(order_id), price))
+        self.pending_market = []
+        # Limits fill at the limit or better; triggered stops fill at the tick price
+        for order_id in self.pop_crossed(self.buy_limits, lambda key: -key >= price):
+            order = self.orders.pop(order_id)
+            fills.append(Fill(order, min(order.price, price)))
+        for order_id in self.pop_crossed(self.sell_limits, lambda key: key <= price):
+            order = self.orders.pop(order_id)
+            fills.append(Fill(order, max(order.price, price)))
+        for order_id in self.pop_crossed(self.buy_stops, lambda key: key <= price):
+            fills.append(Fill(self.orders.pop(order_id), price))
+        for order_id in self.pop_crossed(self.sell_stops, lambda key: -key >= price):
+            fills.append(Fill(self.orders.pop(order_id), price))
+        return fills
+
+
+class MatchingEngine:
+    # All users' resting orders, one book per pair. Thread-safe so the UI thread can place
+    # orders while the background worker feeds ticks.
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.books = {}
+        self.order_pairs = {}
+        self.last_prices = {}
+
+    def add_order(self, order):
+        with self.lock:
+            book = self.books.setdefault(order.pair, OrderBook())
+            book.add(order)
+            self.order_pairs[order.id] = order.pair
+            if order.order_type == 'market' and order.pair in self.last_prices:
+                return self.match_locked(order.pair, self.last_prices[order.pair])
+            return []
+
+    def cancel_order(self, order_id):
+        with self.lock:
+            pair = self.order_pairs.pop(order_id, None)
+            if pair is None:
+                return None
+            return self.books[pair].cancel(order_id)
+
+    def on_tick(self, pair, price):
+        with self.lock:
+            self.last_prices[pair] = price
+            if pair not in self.books:
+                return []
+            return self.match_locked(pair, price)
+
+    def match_locked(self, pair, price):
+        fills = self.books[pair].match(price)
+        for fill in fills:
+            self.order_pairs.pop(fill.order.id, None)
+        if not self.books[pair]:
+            del self.books[pair]
+        return fills
+
+    def active_pairs(self):
+        with self.lock:
+            return list(self.books)
+
+    def resting_orders(self):
+        with self.lock:
+            return sum(len(book) for book in self.books.values())
+
+
+class SimulatedPriceFeed:
+    # Geometric random walk per pair; deterministic with a seed so tests can replay it. Pairs can
+    # join the walk later at their own starting price.
+
+    def __init__(self, start_prices=None, volatility=0.01, seed=None):
+        self.prices = dict(start_prices or {})
+        self.volatility = volatility
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+
+    def latest(self, pair):
+        return self.prices.get(pair)
+
+    def add_pair(self, pair, price):
+        with self.lock:
+            return self.prices.setdefault(pair, price)
+
+    def next_prices(self):
+        with self.lock:
+            shocks = np.exp(self.rng.normal(0.0, self.volatility, len(self.prices)))
+            for pair, shock in zip(list(self.prices), shocks):
+                self.prices[pair] *= float(shock)
+            return dict(self.prices)
+
+    def ticks(self, count):
+        for _ in range(count):
+            yield self.next_prices()
+
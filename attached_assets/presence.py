@@ -0,0 +1,55 @@
+import threading
+import time
+
+# In-memory presence. Every rerun records a heartbeat in a dict (no database write); a worker
+# periodically takes the pending heartbeats, writes them to online_users in one batch and merges
+# back the users the database reports active, which includes other app processes. Lookups and
+# the online count never touch the database.
+
+
+class PresenceTracker:
+
+    def __init__(self, timeout_seconds):
+        self.timeout = timeout_seconds
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.last_seen = {}
+
+    def heartbeat(self, user_id, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            self.pending[user_id] = now
+            self.last_seen[user_id] = now
+
+    def take_pending(self):
+        # Latest heartbeat per user since the previous flush
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        return pending
+
+    def restore_pending(self, pending):
+        # A failed flush puts its heartbeats back unless newer ones arrived meanwhile
+        with self.lock:
+            for user_id, seen in pending.items():
+                if self.pending.get(user_id, 0) < seen:
+                    self.pending[user_id] = seen
+
+    def merge(self, active, now=None):
+        # active: (user_id, last seen) pairs the database reports within the timeout. Replaces the
+        # view, keeping heartbeats that arrived here since the flush.
+        now = time.time() if now is None else now
+        cutoff = now - self.timeout
+        with self.lock:
+            last_seen = {user_id: seen for user_id, seen in active if seen >= cutoff}
+            for user_id, seen in self.pending.items():
+                if last_seen.get(user_id, 0) < seen:
+                    last_seen[user_id] = seen
+            self.last_seen = last_seen
+
+    def is_online(self, user_id, now=None):
+        now = time.time() if now is None else now
+        return self.last_seen.get(user_id, 0) >= now - self.timeout
+
+    def online_count(self):
+        # As of the last merge plus local heartbeats since; expiry is applied at each merge
+        return len(self.last_seen)
@@ -0,0 +1,196 @@
+import functools
+import json
+import logging
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in milliseconds; the last bucket catches everything slower
+BUCKET_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float('inf'))
+RECENT_SAMPLES = 1024
+SLOW_QUERY_MS = 50.0
+SLOW_QUERY_LOG_SIZE = 200
+EXPLAINABLE = ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT')
+
+
+def normalize_sql(sql, width=160):
+    return re.sub(r'\s+', ' ', sql).strip()[:width]
+
+
+class TimingStats:
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(BUCKET_BOUNDS_MS)
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def add(self, ms):
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+        self.buckets[next(i for i, bound in enumerate(BUCKET_BOUNDS_MS) if ms <= bound)] += 1
+        self.recent.append(ms)
+
+
+class Profiler:
+    # Process-wide timing registry. Samples are grouped by (category, name) into fixed log-spaced
+    # histograms; percentiles come from the most recent RECENT_SAMPLES samples.
+
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS):
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.slow = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+        self.slow_query_ms = slow_query_ms
+        self.started = datetime.now()
+
+    def record(self, category, name, seconds):
+        with self.lock:
+            stats = self.stats.get((category, name))
+            if stats is None:
+                stats = self.stats[(category, name)] = TimingStats()
+            stats.add(seconds * 1000)
+
+    @contextmanager
+    def section(self, category, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(category, name, time.perf_counter() - started)
+
+    def timed(self, category, name=None):
+        def decorator(func):
+            label = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(category, label, time.perf_counter() - started)
+            return wrapper
+        return decorator
+
+    def record_query(self, connection, sql, params, seconds):
+        self.record('query', normalize_sql(sql), seconds)
+        ms = seconds * 1000
+        if ms < self.slow_query_ms:
+            return
+        plan = []
+        if sql.lstrip().upper().startswith(EXPLAINABLE):
+            try:
+                plan = [row[-1] for row in connection.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()]
+            except Exception as e:
+                plan = [f"plan unavailable: {e}"]
+        entry = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'ms': round(ms, 3),
+            'sql': normalize_sql(sql, width=2000),
+            'params': repr(params)[:200],
+            'plan': plan,
+        }
+        with self.lock:
+            self.slow.append(entry)
+        logger.warning(f"Slow query ({ms:.1f} ms): {entry['sql'][:200]} | plan: {'; '.join(plan)}")
+
+    def snapshot(self):
+        with self.lock:
+            items = [(key, stats.count, stats.total, stats.max, list(stats.buckets), list(stats.recent))
+                     for key, stats in self.stats.items()]
+        rows = []
+        for (category, name), count, total, maximum, buckets, recent in items:
+            p50, p95, p99 = np.percentile(recent, [50, 95, 99]) if recent else (0.0, 0.0, 0.0)
+            rows.append({
+                'category': category, 'name': name, 'count': count,
+                'total_ms': total, 'mean_ms': total / count if count else 0.0,
+                'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99), 'max_ms': maximum,
+                'histogram': dict(zip((str(bound) for bound in BUCKET_BOUNDS_MS), buckets)),
+            })
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+    def slow_queries(self):
+        with self.lock:
+            return list(self.slow)[::-1]
+
+    def reset(self):
+        with self.lock:
+            self.stats.clear()
+            self.slow.clear()
+            self.started = datetime.now()
+
+    def export_json(self):
+        return json.dumps({
+            'started': self.started.isoformat(timespec='seconds'),
+            'exported': datetime.now().isoformat(timespec='seconds'),
+            'slow_query_ms': self.slow_query_ms,
+            'timings': self.snapshot(),
+            'slow_queries': self.slow_queries(),
+        }, indent=2)
+
+
+class TimedCursor:
+    # Wraps a sqlite3 cursor so every statement is timed, execute and fetch together, and slow
+    # statements are logged with their EXPLAIN QUERY PLAN
+
+    def __init__(self, cursor, profiler):
+        self.cursor = cursor
+        self.profiler = profiler
+        self.pending = None
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def finish(self, extra=0.0):
+        if self.pending is not None:
+            sql, params, seconds = self.pending
+            self.pending = None
+            self.profiler.record_query(self.cursor.connection, sql, params, seconds + extra)
+
+    def execute(self, sql, params=()):
+        self.finish()
+        started = time.perf_counter()
+        self.cursor.execute(sql, params)
+        # Recorded once the rows are fetched (or the next statement runs) so fetch time counts too
+        self.pending = (sql, params, time.perf_counter() - started)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self.finish()
+        started = time.perf_counter()
+        self.cursor.executemany(sql, seq_of_params)
+        self.profiler.record('query', normalize_sql(sql), time.perf_counter() - started)
+        return self
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self.cursor.fetchone()
+        self.finish(time.perf_counter() - started)
+        return row
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self.cursor.fetchall()
+        self.finish(time.perf_counter() - started)
+        return rows
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = self.cursor.fetchmany(size) if size is not None else self.cursor.fetchmany()
+        self.finish(time.perf_counter() - started)
+        return rows
+
+
+PROFILER = Profiler()
@@ -0,0 +1,65 @@
+import time
+from collections import deque
+
+import pandas as pd
+
+from indicators import IndicatorState
+
+BAR_COLUMNS = ('ts', 'open', 'high', 'low', 'close', 'volume')
+
+
+def stream_bars(db, symbol, interval, start=None, end=None, batch_size=500):
+    # Pages through the local price_history cache so memory stays bounded by batch_size. Each page
+    # is its own keyset query read to the end, so no statement (and no SHARED lock on the database)
+    # stays open while a replay is paused between bars.
+    query = '''SELECT ts, open, high, low, close, volume FROM price_history
+               WHERE symbol=? AND interval=? AND ts {} ? AND ts <= ?
+               ORDER BY ts LIMIT ?'''
+    rows = db.execute(query.format('>='), (symbol, interval, start or '', end or '9999', batch_size)).fetchall()
+    while rows:
+        for row in rows:
+            yield dict(zip(BAR_COLUMNS, row))
+        rows = db.execute(query.format('>'), (symbol, interval, rows[-1][0], end or '9999', batch_size)).fetchall()
+
+
+class ReplaySession:
+    # Steps through history one bar at a time, updating indicators incrementally and keeping
+    # only a bounded window of recent bars for charting.
+
+    def __init__(self, db, symbol, interval='1d', start=None, end=None, history=300, warmup=0):
+        self.symbol = symbol
+        self.interval = interval
+        self.bars = stream_bars(db, symbol, interval, start, end)
+        self.indicators = IndicatorState()
+        self.history = deque(maxlen=history)
+        self.position = 0
+        self.finished = False
+        self.last_step_seconds = 0.0
+        if warmup:
+            self.step(warmup)
+
+    @property
+    def current(self):
+        return self.history[-1] if self.history else None
+
+    def step(self, count=1):
+        started = time.perf_counter()
+        stepped = []
+        for _ in range(count):
+            bar = next(self.bars, None)
+            if bar is None:
+                self.finished = True
+                break
+            bar.update(self.indicators.update(bar['close']))
+            self.history.append(bar)
+            self.position += 1
+            stepped.append(bar)
+        self.last_step_seconds = (time.perf_counter() - started) / max(len(stepped), 1)
+        return stepped
+
+    def frame(self):
+        frame = pd.DataFrame(list(self.history))
+        if not frame.empty:
+            frame['ts'] = pd.to_datetime(frame['ts'])
+            frame = frame.set_index('ts')
+        return frame
@@ -0,0 +1,143 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+PERIODS_PER_YEAR = 365
+
+
+def equity_returns(equity):
+    equity = equity.dropna()
+    returns = equity.pct_change()
+    # A non-positive account value has no meaningful percentage return
+    returns[equity.shift(1) <= 0] = np.nan
+    return returns.replace([np.inf, -np.inf], np.nan).dropna()
+
+
+# Metric kernels work on the last axis so the same code scores one series or a matrix of resamples
+def sharpe(returns, periods_per_year=PERIODS_PER_YEAR, risk_free=0.0):
+    excess = returns - risk_free / periods_per_year
+    std = excess.std(axis=-1, ddof=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = excess.mean(axis=-1) / std * np.sqrt(periods_per_year)
+    return np.where(std > 0, ratio, 0.0)
+
+
+def sortino(returns, periods_per_year=PERIODS_PER_YEAR, risk_free=0.0):
+    excess = returns - risk_free / periods_per_year
+    downside = np.sqrt(np.mean(np.minimum(excess, 0.0) ** 2, axis=-1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = excess.mean(axis=-1) / downside * np.sqrt(periods_per_year)
+    return np.where(downside > 0, ratio, 0.0)
+
+
+def max_drawdown(returns):
+    wealth = np.cumprod(1.0 + returns, axis=-1)
+    peak = np.maximum.accumulate(np.maximum(wealth, 1.0), axis=-1)
+    return np.max((peak - wealth) / peak, axis=-1)
+
+
+def annualized_return(returns, periods_per_year=PERIODS_PER_YEAR):
+    growth = np.prod(1.0 + returns, axis=-1)
+    years = returns.shape[-1] / periods_per_year
+    return np.where(growth > 0, np.power(np.maximum(growth, 1e-12), 1.0 / years) - 1.0, -1.0)
+
+
+def calmar(returns, periods_per_year=PERIODS_PER_YEAR):
+    drawdown = max_drawdown(returns)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = annualized_return(returns, periods_per_year) / drawdown
+    return np.where(drawdown > 0, ratio, 0.0)
+
+
+def historical_var(returns, level=0.95):
+    return -np.quantile(returns, 1.0 - level, axis=-1)
+
+
+def historical_cvar(returns, level=0.95):
+    cutoff = np.quantile(returns, 1.0 - level, axis=-1)
+    tail = np.where(returns <= np.expand_dims(cutoff, -1), returns, np.nan)
+    return -np.nanmean(tail, axis=-1)
+
+
+def parametric_var(returns, level=0.95):
+    z = NormalDist().inv_cdf(1.0 - level)
+    return -(returns.mean(axis=-1) + z * returns.std(axis=-1, ddof=1))
+
+
+def parametric_cvar(returns, level=0.95):
+    z = NormalDist().inv_cdf(1.0 - level)
+    tail_mean = NormalDist().pdf(z) / (1.0 - level)
+    return -(returns.mean(axis=-1) - returns.std(axis=-1, ddof=1) * tail_mean)
+
+
+def metric_functions(periods_per_year=PERIODS_PER_YEAR, level=0.95):
+    return {
+        'Sharpe Ratio': lambda r: sharpe(r, periods_per_year),
+        'Sortino Ratio': lambda r: sortino(r, periods_per_year),
+        'Calmar Ratio': lambda r: calmar(r, periods_per_year),
+        'Annualized Return': lambda r: annualized_return(r, periods_per_year),
+        'Annualized Volatility': lambda r: r.std(axis=-1, ddof=1) * np.sqrt(periods_per_year),
+        'Max Drawdown': max_drawdown,
+        f'Historical VaR {level:.0%}': lambda r: historical_var(r, level),
+        f'Historical CVaR {level:.0%}': lambda r: historical_cvar(r, level),
+        f'Parametric VaR {level:.0%}': lambda r: parametric_var(r, level),
+        f'Parametric CVaR {level:.0%}': lambda r: parametric_cvar(r, level),
+    }
+
+
+def bootstrap_chunk(values, n_resamples, seed, metrics):
+    rng = np.random.default_rng(seed)
+    samples = values[rng.integers(0, len(values), size=(n_resamples, len(values)))]
+    return {name: np.asarray(func(samples)) for name, func in metrics.items()}
+
+
+def bootstrap_confidence(returns, metrics, n_resamples=2000, confidence=0.9, workers=None, seed=None):
+    values = np.asarray(returns, dtype=float)
+    workers = workers or min(4, os.cpu_count() or 1)
+    chunks = [len(part) for part in np.array_split(np.arange(n_resamples), workers) if len(part)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    # NumPy releases the GIL in the heavy kernels, so threads score resample chunks in parallel
+    with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+        results = list(executor.map(lambda args: bootstrap_chunk(values, args[0], args[1], metrics), zip(chunks, seeds)))
+    alpha = (1.0 - confidence) / 2.0
+    bounds = {}
+    for name in metrics:
+        scores = np.concatenate([result[name] for result in results])
+        bounds[name] = (float(np.nanquantile(scores, alpha)), float(np.nanquantile(scores, 1.0 - alpha)))
+    return bounds
+
+
+def rolling_metrics(returns, window, periods_per_year=PERIODS_PER_YEAR):
+    min_periods = max(2, window // 2)
+    rolling = returns.rolling(window, min_periods=min_periods)
+    mean = rolling.mean()
+    std = rolling.std()
+    downside = np.sqrt((np.minimum(returns, 0.0) ** 2).rolling(window, min_periods=min_periods).mean())
+    annualizer = np.sqrt(periods_per_year)
+    return pd.DataFrame({
+        'Rolling Sharpe': (mean / std.where(std > 0)) * annualizer,
+        'Rolling Sortino': (mean / downside.where(downside > 0)) * annualizer,
+        'Rolling Volatility': std * annualizer,
+    })
+
+
+def risk_report(returns, periods_per_year=PERIODS_PER_YEAR, level=0.95, n_resamples=2000, confidence=0.9,
+                window=30, seed=None):
+    returns = pd.Series(returns, dtype=float).dropna()
+    if len(returns) < 3:
+        return None
+    metrics = metric_functions(periods_per_year, level)
+    values = returns.to_numpy()
+    bounds = bootstrap_confidence(values, metrics, n_resamples, confidence, seed=seed) if n_resamples else {}
+    rows = []
+    for name, func in metrics.items():
+        lower, upper = bounds.get(name, (np.nan, np.nan))
+        rows.append({'Metric': name, 'Value': float(func(values)), 'CI Lower': lower, 'CI Upper': upper})
+    return {
+        'metrics': pd.DataFrame(rows).set_index('Metric'),
+        'rolling': rolling_metrics(returns, window, periods_per_year),
+        'confidence': confidence,
+    }
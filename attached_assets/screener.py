@@ -0,0 +1,138 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Market screener over every trading pair at once.
+#
+# Closes and volumes arrive stacked as time x symbol frames, so each indicator is one vectorized
+# pass over the whole universe: exponential averages, rolling windows and comparisons run column-
+# wise in pandas/numpy, never per symbol. indicator_snapshot() reduces the matrix to the latest
+# reading per symbol; conditions are then plain comparisons on that small table, so changing a
+# threshold does not recompute anything.
+#
+# Indicator settings match the ta library defaults used by the Market Data charts.
+
+RSI_WINDOW = 14
+MACD_FAST = 12
+MACD_SLOW = 26
+MACD_SIGNAL = 9
+BOLLINGER_WINDOW = 20
+BOLLINGER_DEVIATIONS = 2
+VOLUME_WINDOW = 20
+# Bars of history screened per symbol; enough for the exponential averages to settle
+SCREEN_BARS = 300
+# How far back a MACD crossover is still reported
+CROSS_LOOKBACK = 10
+# Closes are carried over gaps of at most this many bars
+MAX_GAP = 3
+SNAPSHOT_COLUMNS = ['Close', 'RSI', 'MACD', 'Signal', 'Cross', 'Bars Since Cross', 'BB High', 'BB Low', 'Volume Ratio',
+                    'Last Bar']
+
+
+def indicator_snapshot(close, volume):
+    # close, volume: time x symbol frames on a shared sorted index. One row per symbol.
+    close = close.ffill(limit=MAX_GAP)
+    volume = volume.reindex_like(close)
+    delta = close.diff()
+    gain = delta.clip(lower=0).ewm(alpha=1 / RSI_WINDOW, min_periods=RSI_WINDOW, adjust=False).mean()
+    loss = (-delta.clip(upper=0)).ewm(alpha=1 / RSI_WINDOW, min_periods=RSI_WINDOW, adjust=False).mean()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100 - 100 / (1 + gain.iloc[-1] / loss.iloc[-1])
+
+    macd = (close.ewm(span=MACD_FAST, min_periods=MACD_FAST, adjust=False).mean()
+            - close.ewm(span=MACD_SLOW, min_periods=MACD_SLOW, adjust=False).mean())
+    signal = macd.ewm(span=MACD_SIGNAL, min_periods=MACD_SIGNAL, adjust=False).mean()
+    above = (macd > signal).to_numpy()[-CROSS_LOOKBACK - 1:]
+    valid = (macd.notna() & signal.notna()).to_numpy()[-CROSS_LOOKBACK - 1:]
+    crossed = (above[1:] != above[:-1]) & valid[1:] & valid[:-1]
+    # Bars since the most recent crossover per symbol (reading the flags newest first); the
+    # direction is the side MACD has held since
+    newest_first = crossed[::-1]
+    bars_since = np.where(newest_first.any(axis=0), newest_first.argmax(axis=0), np.nan)
+    direction = np.where(np.isnan(bars_since), 0, np.where(above[-1], 1, -1))
+
+    middle = close.rolling(BOLLINGER_WINDOW, min_periods=BOLLINGER_WINDOW).mean().iloc[-1]
+    deviation = close.rolling(BOLLINGER_WINDOW, min_periods=BOLLINGER_WINDOW).std(ddof=0).iloc[-1]
+    average_volume = volume.shift(1).rolling(VOLUME_WINDOW, min_periods=VOLUME_WINDOW // 2).mean().iloc[-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        volume_ratio = volume.iloc[-1] / average_volume.where(average_volume > 0)
+    priced = close.notna().to_numpy()
+    last_bar = np.where(priced.any(axis=0), len(close) - 1 - priced[::-1].argmax(axis=0), -1)
+
+    snapshot = pd.DataFrame({
+        'Close': close.iloc[-1],
+        'RSI': rsi,
+        'MACD': macd.iloc[-1],
+        'Signal': signal.iloc[-1],
+        'Cross': direction,
+        'Bars Since Cross': bars_since,
+        'BB High': middle + BOLLINGER_DEVIATIONS * deviation,
+        'BB Low': middle - BOLLINGER_DEVIATIONS * deviation,
+        'Volume Ratio': volume_ratio,
+        'Last Bar': pd.Series(close.index[np.maximum(last_bar, 0)], index=close.columns).where(last_bar >= 0),
+    }, index=close.columns)
+    # Symbols without a recent close keep only their last bar time, not readings from before the gap
+    stale = snapshot['Close'].isna()
+    snapshot.loc[stale, snapshot.columns.drop(['Cross', 'Last Bar'])] = np.nan
+    snapshot.loc[stale, 'Cross'] = 0
+    return snapshot
+
+
+def screen(close, volume, processes=1):
+    # With processes > 1 (0 for every core) the symbols are split into column blocks computed in
+    # a process pool; each block is still vectorized across its symbols
+    if close.empty:
+        return pd.DataFrame(columns=SNAPSHOT_COLUMNS, index=close.columns)
+    processes = min(processes or os.cpu_count() or 1, close.shape[1])
+    if processes <= 1:
+        return indicator_snapshot(close, volume)
+    blocks = np.array_split(np.arange(close.shape[1]), processes)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        snapshots = list(executor.map(indicator_snapshot, [close.iloc[:, block] for block in blocks],
+                                      [volume.iloc[:, block] for block in blocks]))
+    return pd.concat(snapshots)
+
+
+def describe_condition(condition):
+    kind = condition[0]
+    if kind == 'rsi':
+        return f"RSI {condition[1]} {condition[2]:g}"
+    if kind == 'macd_cross':
+        return f"MACD {condition[1]} cross ({condition[2]} bars)"
+    if kind == 'bollinger':
+        return {'below': "Below lower band", 'above': "Above upper band", 'outside': "Outside Bollinger bands"}[condition[1]]
+    if kind == 'volume_spike':
+        return f"Volume {condition[1]:g}x average"
+    raise ValueError(f"Unknown screener condition: {kind}")
+
+
+def condition_mask(snapshot, condition):
+    kind = condition[0]
+    if kind == 'rsi':
+        _, operator, level = condition
+        return snapshot['RSI'] < level if operator == '<' else snapshot['RSI'] > level
+    if kind == 'macd_cross':
+        _, direction, within = condition
+        return (snapshot['Cross'] == (1 if direction == 'bullish' else -1)) & (snapshot['Bars Since Cross'] < within)
+    if kind == 'bollinger':
+        below = snapshot['Close'] < snapshot['BB Low']
+        above = snapshot['Close'] > snapshot['BB High']
+        return {'below': below, 'above': above, 'outside': below | above}[condition[1]]
+    if kind == 'volume_spike':
+        return snapshot['Volume Ratio'] >= condition[1]
+    raise ValueError(f"Unknown screener condition: {kind}")
+
+
+def apply_conditions(snapshot, conditions, match_all=True):
+    # conditions: tuples such as ('rsi', '<', 30), ('macd_cross', 'bullish', 3), ('bollinger', 'outside'),
+    # ('volume_spike', 2.0). Returns the matching rows with the conditions each one met.
+    if not conditions:
+        return snapshot.assign(Signals='')
+    masks = pd.DataFrame({describe_condition(condition): condition_mask(snapshot, condition).fillna(False)
+                          for condition in conditions}, index=snapshot.index)
+    matched = masks.all(axis=1) if match_all else masks.any(axis=1)
+    # bool x str multiplies to the label or '', so one dot product lists each row's conditions
+    signals = masks[matched].astype(object).dot(masks.columns + ', ').str[:-2]
+    return snapshot[matched].assign(Signals=signals)
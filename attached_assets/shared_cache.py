@@ -0,0 +1,199 @@
+import functools
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Cache shared by every app process on the host. st.cache_data lives inside one process, so with
+# several Streamlit workers behind a load balancer each one would call yfinance and NewsAPI for the
+# same quotes; results stored here are reused by all of them.
+#
+# Entries are pickled into one SQLite file in WAL mode (readers never wait for writers, each write
+# is a transaction), expire after their TTL and are evicted least recently used beyond MAX_ENTRIES
+# or MAX_BYTES. A miss claims the key in the fills table before computing, so when several workers
+# miss the same key at once only one of them calls upstream and the others wait for its result.
+
+MAX_ENTRIES = 5000
+MAX_BYTES = 256 * 1024 * 1024
+# Upper bound on how long a fill may hold its claim before other processes compute for themselves
+FILL_TIMEOUT = 30
+FILL_POLL_SECONDS = 0.05
+# Last-access times are only rewritten when older than this, so hot keys do not turn reads into writes
+TOUCH_SECONDS = 30
+MISS = object()
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL NOT NULL,
+    accessed REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries(accessed);
+CREATE TABLE IF NOT EXISTS fills (
+    key TEXT PRIMARY KEY,
+    expires REAL NOT NULL);
+'''
+
+
+class SharedCache:
+
+    def __init__(self, path, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, fill_timeout=FILL_TIMEOUT):
+        self.path = os.path.abspath(path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.fill_timeout = fill_timeout
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.counts = {'hits': 0, 'misses': 0, 'fills': 0, 'waits': 0, 'errors': 0}
+        self.connection().executescript(SCHEMA)
+
+    def connection(self):
+        # One connection per thread; autocommit, with explicit transactions where they matter
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self.local.db = db
+        return db
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def get(self, key, now=None):
+        now = time.time() if now is None else now
+        row = self.connection().execute("SELECT value, expires, accessed FROM entries WHERE key=?", (key,)).fetchone()
+        if row is None or row[1] < now:
+            return MISS
+        if now - row[2] > TOUCH_SECONDS:
+            self.connection().execute("UPDATE entries SET accessed=? WHERE key=?", (now, key))
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl, now=None):
+        now = time.time() if now is None else now
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        db = self.connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("INSERT OR REPLACE INTO entries (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                       (key, blob, len(blob), now + ttl, now))
+            self.evict(db, now)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def evict(self, db, now):
+        db.execute("DELETE FROM entries WHERE expires < ?", (now,))
+        entries, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if entries <= self.max_entries and size <= self.max_bytes:
+            return
+        # Walk from the least recently used entry until both limits hold again
+        excess_entries, excess_bytes = entries - self.max_entries, size - self.max_bytes
+        doomed = []
+        for key, entry_size in db.execute("SELECT key, size FROM entries ORDER BY accessed"):
+            if excess_entries <= 0 and excess_bytes <= 0:
+                break
+            doomed.append((key,))
+            excess_entries -= 1
+            excess_bytes -= entry_size
+        db.executemany("DELETE FROM entries WHERE key=?", doomed)
+
+    def claim(self, key, now):
+        db = self.connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("DELETE FROM fills WHERE key=? AND expires < ?", (key, now))
+            claimed = db.execute("INSERT OR IGNORE INTO fills (key, expires) VALUES (?, ?)",
+                                 (key, now + self.fill_timeout)).rowcount == 1
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return claimed
+
+    def release(self, key):
+        self.connection().execute("DELETE FROM fills WHERE key=?", (key,))
+
+    def get_or_compute(self, key, ttl, compute):
+        # Errors in the cache itself are logged and the value computed directly; errors from compute
+        # propagate and leave nothing cached
+        try:
+            value = self.get(key)
+            if value is not MISS:
+                self.count('hits')
+                return value
+            self.count('misses')
+            claimed = self.wait_for_fill(key)
+            value = self.get(key)
+            if claimed and value is not MISS:
+                # A fill finished between the miss and the claim
+                self.release(key)
+                return value
+        except (sqlite3.Error, pickle.PickleError, EOFError) as e:
+            self.count('errors')
+            logger.error(f"Shared cache unavailable for {key}: {str(e)}")
+            return compute()
+        if not claimed:
+            # Either another worker filled the key or its claim timed out and this one computes alone
+            return value if value is not MISS else compute()
+        try:
+            value = compute()
+            self.count('fills')
+            try:
+                self.set(key, value, ttl)
+            except (sqlite3.Error, pickle.PickleError, TypeError, AttributeError) as e:
+                self.count('errors')
+                logger.error(f"Could not store {key} in the shared cache: {str(e)}")
+            return value
+        finally:
+            try:
+                self.release(key)
+            except sqlite3.Error as e:
+                logger.error(f"Could not release shared cache fill for {key}: {str(e)}")
+
+    def wait_for_fill(self, key):
+        # True once this process holds the key's claim; False when another worker's fill landed or
+        # its claim outlived the deadline
+        deadline = time.time() + self.fill_timeout
+        while not self.claim(key, time.time()):
+            self.count('waits')
+            time.sleep(FILL_POLL_SECONDS)
+            if self.get(key) is not MISS or time.time() > deadline:
+                return False
+        return True
+
+    def cached(self, ttl, name=None):
+        # Keys are the function name plus a digest of the arguments' reprs, so arguments need a
+        # stable repr (strings, numbers, tuples)
+        def decorator(func):
+            prefix = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                digest = hashlib.sha1(repr((args, sorted(kwargs.items()))).encode('utf-8')).hexdigest()
+                return self.get_or_compute(f"{prefix}:{digest}", ttl, lambda: func(*args, **kwargs))
+            wrapper.uncached = func
+            return wrapper
+        return decorator
+
+    def clear(self, prefix=None):
+        if prefix is None:
+            self.connection().execute("DELETE FROM entries")
+        else:
+            self.connection().execute("DELETE FROM entries WHERE key >= ? AND key < ?", (prefix + ':', prefix + ';'))
+
+    def stats(self):
+        entries, size, expired = self.connection().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(expires < ?), 0) FROM entries",
+            (time.time(),)).fetchone()
+        with self.lock:
+            counts = dict(self.counts)
+        return {'entries': entries, 'bytes': size, 'expired': expired, **counts}
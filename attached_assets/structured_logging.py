@@ -0,0 +1,166 @@
+import atexit
+import contextvars
+import copy
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Queue-based JSON logging. Request threads only format the message and drop the record on a
+# bounded queue; a listener thread writes it to a size- and time-rotated file whose backups are
+# gzipped. Configured from the environment:
+#
+#   LOG_FILE            log path (app.log)
+#   LOG_LEVEL           root level (INFO)
+#   LOG_LEVELS          per-logger levels, e.g. "__main__=DEBUG,profiler=WARNING"
+#   LOG_MAX_BYTES       rotate when the file reaches this size (10 MB)
+#   LOG_ROTATE_HOURS    rotate at least this often (24)
+#   LOG_BACKUP_COUNT    compressed backups kept (10)
+#   LOG_QUEUE_SIZE      records buffered before new ones are dropped (10000)
+
+DEFAULT_LEVELS = {
+    'urllib3': 'WARNING',
+    'yfinance': 'WARNING',
+    'peewee': 'WARNING',
+    'PIL': 'WARNING',
+    'matplotlib': 'WARNING',
+    'streamlit': 'WARNING',
+    'watchdog': 'WARNING',
+}
+# Attributes every LogRecord has; anything else on a record came from extra= and is emitted as a field
+RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'session_id', 'user_id'}
+
+log_context = contextvars.ContextVar('log_context', default={})
+_listener = None
+_queue_handler = None
+
+
+def set_log_context(**fields):
+    # Session/user fields attached to every record logged from the current thread or task
+    log_context.set({key: value for key, value in fields.items() if value is not None})
+
+
+class ContextFilter(logging.Filter):
+    # Runs on the producing thread (before the record is queued) so it sees that thread's context
+
+    def filter(self, record):
+        context = log_context.get()
+        record.session_id = context.get('session_id')
+        record.user_id = context.get('user_id')
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'thread': record.threadName,
+        }
+        for key in ('session_id', 'user_id'):
+            if getattr(record, key, None) is not None:
+                entry[key] = getattr(record, key)
+        for key, value in vars(record).items():
+            if key not in RESERVED_ATTRS and not key.startswith('_'):
+                entry[key] = value if isinstance(value, (str, int, float, bool, type(None))) else repr(value)
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DroppingQueueHandler(QueueHandler):
+    # Never blocks the caller: when the queue is full the record is counted and dropped
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Render the message and traceback now so the queued record holds no live references;
+        # the JSON itself is built on the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class CompressedRotatingFileHandler(RotatingFileHandler):
+    # Rotates on size or age, whichever comes first, and gzips the rotated file
+
+    def __init__(self, filename, max_bytes, backup_count, rotate_seconds):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+        self.rotate_seconds = rotate_seconds
+        self.rollover_at = time.time() + rotate_seconds
+        self.namer = lambda name: name + '.gz'
+        self.rotator = self.compress
+
+    @staticmethod
+    def compress(source, dest):
+        with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(source)
+
+    def shouldRollover(self, record):
+        if self.rotate_seconds and time.time() >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = time.time() + self.rotate_seconds
+
+
+def parse_levels(text):
+    levels = dict(DEFAULT_LEVELS)
+    for item in filter(None, (part.strip() for part in (text or '').split(','))):
+        name, _, level = item.partition('=')
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging():
+    # Idempotent: Streamlit re-executes the app script on every rerun, but this module is imported once
+    global _listener, _queue_handler
+    if _listener is not None:
+        return _queue_handler
+    file_handler = CompressedRotatingFileHandler(
+        os.environ.get('LOG_FILE', 'app.log'),
+        max_bytes=int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024)),
+        backup_count=int(os.environ.get('LOG_BACKUP_COUNT', 10)),
+        rotate_seconds=float(os.environ.get('LOG_ROTATE_HOURS', 24)) * 3600,
+    )
+    file_handler.setFormatter(JsonFormatter())
+
+    _queue_handler = DroppingQueueHandler(queue.Queue(maxsize=int(os.environ.get('LOG_QUEUE_SIZE', 10000))))
+    _queue_handler.addFilter(ContextFilter())
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    root.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+    for name, level in parse_levels(os.environ.get('LOG_LEVELS')).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(_queue_handler.queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+    return _queue_handler
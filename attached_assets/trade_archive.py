@@ -0,0 +1,74 @@
+import json
+import os
+import zlib
+
+# Storage for archived trades. Closed trades past the archive age leave the live trades table and
+# are kept here, one SQLite file per year in which the trades closed:
+#
+#   archive/trades_2023.db   trade_chunks(user_id, month, trade_count, first_id, last_id, payload)
+#
+# Each chunk holds one archive run's trades for one user and month as zlib-compressed JSON rows
+# in ARCHIVE_COLUMNS order (the trades table's own columns, ids included, so a restore puts rows
+# back unchanged). The app attaches a partition to its own connection, so moving rows in and out
+# commits atomically with the changes to the live tables.
+
+ARCHIVE_DIR = 'archive'
+ARCHIVE_SCHEMA = 'archive'
+ARCHIVE_COLUMNS = ('id', 'user_id', 'date', 'end_date', 'pair_id', 'amount', 'entry_price', 'exit_price',
+                   'strategy_id', 'notes', 'entry_screenshot', 'exit_screenshot', 'status', 'trade_type', 'source')
+PARTITION_PREFIX = 'trades_'
+COMPRESSION_LEVEL = 6
+
+
+def partition_path(archive_dir, year):
+    return os.path.join(archive_dir, f"{PARTITION_PREFIX}{year}.db")
+
+
+def attach_partition(db, archive_dir, year):
+    # ATTACH cannot run inside a transaction; callers attach first, then begin
+    os.makedirs(archive_dir, exist_ok=True)
+    db.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (partition_path(archive_dir, year),))
+    db.execute(f'''CREATE TABLE IF NOT EXISTS {ARCHIVE_SCHEMA}.trade_chunks
+                   (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    month TEXT NOT NULL,
+                    trade_count INTEGER NOT NULL,
+                    first_id INTEGER NOT NULL,
+                    last_id INTEGER NOT NULL,
+                    archived_at TEXT,
+                    payload BLOB NOT NULL)''')
+    db.execute(f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_trade_chunks_user ON trade_chunks(user_id, month)")
+
+
+def detach_partition(db):
+    db.execute(f"DETACH DATABASE {ARCHIVE_SCHEMA}")
+
+
+def encode_chunk(rows):
+    return zlib.compress(json.dumps([list(row) for row in rows], separators=(',', ':')).encode('utf-8'),
+                         COMPRESSION_LEVEL)
+
+
+def decode_chunk(payload):
+    return [tuple(row) for row in json.loads(zlib.decompress(payload).decode('utf-8'))]
+
+
+def chunk_rows(rows):
+    # rows are ARCHIVE_COLUMNS tuples; yields (user_id, month closed, rows) per chunk
+    chunks = {}
+    for row in rows:
+        chunks.setdefault((row[1], (row[3] or row[2])[:7]), []).append(row)
+    for (user_id, month), chunk in sorted(chunks.items()):
+        yield user_id, month, chunk
+
+
+def list_partitions(archive_dir=ARCHIVE_DIR):
+    # (year, path, bytes) for every partition file on disk
+    if not os.path.isdir(archive_dir):
+        return []
+    partitions = []
+    for name in sorted(os.listdir(archive_dir)):
+        if name.startswith(PARTITION_PREFIX) and name.endswith('.db'):
+            path = os.path.join(archive_dir, name)
+            partitions.append((name[len(PARTITION_PREFIX):-3], path, os.path.getsize(path)))
+    return partitions
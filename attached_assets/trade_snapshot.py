@@ -0,0 +1,276 @@
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+import trade_archive
+
+# Columnar snapshot of the journal's trades for ad-hoc analytics, kept outside the live database.
+#
+#   python trade_snapshot.py export --db crypto_backtest.db
+#   python trade_snapshot.py query --group-by pair,strategy --start 2024-01 --end 2024-06
+#
+# Trades are written as Parquet under month=YYYY-MM/user_bucket=K/ (Hive partitioning, users hashed
+# into USER_BUCKETS buckets so files stay large enough to scan quickly), without the screenshot
+# payloads and with a precomputed profit_loss column. Archived trades are included alongside the
+# live ones, read from the user's archive partitions. Exports are incremental per user: only users
+# whose trade_versions row changed since the last export are re-read from the database, and only
+# their buckets are rewritten. Queries read the files memory-mapped, prune partitions from the
+# month/user filters and aggregate in Arrow.
+
+SNAPSHOT_DIR = os.path.join('snapshots', 'trades')
+# Leading underscore keeps the manifest out of the Parquet dataset
+MANIFEST_NAME = '_manifest.json'
+USER_BUCKETS = 8
+USER_BATCH = 256
+SNAPSHOT_COLUMNS = ('id', 'user_id', 'date', 'end_date', 'pair', 'amount', 'entry_price', 'exit_price',
+                    'strategy', 'notes', 'status', 'trade_type', 'source')
+FILE_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('user_id', pa.int64()),
+    ('date', pa.string()),
+    ('end_date', pa.string()),
+    ('pair', pa.string()),
+    ('amount', pa.float64()),
+    ('entry_price', pa.float64()),
+    ('exit_price', pa.float64()),
+    ('strategy', pa.string()),
+    ('notes', pa.string()),
+    ('status', pa.string()),
+    ('trade_type', pa.string()),
+    ('source', pa.string()),
+    ('profit_loss', pa.float64()),
+])
+PARTITION_SCHEMA = pa.schema([('month', pa.string()), ('user_bucket', pa.int64())])
+PARTITIONING = ds.partitioning(PARTITION_SCHEMA, flavor='hive')
+GROUP_KEYS = ('month', 'user_id', 'pair', 'strategy', 'status', 'trade_type', 'source')
+UNKNOWN_MONTH = 'unknown'
+
+
+def load_manifest(snapshot_dir):
+    try:
+        with open(os.path.join(snapshot_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'users': {}, 'exported': None}
+
+
+def save_manifest(snapshot_dir, manifest):
+    path = os.path.join(snapshot_dir, MANIFEST_NAME)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f)
+    os.replace(path + '.tmp', path)
+
+
+def profit_loss(amount, entry_price, exit_price, trade_type):
+    # Same rule as get_trade_profit_loss / TRADE_PNL_SQL: open or untyped trades count as 0
+    long_pnl = (exit_price - entry_price) * amount
+    pnl = np.where(trade_type == 'long', long_pnl, np.where(trade_type == 'short', -long_pnl, 0.0))
+    return np.nan_to_num(pnl, nan=0.0)
+
+
+def rows_to_table(rows):
+    # rows are SNAPSHOT_COLUMNS tuples; the month partition key is kept as an extra column
+    columns = dict(zip(SNAPSHOT_COLUMNS, zip(*rows))) if rows else {name: () for name in SNAPSHOT_COLUMNS}
+    numeric = {name: np.array(columns[name], dtype=float) for name in ('amount', 'entry_price', 'exit_price')}
+    table = pa.table({
+        **{name: columns[name] for name in FILE_SCHEMA.names if name in columns},
+        'profit_loss': profit_loss(numeric['amount'], numeric['entry_price'], numeric['exit_price'],
+                                   np.array(columns['trade_type'], dtype=object)),
+    }, schema=FILE_SCHEMA)
+    return table.append_column('month', pa.array([date[:7] if date else UNKNOWN_MONTH for date in columns['date']],
+                                                 pa.string()))
+
+
+def bucket_path(snapshot_dir, month, bucket):
+    return os.path.join(snapshot_dir, f"month={month}", f"user_bucket={bucket}", 'part-0.parquet')
+
+
+def rewrite_bucket(snapshot_dir, bucket, replaced_users, new_rows):
+    # Drops the replaced users from every month file of the bucket and merges their fresh rows in
+    parts = [new_rows]
+    existing = set()
+    for name in os.listdir(snapshot_dir):
+        path = bucket_path(snapshot_dir, name[len('month='):], bucket)
+        if name.startswith('month=') and os.path.exists(path):
+            existing.add(path)
+            table = pq.read_table(path, schema=FILE_SCHEMA)
+            table = table.filter(pc.invert(pc.is_in(table['user_id'], pa.array(replaced_users, pa.int64()))))
+            parts.append(table.append_column('month', pa.array([name[len('month='):]] * table.num_rows, pa.string())))
+    merged = pa.concat_tables(parts)
+    months = pc.unique(merged['month']).to_pylist() if merged.num_rows else []
+    for month in months:
+        table = merged.filter(pc.equal(merged['month'], month)).drop_columns(['month'])
+        table = table.sort_by([('user_id', 'ascending'), ('date', 'ascending')])
+        path = bucket_path(snapshot_dir, month, bucket)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written under a dot name (ignored by readers) and renamed into place
+        temp_path = os.path.join(os.path.dirname(path), f".{uuid.uuid4().hex}.tmp")
+        pq.write_table(table, temp_path, compression='zstd')
+        os.replace(temp_path, path)
+        existing.discard(path)
+    for path in existing:
+        shutil.rmtree(os.path.dirname(path))
+
+
+def archived_rows(db, archive_dir, user_ids, names):
+    # The users' archived trades as SNAPSHOT_COLUMNS tuples, pair and strategy ids resolved through
+    # names ({'pair': {id: pair}, 'strategy': {id: name}})
+    placeholders = ','.join('?' * len(user_ids))
+    years = [year for (year,) in db.execute(
+        f"SELECT DISTINCT substr(day, 1, 4) FROM trade_archive_daily WHERE user_id IN ({placeholders})", user_ids)]
+    position = {name: trade_archive.ARCHIVE_COLUMNS.index(name) for name in trade_archive.ARCHIVE_COLUMNS}
+    rows = []
+    for year in sorted(years):
+        path = trade_archive.partition_path(archive_dir, year)
+        if not os.path.exists(path):
+            continue
+        with sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True) as archive:
+            for (payload,) in archive.execute(f"SELECT payload FROM trade_chunks WHERE user_id IN ({placeholders})",
+                                              user_ids):
+                for row in trade_archive.decode_chunk(payload):
+                    rows.append(tuple(
+                        names[column].get(row[position[column + '_id']]) if column in names else row[position[column]]
+                        for column in SNAPSHOT_COLUMNS))
+    return rows
+
+
+def export_snapshot(db_path, snapshot_dir=SNAPSHOT_DIR, full=False, archive_dir=trade_archive.ARCHIVE_DIR):
+    started = time.perf_counter()
+    if full:
+        shutil.rmtree(snapshot_dir, ignore_errors=True)
+    os.makedirs(snapshot_dir, exist_ok=True)
+    manifest = load_manifest(snapshot_dir)
+    db = sqlite3.connect(f"file:{os.path.abspath(db_path)}?mode=ro", uri=True)
+    try:
+        # One read transaction so the versions recorded match the rows exported
+        db.execute("BEGIN")
+        # Users whose trades predate the version triggers have no trade_versions row yet; users with
+        # only archived trades are still exported
+        versions = {str(user_id): version for user_id, version in db.execute(
+            '''SELECT u.user_id, COALESCE(v.version, 0)
+               FROM (SELECT user_id FROM trades UNION SELECT user_id FROM trade_archive_daily) u
+               LEFT JOIN trade_versions v ON v.user_id = u.user_id''')}
+        stale = [int(user_id) for user_id, version in versions.items() if manifest['users'].get(user_id) != version]
+        gone = [int(user_id) for user_id in manifest['users'] if user_id not in versions]
+        buckets = {}
+        for user_id in stale + gone:
+            buckets.setdefault(user_id % USER_BUCKETS, []).append(user_id)
+        names = {'pair': dict(db.execute("SELECT id, pair FROM trading_pairs")),
+                 'strategy': dict(db.execute("SELECT id, name FROM analysis_types"))}
+        rows_written = 0
+        for bucket, user_ids in sorted(buckets.items()):
+            rows = []
+            for i in range(0, len(user_ids), USER_BATCH):
+                batch = user_ids[i:i + USER_BATCH]
+                placeholders = ','.join('?' * len(batch))
+                rows.extend(db.execute(f"SELECT {', '.join(SNAPSHOT_COLUMNS)} FROM trade_details WHERE user_id IN ({placeholders})",
+                                       batch).fetchall())
+                # A trade archived since the read began is in both places; the live row wins
+                live = {row[0] for row in rows}
+                rows.extend(row for row in archived_rows(db, archive_dir, batch, names) if row[0] not in live)
+            rewrite_bucket(snapshot_dir, bucket, user_ids, rows_to_table(rows))
+            rows_written += len(rows)
+        db.execute("COMMIT")
+    finally:
+        db.close()
+    manifest = {'users': versions, 'exported': datetime.now().isoformat(timespec='seconds')}
+    save_manifest(snapshot_dir, manifest)
+    return {
+        'users_updated': len(stale),
+        'users_removed': len(gone),
+        'rows_written': rows_written,
+        'seconds': time.perf_counter() - started,
+        'exported': manifest['exported'],
+    }
+
+
+def open_snapshot(snapshot_dir=SNAPSHOT_DIR):
+    # Explicit schema so an empty snapshot still answers queries
+    return ds.dataset(snapshot_dir, schema=pa.unify_schemas([FILE_SCHEMA, PARTITION_SCHEMA]), format='parquet',
+                      partitioning=PARTITIONING, filesystem=pafs.LocalFileSystem(use_mmap=True))
+
+
+def snapshot_filter(start_month=None, end_month=None, user_ids=None, status=None):
+    # Month and user conditions match partition keys, so pruned directories are never opened
+    conditions = []
+    if start_month:
+        conditions.append(ds.field('month') >= start_month)
+    if end_month:
+        conditions.append(ds.field('month') <= end_month)
+    if user_ids:
+        conditions.append(ds.field('user_bucket').isin(sorted({user_id % USER_BUCKETS for user_id in user_ids})))
+        conditions.append(ds.field('user_id').isin(list(user_ids)))
+    if status:
+        conditions.append(ds.field('status') == status)
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def aggregate(snapshot_dir=SNAPSHOT_DIR, group_by=('pair',), start_month=None, end_month=None, user_ids=None,
+              status=None):
+    group_by = list(group_by)
+    unknown = set(group_by) - set(GROUP_KEYS)
+    if unknown:
+        raise ValueError(f"Cannot group by {', '.join(sorted(unknown))}")
+    table = open_snapshot(snapshot_dir).to_table(
+        columns=group_by + ['id', 'amount', 'exit_price', 'profit_loss'],
+        filter=snapshot_filter(start_month, end_month, user_ids, status))
+    completed = pc.is_valid(table['exit_price'])
+    table = table.append_column('completed', pc.cast(completed, pa.int64()))
+    table = table.append_column('won', pc.cast(pc.and_(completed, pc.greater(table['profit_loss'], 0)), pa.int64()))
+    result = table.group_by(group_by).aggregate([
+        ('id', 'count'), ('completed', 'sum'), ('won', 'sum'), ('amount', 'sum'),
+        ('profit_loss', 'sum'), ('profit_loss', 'mean'),
+    ]).to_pandas().rename(columns={
+        'id_count': 'trades', 'completed_sum': 'completed', 'won_sum': 'wins', 'amount_sum': 'volume',
+        'profit_loss_sum': 'profit_loss', 'profit_loss_mean': 'avg_profit_loss',
+    })
+    result['win_rate'] = result['wins'] / result['completed'].where(result['completed'] > 0)
+    return result[group_by + ['trades', 'completed', 'wins', 'win_rate', 'volume', 'profit_loss', 'avg_profit_loss']] \
+        .sort_values('profit_loss', ascending=False, ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain and query the columnar trade snapshot")
+    parser.add_argument('--snapshot', default=SNAPSHOT_DIR, help="snapshot directory")
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help="bring the snapshot up to date with the database")
+    export.add_argument('--db', default='crypto_backtest.db')
+    export.add_argument('--full', action='store_true', help="rewrite every partition")
+    query = commands.add_parser('query', help="aggregate trades from the snapshot")
+    query.add_argument('--group-by', default='pair', help="comma-separated: " + ', '.join(GROUP_KEYS))
+    query.add_argument('--start', help="first month, YYYY-MM")
+    query.add_argument('--end', help="last month, YYYY-MM")
+    query.add_argument('--users', help="comma-separated user ids")
+    query.add_argument('--status')
+    query.add_argument('--limit', type=int, default=50)
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        summary = export_snapshot(args.db, args.snapshot, args.full)
+        print(f"Updated {summary['users_updated']} users, removed {summary['users_removed']}, "
+              f"wrote {summary['rows_written']} trades in {summary['seconds']:.2f}s")
+    else:
+        started = time.perf_counter()
+        result = aggregate(args.snapshot, args.group_by.split(','), args.start, args.end,
+                           [int(user_id) for user_id in args.users.split(',')] if args.users else None, args.status)
+        print(result.head(args.limit).to_string(index=False))
+        print(f"\n{len(result)} groups in {time.perf_counter() - started:.3f}s")
+
+
+if __name__ == '__main__':
+    main()
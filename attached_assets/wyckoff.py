@@ -0,0 +1,211 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# Wyckoff trading ranges, springs, upthrusts and volume climaxes from OHLCV bars.
+#
+#   range      closes held within RANGE_ATR_MULTIPLE average true ranges for at least RANGE_WINDOW
+#              bars, bounded by the lowest and highest close (support and resistance)
+#   spring     a bar whose low breaks support by SHAKEOUT_ATR or more and closes back above it,
+#              inside a range or up to TEST_BARS bars after it
+#   upthrust   the mirror image at resistance
+#   climax     volume VOLUME_Z standard deviations above the preceding VOLUME_WINDOW bars on a bar
+#              spanning CLIMAX_SPREAD_ATR or more; a selling climax after a decline, a buying
+#              climax after an advance
+#
+# A range entered from a decline is labelled accumulation, one entered from an advance
+# distribution. The entry trend looks back TREND_WINDOW bars, or to the first bar for ranges that
+# start sooner; a range starting on the first bar has no entry trend and no phase.
+#
+# Rolling statistics are strided window views and cumulative sums over the whole series; the only
+# Python loops run once per range, never per bar, so a symbol's history takes a few milliseconds.
+
+RANGE_WINDOW = 30
+RANGE_ATR_MULTIPLE = 4.0
+ATR_WINDOW = 14
+TREND_WINDOW = 20
+TEST_BARS = 10
+SHAKEOUT_ATR = 0.25
+VOLUME_WINDOW = 50
+VOLUME_Z = 2.5
+CLIMAX_SPREAD_ATR = 1.5
+EVENT_LABELS = {
+    'spring': "Spring",
+    'upthrust': "Upthrust",
+    'selling_climax': "Selling Climax",
+    'buying_climax': "Buying Climax",
+}
+RANGE_COLUMNS = ['start', 'end', 'support', 'resistance', 'bars', 'phase']
+EVENT_COLUMNS = ['kind', 'price', 'volume_z']
+
+
+def rolling_mean(values, window):
+    # Mean of the last window values (fewer at the start)
+    sums = np.cumsum(np.r_[0.0, values])
+    counts = np.minimum(np.arange(1, len(values) + 1), window)
+    return (sums[1:] - sums[np.arange(1, len(values) + 1) - counts]) / counts
+
+
+def shift(values, periods):
+    shifted = np.full(len(values), np.nan)
+    if periods < len(values):
+        shifted[periods:] = values[:len(values) - periods]
+    return shifted
+
+
+def average_true_range(high, low, close, window=ATR_WINDOW):
+    previous_close = shift(close, 1)
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - previous_close), np.abs(low - previous_close)))
+    return rolling_mean(true_range, window)
+
+
+def find_ranges(close, atr, window=RANGE_WINDOW, multiple=RANGE_ATR_MULTIPLE):
+    # (first, last) bar positions of each range. Windows whose closes span at most multiple ATRs are
+    # merged where they overlap; a merged stretch is then cut wherever its running close band
+    # outgrows the limit, so a slow drift cannot chain flat windows into one tall range.
+    n = len(close)
+    if n < window:
+        return []
+    views = np.lib.stride_tricks.sliding_window_view(close, window)
+    width = views.max(axis=1) - views.min(axis=1)
+    limits = multiple * rolling_mean(atr, window)
+    ends = np.flatnonzero(width <= limits[window - 1:]) + window - 1
+    # Each qualifying window ending at i covers [i - window + 1, i]; a difference array and a
+    # cumulative sum mark every covered bar at once
+    marks = np.zeros(n + 1, dtype=int)
+    np.add.at(marks, ends - window + 1, 1)
+    np.add.at(marks, ends + 1, -1)
+    covered = np.r_[np.cumsum(marks[:-1]) > 0, False]
+    edges = np.flatnonzero(np.diff(np.r_[False, covered].astype(int)))
+    ranges = []
+    for first, stop in zip(edges[::2], edges[1::2]):
+        while stop - first >= window:
+            segment = close[first:stop]
+            band = np.maximum.accumulate(segment) - np.minimum.accumulate(segment)
+            over = np.flatnonzero(band > multiple * atr[first:stop].mean())
+            last = first + over[0] if len(over) else stop
+            if last - first >= window:
+                ranges.append((first, last - 1))
+            first = last
+    return ranges
+
+
+def detect(frame, window=RANGE_WINDOW, multiple=RANGE_ATR_MULTIPLE, test_bars=TEST_BARS):
+    # frame: OHLCV bars on a sorted DatetimeIndex. Returns the ranges (one row each) and the events
+    # (one row per bar and kind, indexed by bar time).
+    high, low, close, volume = (frame[column].to_numpy(dtype=float) for column in ('High', 'Low', 'Close', 'Volume'))
+    index = frame.index
+    priced = ~np.isnan(close)
+    if not priced.all():
+        high, low, close, volume, index = high[priced], low[priced], close[priced], volume[priced], index[priced]
+    volume = np.nan_to_num(volume)
+    n = len(close)
+    atr = average_true_range(high, low, close)
+    trend = close / shift(close, TREND_WINDOW) - 1
+    positions = np.arange(n)
+
+    spans = np.array(find_ranges(close, atr, window, multiple), dtype=int).reshape(-1, 2)
+    support = np.array([close[first:last + 1].min() for first, last in spans])
+    resistance = np.array([close[first:last + 1].max() for first, last in spans])
+    lookback = np.maximum(spans[:, 0] - TREND_WINDOW, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        entry_trend = close[spans[:, 0]] / close[lookback] - 1
+    phase = np.where(entry_trend > 0, "Distribution", "Accumulation").astype(object)
+    phase[spans[:, 0] == 0] = None
+    ranges = pd.DataFrame({
+        'start': index[spans[:, 0]],
+        'end': index[spans[:, 1]],
+        'support': support,
+        'resistance': resistance,
+        'bars': spans[:, 1] - spans[:, 0] + 1,
+        'phase': phase,
+    }, columns=RANGE_COLUMNS)
+
+    events = {}
+    if len(spans):
+        # Range number per bar, carried test_bars bars past each range's end
+        labels = np.full(n, -1)
+        for number, (first, last) in enumerate(spans):
+            labels[first:last + 1] = number
+        latest = np.maximum.accumulate(np.where(labels >= 0, positions, -1))
+        active = (latest >= 0) & (positions - latest <= test_bars)
+        current = labels[np.maximum(latest, 0)]
+        bar_support = np.where(active, support[current], np.nan)
+        bar_resistance = np.where(active, resistance[current], np.nan)
+        events['spring'] = (low < bar_support - SHAKEOUT_ATR * atr) & (close > bar_support)
+        events['upthrust'] = (high > bar_resistance + SHAKEOUT_ATR * atr) & (close < bar_resistance)
+
+    volume_z = np.full(n, np.nan)
+    if n > VOLUME_WINDOW:
+        previous = np.lib.stride_tricks.sliding_window_view(volume[:-1], VOLUME_WINDOW)
+        deviation = previous.std(axis=1, ddof=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            volume_z[VOLUME_WINDOW:] = np.where(deviation > 0,
+                                                (volume[VOLUME_WINDOW:] - previous.mean(axis=1)) / deviation, np.nan)
+    with np.errstate(invalid='ignore'):
+        climax = (volume_z >= VOLUME_Z) & (high - low >= CLIMAX_SPREAD_ATR * shift(atr, 1))
+        prior_trend = shift(trend, 1)
+        events['selling_climax'] = climax & (prior_trend < 0)
+        events['buying_climax'] = climax & (prior_trend > 0)
+
+    rows = [(position, kind) for kind, flags in events.items() for position in np.flatnonzero(flags)]
+    rows.sort()
+    at = np.array([position for position, _ in rows], dtype=int)
+    kinds = [kind for _, kind in rows]
+    price = np.where(np.isin(kinds, ['spring', 'selling_climax']), low[at], high[at]) if rows else np.array([])
+    events = pd.DataFrame({'kind': kinds, 'price': price, 'volume_z': volume_z[at]},
+                          index=pd.DatetimeIndex(index[at], name='ts'), columns=EVENT_COLUMNS)
+    return {'ranges': ranges, 'events': events}
+
+
+def summarize(symbol, frame, detected, test_bars=TEST_BARS):
+    # One scan row: where the latest bar stands relative to the most recent range
+    row = {'Symbol': symbol, 'Last Close': np.nan, 'Phase': None, 'In Range': False, 'Support': np.nan,
+           'Resistance': np.nan, 'Range Position': np.nan, 'Range Bars': 0, 'Ranges': len(detected['ranges']),
+           'Last Event': None, 'Event Time': None}
+    close = frame['Close'].to_numpy(dtype=float)
+    index = frame.index[~np.isnan(close)]
+    if not len(index):
+        return row
+    row['Last Close'] = float(close[~np.isnan(close)][-1])
+    ranges = detected['ranges']
+    if len(ranges):
+        latest = ranges.iloc[-1]
+        bars_since = len(index) - 1 - index.get_loc(latest['end'])
+        height = latest['resistance'] - latest['support']
+        row.update({
+            'Phase': latest['phase'],
+            'In Range': bool(bars_since <= test_bars),
+            'Support': float(latest['support']),
+            'Resistance': float(latest['resistance']),
+            'Range Position': float((row['Last Close'] - latest['support']) / height) if height > 0 else np.nan,
+            'Range Bars': int(latest['bars']),
+        })
+    events = detected['events']
+    if len(events):
+        row['Last Event'] = EVENT_LABELS[events['kind'].iloc[-1]]
+        row['Event Time'] = events.index[-1]
+    return row
+
+
+def scan_symbol(symbol, frame):
+    return summarize(symbol, frame, detect(frame))
+
+
+def scan(frames, processes=1):
+    # frames: {symbol: OHLCV frame}. Symbols are independent, so with processes > 1 (0 for every
+    # core) they are spread over a process pool in chunks.
+    symbols = list(frames)
+    if not symbols:
+        return {}
+    processes = min(processes or os.cpu_count() or 1, len(symbols))
+    if processes > 1:
+        chunksize = max(1, len(symbols) // (processes * 4))
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            rows = list(executor.map(scan_symbol, symbols, [frames[symbol] for symbol in symbols],
+                                     chunksize=chunksize))
+    else:
+        rows = [scan_symbol(symbol, frames[symbol]) for symbol in symbols]
+    return dict(zip(symbols, rows))